@@ -4,7 +4,9 @@ that don't require A2P registration
 """
 
 import pandas as pd
-import requests
+from http_pool import get_session
+from rate_limit import get_limiter
+from clicksend_batch import CLICKSEND_BATCH_SIZE, send_batch
 import time
 from dotenv import load_dotenv
 import os
@@ -28,7 +30,7 @@ class AlternativeSMSSender:
         }
         
         try:
-            response = requests.post(url, data=data)
+            response = get_session().post(url, data=data)
             result = response.json()
             
             if result.get('success'):
@@ -62,7 +64,7 @@ class AlternativeSMSSender:
         }
         
         try:
-            response = requests.post(
+            response = get_session().post(
                 url,
                 json=payload,
                 auth=(username, api_key),
@@ -78,6 +80,31 @@ class AlternativeSMSSender:
         except Exception as e:
             return False, str(e)
     
+    def send_clicksend_batch(self, messages):
+        """
+        Send prepared {'to', 'body', 'from'} messages in one ClickSend request
+        Returns (successful, failed) counts
+        """
+        username = os.getenv('CLICKSEND_USERNAME')
+        api_key = os.getenv('CLICKSEND_API_KEY')
+        
+        if not username or not api_key:
+            print("✗ Failed: ClickSend credentials not configured")
+            return 0, len(messages)
+        
+        print(f"Sending {len(messages)} messages to ClickSend...")
+        results = send_batch(get_session(), messages, (username, api_key), get_limiter('clicksend'))
+        
+        successful = 0
+        for message, result in zip(messages, results):
+            if result['success']:
+                successful += 1
+            else:
+                print(f"✗ Failed {message['to']}: {result['error']}")
+        
+        print(f"✓ Sent {successful}/{len(messages)}")
+        return successful, len(messages) - successful
+    
     def send_bulk_sms(self, csv_file, default_message, provider='textbelt', delay=2):
         """
         Send bulk SMS from CSV file
@@ -92,6 +119,7 @@ class AlternativeSMSSender:
             total = len(df)
             successful = 0
             failed = 0
+            pending = []
             
             print(f"Starting to send {total} messages using {provider}...")
             
@@ -115,13 +143,22 @@ class AlternativeSMSSender:
                 message = custom_msg if custom_msg and custom_msg.strip() else default_message
                 message = message.replace('{name}', name)
                 
+                # ClickSend takes many messages per request - queue and send in batches
+                if provider == 'clicksend':
+                    pending.append({'to': phone, 'body': message, 'from': self.sender_id})
+                    if len(pending) >= CLICKSEND_BATCH_SIZE:
+                        sent, not_sent = self.send_clicksend_batch(pending)
+                        successful += sent
+                        failed += not_sent
+                        pending = []
+                        print(f"Progress: {idx + 1}/{total}")
+                    continue
+                
                 print(f"Sending to {phone}...")
                 
                 # Send message based on provider
                 if provider == 'textbelt':
                     success, result = self.send_via_textbelt(phone, message)
-                elif provider == 'clicksend':
-                    success, result = self.send_via_clicksend(phone, message)
                 else:
                     print(f"Unknown provider: {provider}")
                     break
@@ -140,6 +177,11 @@ class AlternativeSMSSender:
                 if idx < total - 1:
                     time.sleep(delay)
             
+            if pending:
+                sent, not_sent = self.send_clicksend_batch(pending)
+                successful += sent
+                failed += not_sent
+            
             print(f"\nCompleted! Success: {successful}, Failed: {failed}")
             
         except Exception as e:
@@ -166,7 +208,7 @@ class AlternativeSMSSender:
         
         # Test account connection
         try:
-            response = requests.get(
+            response = get_session().get(
                 'https://rest.clicksend.com/v3/account',
                 auth=(username, api_key)
             )
@@ -179,7 +221,7 @@ class AlternativeSMSSender:
                 print(f"   Country: {account.get('country', 'N/A')}")
                 
                 # Check balance
-                balance_response = requests.get(
+                balance_response = get_session().get(
                     'https://rest.clicksend.com/v3/account/balance',
                     auth=(username, api_key)
                 )
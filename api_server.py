@@ -4,48 +4,746 @@ API Server for handling contact import and management
 Supports CSV import, contact CRUD operations, and data validation
 """
 
+import time
+# Cold start is measured from here (module import) to the port being bound
+_import_started = time.perf_counter()
+
 import os
 import json
 import csv
 import io
 import uuid
+import base64
+from collections import OrderedDict
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import HTTPServer
 from urllib.parse import urlparse, parse_qs
 import sqlite3
 import traceback
+from db_pool import SQLitePool
+from schema_migrations import Migration, IndexMigration, run_migrations
+from asset_cache import AssetCache
+from contact_update import BulkContactUpdater, UPDATABLE_CONTACT_FIELDS, MAX_BULK_UPDATE_IDS
+from contact_export import EXPORT_CONTENT_TYPES, COLUMNAR_FORMATS, available_formats, export_columns, iter_export_blocks
+from json_stream import JSONArrayStream, JSONObjectStream, iter_json_blocks, wants_pretty
+from http_keepalive import KeepAliveRequestHandler
+from delivery_ingest import (
+    DeliveryReportWriter, IngestQueueFull, InvalidReport, build_report_row, write_report_rows,
+    init_delivery_stats, query_delivery_stats
+)
+from delivery_partitions import (
+    PartitionMaintainer, RowIteratorCursor, iter_report_rows, partition_delivery_reports,
+    drop_partitions_before, list_partitions
+)
+from contact_import import (
+    BulkContactImporter, convert_to_bool, CONTACTS_BULK_LOAD_DDL, BULK_LOAD_IDLE,
+    iter_body_blocks, iter_text_lines, iter_csv_contacts, iter_ndjson_contacts,
+    normalize_email, normalize_phone_e164, email_key_sql, phone_key_sql,
+    ON_DUPLICATE_MODES, DEFAULT_ON_DUPLICATE
+)
 
 # Configuration
 PORT = 3000
 DB_FILE = 'contacts.db'
 
-# Initialize delivery reports database
-def init_delivery_reports_db():
-    """Initialize the delivery reports database table"""
-    conn = sqlite3.connect(DB_FILE)
+# Concurrency: worker threads serving requests, and the cap on requests that are
+# running or queued for a worker. Set API_MAX_WORKERS=0 for the old single-threaded server.
+MAX_WORKERS = int(os.getenv('API_MAX_WORKERS', os.cpu_count() or 4))
+MAX_IN_FLIGHT = int(os.getenv('API_MAX_IN_FLIGHT', MAX_WORKERS * 4))
+
+# Role-based contact visibility through the user_hierarchy closure table.
+# Off by default while the frontend's demo users have no assigned contacts.
+ROLE_FILTERING = os.getenv('CONTACTS_ROLE_FILTERING', 'false').lower() in ('1', 'true', 'yes')
+UNRESTRICTED_ROLES = ('admin',)
+
+# API_STARTUP_MODE=production skips the development-only startup work (users dump,
+# sample report seeding); STARTUP_BUDGET_MS is the cold-start time main() warns above
+PRODUCTION_STARTUP = os.getenv('API_STARTUP_MODE', 'development').lower() == 'production'
+STARTUP_BUDGET_MS = int(os.getenv('API_STARTUP_BUDGET_MS', 1000))
+startup_ms = None
+
+# Largest page GET /api/delivery-reports serves when a limit is given
+MAX_DELIVERY_REPORTS_PAGE = 5000
+
+# Static/HTML asset caching: bytes and gzip/brotli variants stay in memory and are
+# reloaded when the file changes; browsers revalidate with ETag/Last-Modified
+STATIC_CONTENT_TYPES = {
+    '.css': 'text/css',
+    '.js': 'application/javascript',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.svg': 'image/svg+xml',
+}
+STATIC_CACHE_CONTROL = os.getenv('STATIC_CACHE_CONTROL', 'public, max-age=300')
+HTML_CACHE_CONTROL = 'no-cache'
+asset_cache = AssetCache()
+
+# Shared per-thread connection pool, created on first use so DB_FILE can be changed before then
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+def get_db_pool():
+    """Get the process-wide SQLite connection pool"""
+    global _db_pool
+    if _db_pool is None:
+        with _db_pool_lock:
+            if _db_pool is None:
+                _db_pool = SQLitePool(DB_FILE)
+    return _db_pool
+
+# Delivery report partition upkeep (next period's partition, archive/retention), started by main()
+_partition_maintainer = None
+
+def start_partition_maintenance():
+    global _partition_maintainer
+    if _partition_maintainer is None:
+        _partition_maintainer = PartitionMaintainer(lambda: sqlite3.connect(DB_FILE, timeout=30))
+        _partition_maintainer.start()
+    return _partition_maintainer
+
+# Write-behind writer for delivery report webhooks, started on first use
+_delivery_writer = None
+
+def get_delivery_writer():
+    """Get the process-wide delivery report writer"""
+    global _delivery_writer
+    if _delivery_writer is None:
+        with _db_pool_lock:
+            if _delivery_writer is None:
+                _delivery_writer = DeliveryReportWriter(lambda: get_db_pool().get_connection())
+    return _delivery_writer
+
+def close_delivery_writer():
+    """Flush queued delivery reports and stop the writer (server shutdown)"""
+    global _delivery_writer
+    writer = _delivery_writer
+    if writer is not None:
+        writer.close()
+        _delivery_writer = None
+
+def close_db_pool():
+    """Close all pooled connections (server shutdown)"""
+    global _db_pool
+    with _db_pool_lock:
+        if _db_pool is not None:
+            _db_pool.close_all()
+            _db_pool = None
+
+# Full-text search over contacts (FTS5 trigram index kept in sync by triggers)
+SEARCH_FTS_COLUMNS = ['first_name', 'last_name', 'email', 'phone', 'sponsor']
+FTS_MIN_TERM_LENGTH = 3  # trigram tokenizer can't match shorter terms - those fall back to LIKE
+_search_index_ready = set()
+
+def ensure_bulk_load_trigger(cursor, name, create_sql):
+    """Create an AFTER INSERT trigger that pauses during bulk loads, replacing an older unpausable one"""
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?", (name,))
+    row = cursor.fetchone()
+    if row and 'contacts_bulk_load' in row[0]:
+        return
+    cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+    cursor.execute(create_sql)
+
+def init_contacts_search_index(cursor):
+    """Create the contacts_fts index and its sync triggers; returns False if FTS5 is unavailable"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'contacts_fts'")
+    existed = cursor.fetchone() is not None
+    columns = ', '.join(SEARCH_FTS_COLUMNS)
+    new_columns = ', '.join(f'new.{col}' for col in SEARCH_FTS_COLUMNS)
+    old_columns = ', '.join(f'old.{col}' for col in SEARCH_FTS_COLUMNS)
+    cursor.execute(CONTACTS_BULK_LOAD_DDL)
+    try:
+        cursor.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5(
+                {columns},
+                content='contacts', content_rowid='rowid', tokenize='trigram'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        print(f"⚠️ Full-text search unavailable, contact search will use LIKE: {e}")
+        return False
+    
+    # Bulk imports index their rows per chunk instead (see contact_import.BulkContactImporter)
+    ensure_bulk_load_trigger(cursor, 'contacts_fts_ai', f'''
+        CREATE TRIGGER contacts_fts_ai AFTER INSERT ON contacts WHEN {BULK_LOAD_IDLE} BEGIN
+            INSERT INTO contacts_fts(rowid, {columns}) VALUES (new.rowid, {new_columns});
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS contacts_fts_ad AFTER DELETE ON contacts BEGIN
+            INSERT INTO contacts_fts(contacts_fts, rowid, {columns}) VALUES ('delete', old.rowid, {old_columns});
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS contacts_fts_au AFTER UPDATE OF {columns} ON contacts BEGIN
+            INSERT INTO contacts_fts(contacts_fts, rowid, {columns}) VALUES ('delete', old.rowid, {old_columns});
+            INSERT INTO contacts_fts(rowid, {columns}) VALUES (new.rowid, {new_columns});
+        END
+    ''')
+    
+    if not existed:
+        # Index whatever contacts the database already holds
+        cursor.execute("INSERT INTO contacts_fts(contacts_fts) VALUES ('rebuild')")
+        print("✅ Built contact search index")
+    return True
+
+def rebuild_contacts_search_index(db_file=None):
+    """Rebuild contacts_fts from the contacts table (repairs drift or a pre-existing database)"""
+    conn = sqlite3.connect(db_file or DB_FILE)
+    try:
+        cursor = conn.cursor()
+        if not init_contacts_search_index(cursor):
+            return False
+        cursor.execute("INSERT INTO contacts_fts(contacts_fts) VALUES ('rebuild')")
+        cursor.execute("INSERT INTO contacts_fts(contacts_fts) VALUES ('optimize')")
+        conn.commit()
+        _search_index_ready.discard(db_file or DB_FILE)
+        return True
+    finally:
+        conn.close()
+
+def contacts_search_index_available(conn):
+    """Whether contacts_fts exists in the database behind conn (cached once found)"""
+    if DB_FILE in _search_index_ready:
+        return True
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'contacts_fts'").fetchone()
+    if row:
+        _search_index_ready.add(DB_FILE)
+    return row is not None
+
+def fts_phrase(term):
+    """Quote a raw search term as a single FTS5 phrase (substring match under trigram)"""
+    return '"' + term.replace('"', '""') + '"'
+
+def contact_search_condition(conn, search, alias='c'):
+    """WHERE condition for a contact search term: (condition, params, mode)
+
+    mode is 'fulltext' when the FTS index can serve the term, 'like' for the
+    substring fallback, or None (and no condition) for an empty search.
+    """
+    if not search:
+        return None, [], None
+    if len(search) >= FTS_MIN_TERM_LENGTH and contacts_search_index_available(conn):
+        condition = f'{alias}.rowid IN (SELECT rowid FROM contacts_fts WHERE contacts_fts MATCH ?)'
+        return condition, [fts_phrase(search)], 'fulltext'
+    condition = f'''(
+                    {alias}.first_name LIKE ? OR 
+                    {alias}.last_name LIKE ? OR 
+                    {alias}.email LIKE ? OR 
+                    {alias}.phone LIKE ? OR
+                    {alias}.sponsor LIKE ?
+                )'''
+    return condition, [f'%{search}%'] * 5, 'like'
+
+def contact_filter_conditions(conn, contact_filter, alias='c'):
+    """WHERE conditions and params for a bulk filter like {"search": "...", "status": "new", "assigned_to": null}
+
+    search works as in GET /api/contacts; every other key must be an updatable
+    contact field and matches by equality (null matches NULL). Raises ValueError
+    on unknown fields.
+    """
+    conditions = []
+    params = []
+    for field, value in contact_filter.items():
+        if field == 'search':
+            condition, search_params, _ = contact_search_condition(conn, str(value or '').strip(), alias)
+            if condition:
+                conditions.append(condition)
+                params.extend(search_params)
+        elif field in UPDATABLE_CONTACT_FIELDS:
+            if value is None:
+                conditions.append(f'{alias}.{field} IS NULL')
+            else:
+                conditions.append(f'{alias}.{field} = ?')
+                params.append(value)
+        else:
+            raise ValueError(f'Cannot filter on field: {field}')
+    return conditions, params
+
+def open_contact_export(conn, search='', contact_filter=None, current_user_id=None):
+    """Run the export query and return (cursor, columns) ready to be streamed
+
+    Applies the same search, field filters and role visibility as the list and
+    bulk-update endpoints. Rows come back in rowid order straight off the table,
+    with no COUNT or OFFSET, so the cursor can be read to the end in one pass.
+    """
     cursor = conn.cursor()
+    _, visibility_condition, visibility_params = contact_visibility_condition(cursor, current_user_id)
+    contact_filter = dict(contact_filter or {})
+    if search:
+        contact_filter['search'] = search
+    conditions, params = contact_filter_conditions(conn, contact_filter)
+    if visibility_condition:
+        conditions.append(visibility_condition)
+        params.extend(visibility_params)
     
-    # Create delivery_reports table
+    columns = export_columns(conn)
+    where_clause = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+    select_list = ', '.join(f'c.{name}' for name, _ in columns)
+    cursor.execute(f'SELECT {select_list} FROM contacts c {where_clause} ORDER BY c.rowid', params)
+    return cursor, columns
+
+def init_contacts_stats(cursor):
+    """Create the contacts_stats counter row and the triggers that keep it current
+
+    total is the exact unfiltered contact count; version changes on every contact
+    write, so cached filtered counts can tell when they are stale - even when
+    another process (reload scripts, migrations) wrote to contacts.db.
+    """
+    cursor.execute(CONTACTS_BULK_LOAD_DDL)
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS delivery_reports (
-            id TEXT PRIMARY KEY,
-            message_id TEXT,
-            phone_number TEXT,
-            status TEXT,
-            timestamp TEXT,
-            error_code TEXT,
-            error_text TEXT,
-            provider TEXT,
-            received_at TEXT DEFAULT CURRENT_TIMESTAMP
+        CREATE TABLE IF NOT EXISTS contacts_stats (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total INTEGER NOT NULL DEFAULT 0,
+            version INTEGER NOT NULL DEFAULT 0
         )
     ''')
+    cursor.execute('INSERT OR IGNORE INTO contacts_stats (id, total, version) SELECT 1, COUNT(*), 0 FROM contacts')
+    ensure_bulk_load_trigger(cursor, 'contacts_stats_ai', f'''
+        CREATE TRIGGER contacts_stats_ai AFTER INSERT ON contacts WHEN {BULK_LOAD_IDLE} BEGIN
+            UPDATE contacts_stats SET total = total + 1, version = version + 1 WHERE id = 1;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS contacts_stats_ad AFTER DELETE ON contacts BEGIN
+            UPDATE contacts_stats SET total = total - 1, version = version + 1 WHERE id = 1;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS contacts_stats_au AFTER UPDATE ON contacts BEGIN
+            UPDATE contacts_stats SET version = version + 1 WHERE id = 1;
+        END
+    ''')
+
+def init_contact_dedupe_keys(cursor):
+    """Add normalized email / E.164 phone key columns with partial unique indexes
+
+    Existing rows are backfilled once; where old data already holds duplicates the
+    oldest contact keeps the key and the later copies get NULL (remove_duplicates.py
+    can still clean those up).
+    """
+    cursor.execute('PRAGMA table_info(contacts)')
+    columns = {row[1] for row in cursor.fetchall()}
+    if 'email_normalized' not in columns or 'phone_e164' not in columns:
+        if 'email_normalized' not in columns:
+            cursor.execute('ALTER TABLE contacts ADD COLUMN email_normalized TEXT')
+        if 'phone_e164' not in columns:
+            cursor.execute('ALTER TABLE contacts ADD COLUMN phone_e164 TEXT')
+        conn = cursor.connection
+        conn.create_function('normalize_email', 1, normalize_email, deterministic=True)
+        conn.create_function('normalize_phone_e164', 2, normalize_phone_e164, deterministic=True)
+        cursor.execute('UPDATE contacts SET email_normalized = normalize_email(email), phone_e164 = normalize_phone_e164(phone, country)')
+        for key in ('email_normalized', 'phone_e164'):
+            cursor.execute(f'''
+                UPDATE contacts SET {key} = NULL
+                WHERE {key} IS NOT NULL AND rowid NOT IN (
+                    SELECT MIN(rowid) FROM contacts WHERE {key} IS NOT NULL GROUP BY {key}
+                )
+            ''')
+        print("✅ Added normalized email/phone dedupe keys to contacts")
     
-    conn.commit()
-    conn.close()
-    print("✅ Delivery reports database initialized")
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_contacts_email_normalized ON contacts(email_normalized) WHERE email_normalized IS NOT NULL')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_contacts_phone_e164 ON contacts(phone_e164) WHERE phone_e164 IS NOT NULL')
+
+def init_contact_dedupe_triggers(cursor):
+    """Keep email_normalized/phone_e164 in step with every write to contacts
 
-class ContactsAPI(BaseHTTPRequestHandler):
+    Writers that don't fill the keys (reload_contacts.py, simple_reload.py, ad hoc
+    inserts) get them from these triggers. A key another contact already holds is
+    left NULL, as in the migration 12 backfill. Bulk imports compute their own
+    keys and skip the check. Rows written without keys so far are backfilled once.
+    """
+    email_key, phone_key = email_key_sql('email'), phone_key_sql('phone', 'country')
+    for key, expression in (('email_normalized', email_key), ('phone_e164', phone_key)):
+        cursor.execute(f'UPDATE contacts SET {key} = NULL WHERE {key} IS NOT {expression}')
+        cursor.execute(f'UPDATE OR IGNORE contacts SET {key} = {expression} WHERE {key} IS NULL AND {expression} IS NOT NULL')
+    
+    cursor.execute(CONTACTS_BULK_LOAD_DDL)
+    new_email_key, new_phone_key = email_key_sql('new.email'), phone_key_sql('new.phone', 'new.country')
+    stale = f"(new.email_normalized IS NOT {new_email_key} OR new.phone_e164 IS NOT {new_phone_key})"
+    # Plain UPDATEs guarded by NOT EXISTS rather than UPDATE OR IGNORE: an outer
+    # INSERT/UPDATE OR REPLACE would override the trigger's conflict clause and
+    # delete the contact already holding the key
+    refresh_keys = f'''
+            UPDATE contacts SET email_normalized = NULL, phone_e164 = NULL WHERE rowid = new.rowid;
+            UPDATE contacts SET email_normalized = {new_email_key} WHERE rowid = new.rowid
+                AND NOT EXISTS (SELECT 1 FROM contacts WHERE email_normalized = {new_email_key});
+            UPDATE contacts SET phone_e164 = {new_phone_key} WHERE rowid = new.rowid
+                AND NOT EXISTS (SELECT 1 FROM contacts WHERE phone_e164 = {new_phone_key});
+    '''
+    # Recreated so databases that ran an earlier version of this step get the current triggers
+    cursor.execute('DROP TRIGGER IF EXISTS contacts_dedupe_keys_ai')
+    cursor.execute('DROP TRIGGER IF EXISTS contacts_dedupe_keys_au')
+    cursor.execute(f'''
+        CREATE TRIGGER contacts_dedupe_keys_ai AFTER INSERT ON contacts
+        WHEN {BULK_LOAD_IDLE} AND {stale} BEGIN {refresh_keys} END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER contacts_dedupe_keys_au AFTER UPDATE OF email, phone, country ON contacts
+        WHEN {stale} BEGIN {refresh_keys} END
+    ''')
+
+def init_contact_created_at(cursor):
+    """Backfill NULL contacts.created_at and keep it filled from then on
+
+    Contact list pages seek on (created_at, id), which never matches a NULL
+    created_at. SQLite can't add NOT NULL to an existing column, so triggers fill
+    it for writers that insert or set NULL (e.g. reload_contacts.py).
+    """
+    cursor.execute('UPDATE contacts SET created_at = COALESCE(updated_at, CURRENT_TIMESTAMP) WHERE created_at IS NULL')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS contacts_created_at_ai AFTER INSERT ON contacts
+        WHEN new.created_at IS NULL BEGIN
+            UPDATE contacts SET created_at = COALESCE(new.updated_at, CURRENT_TIMESTAMP) WHERE rowid = new.rowid;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS contacts_created_at_au AFTER UPDATE OF created_at ON contacts
+        WHEN new.created_at IS NULL BEGIN
+            UPDATE contacts SET created_at = COALESCE(old.created_at, new.updated_at, CURRENT_TIMESTAMP) WHERE rowid = new.rowid;
+        END
+    ''')
+
+def init_user_hierarchy(cursor):
+    """Create the user_hierarchy closure table and the triggers that maintain it
+
+    One row per (ancestor, descendant) pair along users.manager_id, including each
+    user's row to itself at depth 0, so "everyone under X" is a single indexed
+    lookup however deep the org chart goes. Triggers keep it current on user
+    insert, delete and manager_id change; hierarchy changes also bump
+    contacts_stats.version so cached per-user contact counts are recomputed.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_hierarchy (
+            ancestor_id TEXT NOT NULL,
+            descendant_id TEXT NOT NULL,
+            depth INTEGER NOT NULL,
+            PRIMARY KEY (ancestor_id, descendant_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_hierarchy_descendant ON user_hierarchy(descendant_id, ancestor_id)')
+    
+    cursor.execute('SELECT 1 FROM user_hierarchy LIMIT 1')
+    if cursor.fetchone() is None:
+        # One-time backfill from manager_id (guarded against cycles in old data)
+        cursor.execute('''
+            WITH RECURSIVE chain(ancestor_id, descendant_id, depth) AS (
+                SELECT id, id, 0 FROM users
+                UNION
+                SELECT u.manager_id, chain.descendant_id, chain.depth + 1
+                FROM chain JOIN users u ON u.id = chain.ancestor_id
+                WHERE u.manager_id IS NOT NULL AND chain.depth < 64
+            )
+            INSERT OR IGNORE INTO user_hierarchy (ancestor_id, descendant_id, depth)
+            SELECT ancestor_id, descendant_id, MIN(depth) FROM chain
+            WHERE ancestor_id IN (SELECT id FROM users)
+            GROUP BY ancestor_id, descendant_id
+        ''')
+    
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS user_hierarchy_ai AFTER INSERT ON users BEGIN
+            INSERT OR IGNORE INTO user_hierarchy (ancestor_id, descendant_id, depth) VALUES (NEW.id, NEW.id, 0);
+            INSERT OR IGNORE INTO user_hierarchy (ancestor_id, descendant_id, depth)
+                SELECT ancestor_id, NEW.id, depth + 1 FROM user_hierarchy WHERE descendant_id = NEW.manager_id;
+            UPDATE contacts_stats SET version = version + 1 WHERE id = 1;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS user_hierarchy_bu_cycle BEFORE UPDATE OF manager_id ON users
+        WHEN NEW.manager_id IS NOT NULL AND EXISTS (
+            SELECT 1 FROM user_hierarchy WHERE ancestor_id = NEW.id AND descendant_id = NEW.manager_id
+        ) BEGIN
+            SELECT RAISE(ABORT, 'manager_id would create a cycle in the user hierarchy');
+        END
+    ''')
+    # Moving a user moves their whole subtree: drop the links from the old
+    # ancestors into the subtree, then link the new ancestors to every member
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS user_hierarchy_au AFTER UPDATE OF manager_id ON users
+        WHEN OLD.manager_id IS NOT NEW.manager_id BEGIN
+            DELETE FROM user_hierarchy
+            WHERE descendant_id IN (SELECT descendant_id FROM user_hierarchy WHERE ancestor_id = NEW.id)
+              AND ancestor_id IN (SELECT ancestor_id FROM user_hierarchy WHERE descendant_id = NEW.id AND ancestor_id != NEW.id);
+            INSERT OR IGNORE INTO user_hierarchy (ancestor_id, descendant_id, depth)
+                SELECT above.ancestor_id, below.descendant_id, above.depth + below.depth + 1
+                FROM user_hierarchy above, user_hierarchy below
+                WHERE above.descendant_id = NEW.manager_id AND below.ancestor_id = NEW.id;
+            UPDATE contacts_stats SET version = version + 1 WHERE id = 1;
+        END
+    ''')
+    # A deleted user's reports become top-level until they are reassigned. The
+    # rows an INSERT OR REPLACE deletes don't fire this (recursive_triggers is
+    # off), so users must be written with INSERT ... ON CONFLICT DO UPDATE
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS user_hierarchy_ad AFTER DELETE ON users BEGIN
+            DELETE FROM user_hierarchy
+            WHERE descendant_id IN (SELECT descendant_id FROM user_hierarchy WHERE ancestor_id = OLD.id)
+              AND ancestor_id IN (SELECT ancestor_id FROM user_hierarchy WHERE descendant_id = OLD.id);
+            UPDATE contacts_stats SET version = version + 1 WHERE id = 1;
+        END
+    ''')
+
+def contact_visibility_condition(cursor, user_id, alias='c'):
+    """Look up a user's role and the WHERE condition limiting contacts to what they may see
+
+    Returns (role, condition, params); condition is None when nothing is hidden
+    (admins, unknown users and CONTACTS_ROLE_FILTERING off). Everyone else sees
+    contacts assigned to themselves or to anyone below them in user_hierarchy.
+    """
+    if not user_id:
+        return 'user', None, []
+    cursor.execute('SELECT role FROM users WHERE id = ?', (user_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return 'user', None, []
+    role = row['role'] if isinstance(row, sqlite3.Row) else row[0]
+    if not ROLE_FILTERING or role in UNRESTRICTED_ROLES:
+        return role, None, []
+    condition = f'{alias}.assigned_to IN (SELECT descendant_id FROM user_hierarchy WHERE ancestor_id = ?)'
+    return role, condition, [user_id]
+
+class CountCache:
+    """LRU cache of contact list totals keyed by the query's WHERE clause and params
+
+    Entries remember the contacts_stats version they were computed at and are only
+    served while that version is current (or when the caller accepts an estimate).
+    """
+    
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key, version=None):
+        """Cached count for key at version, or any cached count when version is None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (version is not None and entry[0] != version):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def put(self, key, version, count):
+        with self._lock:
+            self._entries[key] = (version, count)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self):
+        """Drop every cached count (called by in-process contact writes)"""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+contacts_count_cache = CountCache()
+
+def read_contacts_stats(cursor):
+    """Return (total, version) from contacts_stats, or (None, None) on an un-migrated database"""
+    try:
+        cursor.execute('SELECT total, version FROM contacts_stats WHERE id = 1')
+    except sqlite3.OperationalError:
+        return None, None
+    row = cursor.fetchone()
+    return (row[0], row[1]) if row else (None, None)
+
+# Streaming import jobs, kept so progress can be polled while (and shortly after) they run
+IMPORT_JOB_HISTORY = 50
+_import_jobs = OrderedDict()
+_import_jobs_lock = threading.Lock()
+
+def start_import_job(import_id, import_format, importer):
+    """Register a running import; returns False if that id is already running"""
+    with _import_jobs_lock:
+        existing = _import_jobs.get(import_id)
+        if existing and existing['status'] == 'running':
+            return False
+        _import_jobs[import_id] = {
+            'import_id': import_id,
+            'format': import_format,
+            'status': 'running',
+            'started_at': datetime.now().isoformat(),
+            'finished_at': None,
+            'error': None,
+            'importer': importer
+        }
+        _import_jobs.move_to_end(import_id)
+        while len(_import_jobs) > IMPORT_JOB_HISTORY:
+            oldest_id, oldest = next(iter(_import_jobs.items()))
+            if oldest['status'] == 'running':
+                break
+            del _import_jobs[oldest_id]
+        return True
+
+def finish_import_job(import_id, error=None):
+    with _import_jobs_lock:
+        job = _import_jobs.get(import_id)
+        if job:
+            job['status'] = 'failed' if error else 'completed'
+            job['error'] = error
+            job['finished_at'] = datetime.now().isoformat()
+
+def get_import_job(import_id):
+    """Snapshot of an import job's progress, or None"""
+    with _import_jobs_lock:
+        job = _import_jobs.get(import_id)
+        if job is None:
+            return None
+        snapshot = {key: value for key, value in job.items() if key != 'importer'}
+        progress = job['importer'].stats()
+    progress['errors'] = progress['errors'][:20]
+    snapshot.update(progress)
+    return snapshot
+
+def encode_keyset_cursor(sort_value, row_id):
+    """Build the opaque keyset cursor for the row after (sort_value, id), e.g. (created_at, id)"""
+    raw = json.dumps([sort_value, row_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_keyset_cursor(cursor):
+    """Decode a keyset cursor into (sort_value, id); raises ValueError when malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(sort_value, str) or not isinstance(row_id, str):
+        raise ValueError('Invalid cursor')
+    return sort_value, row_id
+
+class KeysetPage:
+    """Iterate up to limit rows from a cursor that was queried with LIMIT limit + 1
+
+    Rows are fetched in batches while the response is written; once iteration
+    ends, count/last_row/has_more hold what the pagination fields need.
+    """
+    def __init__(self, cursor, limit=None, batch_size=500):
+        self.cursor = cursor
+        self.limit = limit
+        self.batch_size = batch_size
+        self.count = 0
+        self.last_row = None
+        self.has_more = False
+    
+    def __iter__(self):
+        while True:
+            rows = self.cursor.fetchmany(self.batch_size)
+            if not rows:
+                return
+            for row in rows:
+                if self.limit is not None and self.count >= self.limit:
+                    # The extra row only tells us another page exists
+                    self.has_more = True
+                    return
+                self.count += 1
+                self.last_row = row
+                yield row
+    
+    def next_cursor(self, sort_column):
+        """Keyset cursor for the following page, or None on the last page"""
+        if not self.has_more or self.last_row is None:
+            return None
+        return encode_keyset_cursor(self.last_row[sort_column], self.last_row['id'])
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer that hands each connection to a bounded pool of worker threads.
+
+    At most ``max_in_flight`` requests are accepted at once (running plus queued);
+    anything beyond that gets an immediate 503 instead of piling up behind a slow
+    search or import.
+    """
+    
+    daemon_threads = True
+    allow_reuse_address = True
+    
+    def __init__(self, server_address, handler_class, max_workers=MAX_WORKERS, max_in_flight=MAX_IN_FLIGHT):
+        self.request_queue_size = max(max_in_flight, 5)
+        super().__init__(server_address, handler_class)
+        self.max_workers = max_workers
+        self.max_in_flight = max(max_in_flight, max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='api-worker')
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+    
+    def process_request(self, request, client_address):
+        """Dispatch the connection to the worker pool, or reject it when saturated"""
+        if not self._slots.acquire(blocking=False):
+            self._reject_busy(request)
+            self.shutdown_request(request)
+            return
+        with self._in_flight_lock:
+            self._in_flight += 1
+        try:
+            self._executor.submit(self._process_request_worker, request, client_address)
+        except RuntimeError:
+            # Executor already shut down
+            self._release_slot()
+            self.shutdown_request(request)
+    
+    def _process_request_worker(self, request, client_address):
+        """Run the handler on a worker thread (mirrors ThreadingMixIn.process_request_thread)"""
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._release_slot()
+    
+    def _release_slot(self):
+        with self._in_flight_lock:
+            self._in_flight -= 1
+        self._slots.release()
+    
+    def keep_alive_available(self):
+        """Keep connections open only while no accepted connection is waiting for a worker"""
+        with self._in_flight_lock:
+            return self._in_flight <= self.max_workers
+    
+    def _reject_busy(self, request):
+        """Answer with 503 when every in-flight slot is taken"""
+        body = json.dumps({
+            'error': True,
+            'message': 'Server busy, please retry',
+            'timestamp': datetime.now().isoformat()
+        }).encode('utf-8')
+        try:
+            request.sendall(
+                b'HTTP/1.0 503 Service Unavailable\r\n'
+                b'Content-Type: application/json\r\n'
+                b'Retry-After: 1\r\n'
+                b'Connection: close\r\n'
+                b'Access-Control-Allow-Origin: *\r\n'
+                + f'Content-Length: {len(body)}\r\n\r\n'.encode('ascii')
+                + body
+            )
+        except OSError:
+            pass
+    
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=True)
+
+
+def create_server(host='localhost', port=PORT, max_workers=MAX_WORKERS, max_in_flight=MAX_IN_FLIGHT):
+    """Create the API server - pooled by default, single-threaded when max_workers is 0"""
+    if max_workers <= 0:
+        return HTTPServer((host, port), ContactsAPI)
+    return PooledHTTPServer((host, port), ContactsAPI, max_workers=max_workers, max_in_flight=max_in_flight)
+
+class ContactsAPI(KeepAliveRequestHandler):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -57,14 +755,13 @@ class ContactsAPI(BaseHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
     
     def _send_json_response(self, data, status_code=200):
-        """Send JSON response with proper headers"""
-        self.send_response(status_code)
-        self.send_header('Content-Type', 'application/json')
-        self._send_cors_headers()
-        self.end_headers()
+        """Send JSON response with proper headers
         
-        response_json = json.dumps(data, indent=2, default=str)
-        self.wfile.write(response_json.encode('utf-8'))
+        Compact unless ?pretty=1 is given. JSONArrayStream/JSONObjectStream values
+        are encoded while they are written, so large lists never sit in memory.
+        """
+        pretty = wants_pretty(parse_qs(urlparse(self.path).query))
+        self._send_body_stream(iter_json_blocks(data, pretty), 'application/json', status_code)
     
     def _send_error(self, message, status_code=400):
         """Send error response"""
@@ -75,138 +772,12 @@ class ContactsAPI(BaseHTTPRequestHandler):
         }, status_code)
     
     def _get_db_connection(self):
-        """Get database connection"""
-        conn = sqlite3.connect(DB_FILE)
-        conn.row_factory = sqlite3.Row  # This enables column access by name
-        return conn
-    
-    def _init_database(self):
-        """Initialize the database with users and contacts tables"""
-        conn = self._get_db_connection()
-        cursor = conn.cursor()
-        
-        # Create users table for role-based access
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(16)))),
-                email TEXT UNIQUE NOT NULL,
-                first_name TEXT,
-                last_name TEXT,
-                role TEXT CHECK(role IN ('user', 'manager', 'supervisor', 'admin')) DEFAULT 'user',
-                manager_id TEXT,
-                is_active INTEGER DEFAULT 1,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (manager_id) REFERENCES users (id)
-            )
-        ''')
-        
-        # Create contacts table (SQLite version of the PostgreSQL schema)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS contacts (
-                id TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(16)))),
-                
-                -- Assignment information
-                assigned_to TEXT,
-                
-                -- Sponsor information
-                sponsor TEXT,
-                sponsor_first TEXT,
-                sponsor_last TEXT,
-                
-                -- User and contact details
-                user_id TEXT,
-                first_name TEXT,
-                last_name TEXT,
-                email TEXT,
-                email_valid INTEGER DEFAULT NULL,
-                phone TEXT,
-                
-                -- Address information
-                address TEXT,
-                city TEXT,
-                state TEXT,
-                zip TEXT,
-                
-                -- Status and rating
-                status TEXT,
-                rating TEXT,
-                
-                -- Technical details
-                ip_address TEXT,
-                date_created TEXT DEFAULT CURRENT_TIMESTAMP,
-                timezone TEXT,
-                
-                -- Phone type information
-                cell INTEGER DEFAULT NULL,
-                carrier TEXT,
-                landline INTEGER DEFAULT NULL,
-                voip INTEGER DEFAULT NULL,
-                other_phone INTEGER DEFAULT NULL,
-                foreign_number INTEGER DEFAULT NULL,
-                country TEXT DEFAULT 'US',
-                
-                -- Metadata
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                
-                FOREIGN KEY (assigned_to) REFERENCES users (id)
-            )
-        ''')
-        
-        # Create indexes for users table
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_role ON users(role)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_manager ON users(manager_id)')
-        
-        # Create indexes for contacts table
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_contacts_assigned_to ON contacts(assigned_to)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_contacts_email ON contacts(email)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_contacts_phone ON contacts(phone)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_contacts_name ON contacts(first_name, last_name)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_contacts_sponsor ON contacts(sponsor)')
-        
-        conn.commit()
-        
-        # Create default admin user if none exists
-        cursor.execute('SELECT COUNT(*) FROM users WHERE role = "admin"')
-        admin_count = cursor.fetchone()[0]
-        
-        if admin_count == 0:
-            admin_id = str(uuid.uuid4())
-            cursor.execute('''
-                INSERT INTO users (id, email, first_name, last_name, role, is_active)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (admin_id, 'admin@sparky.com', 'Admin', 'User', 'admin', 1))
-            conn.commit()
-            print(f"✅ Created default admin user: admin@sparky.com")
-        
-        # Check if manager user exists (the one used by frontend)
-        cursor.execute('SELECT COUNT(*) FROM users WHERE id = ?', ('user-manager-example-com',))
-        manager_count = cursor.fetchone()[0]
-        
-        if manager_count == 0:
-            cursor.execute('''
-                INSERT INTO users (id, email, first_name, last_name, role, is_active)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', ('user-manager-example-com', 'john+3@tpnlife.com', 'John', 'Manager', 'manager', 1))
-            conn.commit()
-            print(f"✅ Created manager user: user-manager-example-com")
-        
-        # Debug: Show all users
-        cursor.execute('SELECT id, email, role FROM users')
-        users = cursor.fetchall()
-        print(f"[DEBUG] Users in database:")
-        for user in users:
-            print(f"  ID: {user[0]}, Email: {user[1]}, Role: {user[2]}")
-        
-        conn.close()
+        """Get this worker thread's pooled database connection (close() returns it to the pool)"""
+        return get_db_pool().get_connection()
     
     def do_OPTIONS(self):
         """Handle preflight requests"""
-        self.send_response(200)
-        self._send_cors_headers()
-        self.end_headers()
+        self._send_empty_response(200)
     
     def do_GET(self):
         """Handle GET requests"""
@@ -246,56 +817,36 @@ class ContactsAPI(BaseHTTPRequestHandler):
         elif path == '/api/contacts':
             print(f"[DEBUG] GET /api/contacts - query: {parsed_path.query}")
             self._handle_get_contacts(parsed_path.query)
+        elif path == '/api/contacts/export':
+            self._handle_export_contacts(parsed_path.query)
+        elif path.startswith('/api/contacts/import/'):
+            self._handle_get_import_progress(path[len('/api/contacts/import/'):])
         elif path == '/api/users':
             self._handle_get_users(parsed_path.query)
         elif path == '/api/health':
             self._handle_health_check()
         elif path == '/api/delivery-reports':
-            self._handle_get_delivery_reports()
+            self._handle_get_delivery_reports(parsed_path.query)
+        elif path == '/api/delivery-stats':
+            self._handle_get_delivery_stats(parsed_path.query)
         else:
             self._send_error('Endpoint not found', 404)
     
     def _serve_static_file(self, filename):
         """Serve static files (CSS, JS, images)"""
         try:
-            static_path = Path(__file__).parent / 'static' / filename
-            if static_path.exists() and static_path.is_file():
-                # Determine content type
-                content_type = 'text/plain'
-                if filename.endswith('.css'):
-                    content_type = 'text/css'
-                elif filename.endswith('.js'):
-                    content_type = 'application/javascript'
-                elif filename.endswith('.png'):
-                    content_type = 'image/png'
-                elif filename.endswith('.jpg') or filename.endswith('.jpeg'):
-                    content_type = 'image/jpeg'
-                elif filename.endswith('.gif'):
-                    content_type = 'image/gif'
-                elif filename.endswith('.svg'):
-                    content_type = 'image/svg+xml'
-                
-                # Read file
-                if content_type.startswith('image/'):
-                    with open(static_path, 'rb') as f:
-                        content = f.read()
-                    
-                    self.send_response(200)
-                    self.send_header('Content-Type', content_type)
-                    self._send_cors_headers()
-                    self.end_headers()
-                    self.wfile.write(content)
-                else:
-                    with open(static_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    
-                    self.send_response(200)
-                    self.send_header('Content-Type', content_type)
-                    self._send_cors_headers()
-                    self.end_headers()
-                    self.wfile.write(content.encode('utf-8'))
-            else:
+            static_dir = (Path(__file__).parent / 'static').resolve()
+            static_path = (static_dir / filename).resolve()
+            if static_dir not in static_path.parents:
+                self._send_error(f'Static file not found: {filename}', 404)
+                return
+            
+            content_type = STATIC_CONTENT_TYPES.get(static_path.suffix.lower(), 'text/plain')
+            asset = asset_cache.get(static_path, content_type)
+            if asset is None:
                 self._send_error(f'Static file not found: {filename}', 404)
+            else:
+                self._send_cached_asset(asset, STATIC_CACHE_CONTROL)
         except Exception as e:
             self._send_error(f'Error serving static file: {str(e)}', 500)
     
@@ -303,20 +854,40 @@ class ContactsAPI(BaseHTTPRequestHandler):
         """Serve HTML files"""
         try:
             file_path = Path(__file__).parent / filename
-            if file_path.exists():
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                self.send_response(200)
-                self.send_header('Content-Type', 'text/html; charset=utf-8')
-                self._send_cors_headers()
-                self.end_headers()
-                self.wfile.write(content.encode('utf-8'))
-            else:
+            asset = asset_cache.get(file_path, 'text/html; charset=utf-8')
+            if asset is None:
                 self._send_error(f'File not found: {filename}', 404)
+            else:
+                self._send_cached_asset(asset, HTML_CACHE_CONTROL)
         except Exception as e:
             self._send_error(f'Error serving file: {str(e)}', 500)
     
+    def _send_cached_asset(self, asset, cache_control):
+        """Send a cached asset, answering 304 when the client's copy is current"""
+        if asset.not_modified(self.headers.get('If-None-Match'), self.headers.get('If-Modified-Since')):
+            self.send_response(304)
+            self.send_header('ETag', asset.etag)
+            self.send_header('Last-Modified', asset.last_modified)
+            self.send_header('Cache-Control', cache_control)
+            self.send_header('Vary', 'Accept-Encoding')
+            self._send_cors_headers()
+            self.end_headers()
+            return
+        
+        encoding, body = asset.variant(self.headers.get('Accept-Encoding'))
+        self.send_response(200)
+        self.send_header('Content-Type', asset.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('ETag', asset.etag)
+        self.send_header('Last-Modified', asset.last_modified)
+        self.send_header('Cache-Control', cache_control)
+        self.send_header('Vary', 'Accept-Encoding')
+        self._send_cors_headers()
+        self.end_headers()
+        self.wfile.write(body)
+    
     def do_PUT(self):
         """Handle PUT requests"""
         parsed_path = urlparse(self.path)
@@ -328,6 +899,16 @@ class ContactsAPI(BaseHTTPRequestHandler):
         else:
             self._send_error('Endpoint not found', 404)
     
+    def do_DELETE(self):
+        """Handle DELETE requests"""
+        parsed_path = urlparse(self.path)
+        path = parsed_path.path
+        
+        if path == '/api/delivery-reports':
+            self._handle_delete_delivery_reports(parsed_path.query)
+        else:
+            self._send_error('Endpoint not found', 404)
+    
     def do_POST(self):
         """Handle POST requests"""
         parsed_path = urlparse(self.path)
@@ -335,8 +916,12 @@ class ContactsAPI(BaseHTTPRequestHandler):
         
         if path == '/api/contacts/import':
             self._handle_import_contacts()
+        elif path == '/api/contacts/import/stream':
+            self._handle_stream_import_contacts(parsed_path.query)
         elif path == '/api/contacts':
             self._handle_create_contact()
+        elif path == '/api/contacts/bulk-update':
+            self._handle_bulk_update_contacts(parsed_path.query)
         elif path == '/api/delivery-reports':
             self._handle_delivery_reports()
         elif path == '/api/webhook/clicksend':
@@ -350,7 +935,14 @@ class ContactsAPI(BaseHTTPRequestHandler):
             'status': 'healthy',
             'service': 'contacts-api',
             'timestamp': datetime.now().isoformat(),
-            'database': 'connected'
+            'database': 'connected',
+            'database_pool': get_db_pool().stats(),
+            'count_cache': contacts_count_cache.stats(),
+            'delivery_ingest': get_delivery_writer().stats(),
+            'asset_cache': asset_cache.stats(),
+            'background_indexes': _index_builder.stats() if _index_builder is not None else None,
+            'startup_ms': startup_ms,
+            'delivery_partitions': _partition_maintainer.stats() if _partition_maintainer is not None else None
         })
     
     def _handle_get_contacts(self, query_string):
@@ -361,13 +953,28 @@ class ContactsAPI(BaseHTTPRequestHandler):
         try:
             query_params = parse_qs(query_string) if query_string else {}
             
-            # Get pagination parameters
+            # How to fill pagination.total: exact (default), estimate (may be stale), or none
+            count_mode = query_params.get('count', ['exact'])[0]
+            if count_mode not in ('exact', 'estimate', 'none'):
+                self._send_error("count must be one of: exact, estimate, none", 400)
+                return
+            
+            # Get pagination parameters - 'cursor' (keyset) takes precedence over 'page' (offset)
             page = int(query_params.get('page', [1])[0])
             per_page = int(query_params.get('per_page', [100])[0])
             offset = (page - 1) * per_page
+            cursor_token = query_params.get('cursor', [None])[0]
+            after_key = None
+            if cursor_token:
+                try:
+                    after_key = decode_keyset_cursor(cursor_token)
+                except ValueError as e:
+                    self._send_error(str(e), 400)
+                    return
             
-            # Get search parameter
-            search = query_params.get('search', [''])[0]
+            # Get search parameter ('sort=relevance' ranks full-text matches instead of newest first)
+            search = query_params.get('search', [''])[0].strip()
+            sort = query_params.get('sort', ['newest'])[0]
             
             # Get current user info for role-based filtering
             current_user_id = query_params.get('current_user_id', [None])[0]
@@ -379,39 +986,30 @@ class ContactsAPI(BaseHTTPRequestHandler):
             params = []
             
             # Get user role and build role-based access control
-            user_role = 'user'  # Default role
             print(f"[DEBUG] Looking up user: {current_user_id}")
-            if current_user_id:
-                cursor.execute('SELECT role FROM users WHERE id = ?', (current_user_id,))
-                user_result = cursor.fetchone()
-                print(f"[DEBUG] User lookup result: {user_result}")
-                if user_result:
-                    user_role = user_result['role']
-                    print(f"[DEBUG] Found user role: {user_role}")
-                else:
-                    print(f"[DEBUG] User not found, using default role: {user_role}")
-            else:
-                print(f"[DEBUG] No current_user_id provided, using default role: {user_role}")
+            user_role, visibility_condition, visibility_params = contact_visibility_condition(cursor, current_user_id)
+            print(f"[DEBUG] User role: {user_role}, filtered: {visibility_condition is not None}")
             
             # Build base query with role-based filtering
-            # TEMPORARY: Disable all filtering for debugging
             base_query = 'FROM contacts c LEFT JOIN users u ON c.assigned_to = u.id'
             role_conditions = []
+            if visibility_condition:
+                role_conditions.append(visibility_condition)
+                params.extend(visibility_params)
             
             where_conditions = role_conditions.copy()
             
             # Add search conditions
-            if search:
-                search_conditions = '''(
-                    c.first_name LIKE ? OR 
-                    c.last_name LIKE ? OR 
-                    c.email LIKE ? OR 
-                    c.phone LIKE ? OR
-                    c.sponsor LIKE ?
-                )'''
-                where_conditions.append(search_conditions)
-                search_param = f'%{search}%'
-                params.extend([search_param] * 5)
+            search_condition, search_params, search_mode = contact_search_condition(conn, search)
+            use_fts = search_mode == 'fulltext'
+            rank_by_relevance = use_fts and sort == 'relevance'
+            if rank_by_relevance:
+                base_query += ' JOIN contacts_fts f ON f.rowid = c.rowid'
+                where_conditions.append('f.contacts_fts MATCH ?')
+                params.append(fts_phrase(search))
+            elif search_condition:
+                where_conditions.append(search_condition)
+                params.extend(search_params)
             
             # Combine WHERE conditions
             where_clause = ''
@@ -419,49 +1017,87 @@ class ContactsAPI(BaseHTTPRequestHandler):
                 where_clause = 'WHERE ' + ' AND '.join(where_conditions)
             
             # Get total count
-            count_query = f'SELECT COUNT(*) {base_query} {where_clause}'
-            print(f"[DEBUG] User role: {user_role}")
-            print(f"[DEBUG] Count query: {count_query}")
-            print(f"[DEBUG] Query params: {params}")
-            import sys
-            sys.stdout.flush()
-            cursor.execute(count_query, params)
-            total_count = cursor.fetchone()[0]
-            print(f"[DEBUG] Total count result: {total_count}")
-            sys.stdout.flush()
+            total_count = None
+            total_is_estimate = False
+            if count_mode != 'none':
+                stats_total, stats_version = read_contacts_stats(cursor)
+                count_key = (base_query, where_clause, tuple(params))
+                if not where_conditions and stats_total is not None:
+                    # Unfiltered total is maintained by triggers - no scan needed
+                    total_count = stats_total
+                elif count_mode == 'estimate':
+                    total_count = contacts_count_cache.get(count_key)
+                    total_is_estimate = total_count is not None
+                elif stats_version is not None:
+                    total_count = contacts_count_cache.get(count_key, stats_version)
+                
+                if total_count is None:
+                    count_query = f'SELECT COUNT(*) {base_query} {where_clause}'
+                    print(f"[DEBUG] User role: {user_role}")
+                    print(f"[DEBUG] Count query: {count_query}")
+                    print(f"[DEBUG] Query params: {params}")
+                    cursor.execute(count_query, params)
+                    total_count = cursor.fetchone()[0]
+                    if stats_version is not None:
+                        contacts_count_cache.put(count_key, stats_version, total_count)
+                    print(f"[DEBUG] Total count result: {total_count}")
+                    sys.stdout.flush()
             
             # Get contacts with pagination
+            # Keyset mode seeks straight to (created_at, id) via idx_contacts_created_id,
+            # so deep pages cost the same as the first one
+            page_params = list(params)
+            order_clause = 'ORDER BY c.created_at DESC, c.id DESC'
+            if rank_by_relevance:
+                # bm25 rank order has no keyset - relevance results page by offset
+                after_key = None
+                order_clause = 'ORDER BY f.rank, c.created_at DESC'
+            if after_key:
+                keyset_condition = '(c.created_at, c.id) < (?, ?)'
+                page_where = f'{where_clause} AND {keyset_condition}' if where_clause else f'WHERE {keyset_condition}'
+                page_params.extend(after_key)
+                limit_clause = 'LIMIT ?'
+                page_params.append(per_page + 1)
+            else:
+                page_where = where_clause
+                limit_clause = 'LIMIT ? OFFSET ?'
+                page_params.extend([per_page + 1, offset])
+            
             contacts_query = f'''
                 SELECT c.*, 
                        u.first_name as assigned_first_name, 
                        u.last_name as assigned_last_name,
                        u.email as assigned_email
                 {base_query} 
-                {where_clause}
-                ORDER BY c.created_at DESC
-                LIMIT ? OFFSET ?
+                {page_where}
+                {order_clause}
+                {limit_clause}
             '''
-            cursor.execute(contacts_query, params + [per_page, offset])
-            
-            contacts = []
-            for row in cursor.fetchall():
-                contact = dict(row)
-                contacts.append(contact)
-            
-            conn.close()
-            
-            self._send_json_response({
-                'contacts': contacts,
-                'pagination': {
-                    'page': page,
-                    'per_page': per_page,
-                    'total': total_count,
-                    'pages': (total_count + per_page - 1) // per_page
-                },
-                'search': search,
-                'user_role': user_role,
-                'filtered_by_role': current_user_id is not None
-            })
+            cursor.execute(contacts_query, page_params)
+            
+            # Contacts are streamed from the cursor; pagination is filled in after them
+            contacts_page = KeysetPage(cursor, per_page)
+            try:
+                self._send_json_response({
+                    'contacts': JSONArrayStream(dict(row) for row in contacts_page),
+                    'pagination': lambda: {
+                        'page': None if after_key else page,
+                        'per_page': per_page,
+                        'total': total_count,
+                        'total_is_estimate': total_is_estimate,
+                        'pages': (total_count + per_page - 1) // per_page if total_count is not None else None,
+                        'cursor': cursor_token,
+                        'next_cursor': None if rank_by_relevance else contacts_page.next_cursor('created_at'),
+                        'has_more': contacts_page.has_more
+                    },
+                    'search': search,
+                    'search_mode': search_mode,
+                    'sort': 'relevance' if rank_by_relevance else 'newest',
+                    'user_role': user_role,
+                    'filtered_by_role': visibility_condition is not None
+                })
+            finally:
+                conn.close()
             
         except Exception as e:
             print(f"Error in get_contacts: {e}")
@@ -472,8 +1108,7 @@ class ContactsAPI(BaseHTTPRequestHandler):
         """Handle CSV import of contacts"""
         try:
             # Get request body
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
+            post_data = self._read_request_body()
             
             # Parse JSON data
             import_data = json.loads(post_data.decode('utf-8'))
@@ -483,79 +1118,37 @@ class ContactsAPI(BaseHTTPRequestHandler):
                 self._send_error('No contacts data provided')
                 return
             
-            conn = self._get_db_connection()
-            cursor = conn.cursor()
+            on_duplicate = import_data.get('on_duplicate') or DEFAULT_ON_DUPLICATE
+            if on_duplicate not in ON_DUPLICATE_MODES:
+                self._send_error(f"on_duplicate must be one of: {', '.join(ON_DUPLICATE_MODES)}")
+                return
             
-            imported_count = 0
-            errors = []
+            conn = self._get_db_connection()
+            importer = BulkContactImporter(conn, on_duplicate=on_duplicate)
+            try:
+                result = importer.import_contacts(contacts_data)
+            finally:
+                conn.close()
+                contacts_count_cache.invalidate()
             
-            for i, contact_data in enumerate(contacts_data):
-                try:
-                    # Generate UUID for new contact
-                    contact_id = str(uuid.uuid4())
-                    
-                    # Prepare insert data with validation
-                    insert_data = {
-                        'id': contact_id,
-                        'assigned_to': contact_data.get('assigned_to', ''),
-                        'sponsor': contact_data.get('sponsor', ''),
-                        'sponsor_first': contact_data.get('sponsor_first', ''),
-                        'sponsor_last': contact_data.get('sponsor_last', ''),
-                        'user_id': contact_data.get('user_id', ''),
-                        'first_name': contact_data.get('first_name', ''),
-                        'last_name': contact_data.get('last_name', ''),
-                        'email': contact_data.get('email', ''),
-                        'email_valid': self._convert_to_bool(contact_data.get('email_valid')),
-                        'phone': contact_data.get('phone', ''),
-                        'address': contact_data.get('address', ''),
-                        'city': contact_data.get('city', ''),
-                        'state': contact_data.get('state', ''),
-                        'zip': contact_data.get('zip', ''),
-                        'status': contact_data.get('status', ''),
-                        'rating': contact_data.get('rating', ''),
-                        'ip_address': contact_data.get('ip_address', ''),
-                        'date_created': contact_data.get('date_created', ''),
-                        'timezone': contact_data.get('timezone', ''),
-                        'cell': self._convert_to_bool(contact_data.get('cell')),
-                        'carrier': contact_data.get('carrier', ''),
-                        'landline': self._convert_to_bool(contact_data.get('landline')),
-                        'voip': self._convert_to_bool(contact_data.get('voip')),
-                        'other_phone': self._convert_to_bool(contact_data.get('other_phone')),
-                        'foreign_number': self._convert_to_bool(contact_data.get('foreign_number')),
-                        'country': contact_data.get('country', 'US'),
-                        'created_at': datetime.now().isoformat(),
-                        'updated_at': datetime.now().isoformat()
-                    }
-                    
-                    # Convert empty strings to None for nullable fields
-                    for key, value in insert_data.items():
-                        if value == '':
-                            insert_data[key] = None
-                    
-                    # Insert contact
-                    columns = ', '.join(insert_data.keys())
-                    placeholders = ', '.join(['?' for _ in insert_data])
-                    query = f'INSERT INTO contacts ({columns}) VALUES ({placeholders})'
-                    
-                    cursor.execute(query, list(insert_data.values()))
-                    imported_count += 1
-                    
-                except Exception as row_error:
-                    errors.append(f'Row {i + 1}: {str(row_error)}')
-                    print(f"Error importing row {i + 1}: {row_error}")
-            
-            conn.commit()
-            conn.close()
+            imported_count = result['imported']
+            errors = result['errors']
+            print(f"✅ Imported {imported_count} contacts in {result['elapsed_seconds']}s ({result['rows_per_second']} rows/s)")
             
             response_data = {
                 'success': True,
                 'imported': imported_count,
+                'updated': result['updated'],
+                'skipped': result['skipped'],
+                'on_duplicate': on_duplicate,
                 'total_submitted': len(contacts_data),
-                'errors': errors
+                'errors': errors,
+                'elapsed_seconds': result['elapsed_seconds'],
+                'rows_per_second': result['rows_per_second']
             }
             
             if errors:
-                response_data['message'] = f'Imported {imported_count} contacts with {len(errors)} errors'
+                response_data['message'] = f"Imported {imported_count} contacts with {result['error_count']} errors"
             else:
                 response_data['message'] = f'Successfully imported {imported_count} contacts'
             
@@ -566,25 +1159,120 @@ class ContactsAPI(BaseHTTPRequestHandler):
             print(traceback.format_exc())
             self._send_error(f'Error importing contacts: {str(e)}', 500)
     
+    def _handle_stream_import_contacts(self, query_string):
+        """Handle POST /api/contacts/import/stream - raw CSV or NDJSON body, parsed and inserted incrementally"""
+        query_params = parse_qs(query_string) if query_string else {}
+        content_type = (self.headers.get('Content-Type') or '').split(';')[0].strip().lower()
+        import_format = query_params.get('format', [None])[0]
+        if not import_format:
+            import_format = 'ndjson' if content_type in ('application/x-ndjson', 'application/ndjson', 'application/jsonl') else 'csv'
+        if import_format not in ('csv', 'ndjson'):
+            self._send_error('format must be csv or ndjson')
+            return
+        
+        chunked = 'chunked' in (self.headers.get('Transfer-Encoding') or '').lower()
+        content_length = self.headers.get('Content-Length')
+        if not chunked and content_length is None:
+            self._send_error('Content-Length or chunked Transfer-Encoding required', 411)
+            return
+        
+        on_duplicate = query_params.get('on_duplicate', [DEFAULT_ON_DUPLICATE])[0]
+        if on_duplicate not in ON_DUPLICATE_MODES:
+            self._send_error(f"on_duplicate must be one of: {', '.join(ON_DUPLICATE_MODES)}")
+            return
+        
+        import_id = query_params.get('import_id', [None])[0] or str(uuid.uuid4())
+        
+        conn = self._get_db_connection()
+        importer = BulkContactImporter(conn, on_duplicate=on_duplicate)
+        if not start_import_job(import_id, import_format, importer):
+            conn.close()
+            self._send_error(f'Import {import_id} is already running', 409)
+            return
+        
+        try:
+            blocks = iter_body_blocks(self.rfile, int(content_length or 0), chunked=chunked)
+            lines = iter_text_lines(blocks)
+            rows = iter_csv_contacts(lines) if import_format == 'csv' else iter_ndjson_contacts(lines)
+            result = importer.import_contacts(rows)
+            self._mark_request_body_read()
+            finish_import_job(import_id)
+        except Exception as e:
+            finish_import_job(import_id, error=str(e))
+            print(f"Error in stream import {import_id}: {e}")
+            print(traceback.format_exc())
+            # The rest of the body may still be unread - end_headers closes the connection
+            self._send_error(f'Error importing contacts: {str(e)}', 500)
+            return
+        finally:
+            conn.close()
+            contacts_count_cache.invalidate()
+        
+        print(f"✅ Stream import {import_id}: {result['imported']} contacts in {result['elapsed_seconds']}s ({result['rows_per_second']} rows/s)")
+        response_data = {'success': True, 'import_id': import_id, 'format': import_format}
+        response_data.update(result)
+        if result['error_count']:
+            response_data['message'] = f"Imported {result['imported']} contacts with {result['error_count']} errors"
+        else:
+            response_data['message'] = f"Successfully imported {result['imported']} contacts"
+        self._send_json_response(response_data)
+    
+    def _handle_export_contacts(self, query_string):
+        """Handle GET /api/contacts/export - stream every matching contact as a file
+        
+        format=csv (default), ndjson, or parquet/arrow when pyarrow is installed.
+        search, current_user_id and <field>=value filters work as in the list and
+        bulk-update endpoints.
+        """
+        try:
+            query_params = parse_qs(query_string) if query_string else {}
+            export_format = query_params.get('format', ['csv'])[0]
+            if export_format not in available_formats():
+                self._send_error(f"format must be one of: {', '.join(available_formats())}")
+                return
+            search = query_params.get('search', [''])[0].strip()
+            current_user_id = query_params.get('current_user_id', [None])[0]
+            contact_filter = {
+                field: values[0] for field, values in query_params.items()
+                if field not in ('format', 'search', 'current_user_id', 'pretty')
+            }
+            
+            conn = self._get_db_connection()
+            try:
+                cursor, columns = open_contact_export(conn, search, contact_filter, current_user_id)
+                filename = f"contacts-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+                self._send_body_stream(
+                    iter_export_blocks(cursor, columns, export_format),
+                    EXPORT_CONTENT_TYPES[export_format],
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+                    compressible=export_format not in COLUMNAR_FORMATS
+                )
+            finally:
+                conn.close()
+            
+        except ValueError as e:
+            self._send_error(str(e))
+        except Exception as e:
+            print(f"Error exporting contacts: {e}")
+            print(traceback.format_exc())
+            self._send_error(f'Error exporting contacts: {str(e)}', 500)
+    
+    def _handle_get_import_progress(self, import_id):
+        """Handle GET /api/contacts/import/<import_id> - progress of a streaming import"""
+        job = get_import_job(import_id)
+        if job is None:
+            self._send_error(f'Import not found: {import_id}', 404)
+            return
+        self._send_json_response(job)
+    
     def _convert_to_bool(self, value):
         """Convert various values to boolean for database storage"""
-        if value is None or value == '':
-            return None
-        if isinstance(value, bool):
-            return int(value)
-        if isinstance(value, str):
-            value = value.lower().strip()
-            if value in ('true', '1', 'yes', 'y', 'on'):
-                return 1
-            elif value in ('false', '0', 'no', 'n', 'off'):
-                return 0
-        return None
+        return convert_to_bool(value)
     
     def _handle_create_contact(self):
         """Handle creating a single contact"""
         try:
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
+            post_data = self._read_request_body()
             contact_data = json.loads(post_data.decode('utf-8'))
             
             # Implementation for single contact creation
@@ -598,8 +1286,7 @@ class ContactsAPI(BaseHTTPRequestHandler):
         """Handle updating a single contact field"""
         try:
             # Get request body
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
+            post_data = self._read_request_body()
             
             # Parse JSON data
             update_data = json.loads(post_data.decode('utf-8'))
@@ -617,14 +1304,7 @@ class ContactsAPI(BaseHTTPRequestHandler):
             
             for field, value in update_data.items():
                 # Validate field name to prevent SQL injection
-                allowed_fields = [
-                    'assigned_to', 'sponsor', 'sponsor_first', 'sponsor_last', 'user_id', 'first_name', 'last_name',
-                    'email', 'email_valid', 'phone', 'address', 'city', 'state', 'zip', 'status',
-                    'rating', 'ip_address', 'date_created', 'timezone', 'cell', 'carrier',
-                    'landline', 'voip', 'other_phone', 'foreign_number', 'country'
-                ]
-                
-                if field in allowed_fields:
+                if field in UPDATABLE_CONTACT_FIELDS:
                     set_clauses.append(f'{field} = ?')
                     values.append(value)
             
@@ -632,6 +1312,19 @@ class ContactsAPI(BaseHTTPRequestHandler):
                 self._send_error('No valid fields to update')
                 return
             
+            # Keep the dedupe keys in step with email/phone edits
+            if 'email' in update_data:
+                set_clauses.append('email_normalized = ?')
+                values.append(normalize_email(update_data['email']))
+            if 'phone' in update_data or 'country' in update_data:
+                cursor.execute('SELECT phone, country FROM contacts WHERE id = ?', (contact_id,))
+                existing = cursor.fetchone()
+                if existing:
+                    phone = update_data.get('phone', existing['phone'])
+                    country = update_data.get('country', existing['country'])
+                    set_clauses.append('phone_e164 = ?')
+                    values.append(normalize_phone_e164(phone, country))
+            
             # Add updated_at timestamp
             set_clauses.append('updated_at = ?')
             values.append(datetime.now().isoformat())
@@ -640,7 +1333,12 @@ class ContactsAPI(BaseHTTPRequestHandler):
             query = f"UPDATE contacts SET {', '.join(set_clauses)} WHERE id = ?"
             values.append(contact_id)
             
-            cursor.execute(query, values)
+            try:
+                cursor.execute(query, values)
+            except sqlite3.IntegrityError:
+                conn.close()
+                self._send_error('Another contact already has this email or phone number', 409)
+                return
             
             if cursor.rowcount == 0:
                 self._send_error('Contact not found', 404)
@@ -648,6 +1346,7 @@ class ContactsAPI(BaseHTTPRequestHandler):
             
             conn.commit()
             conn.close()
+            contacts_count_cache.invalidate()
             
             self._send_json_response({
                 'success': True,
@@ -660,6 +1359,82 @@ class ContactsAPI(BaseHTTPRequestHandler):
             print(traceback.format_exc())
             self._send_error(f'Error updating contact: {str(e)}', 500)
     
+    def _handle_bulk_update_contacts(self, query_string=''):
+        """Handle POST /api/contacts/bulk-update - apply one patch to many contacts
+        
+        Body: {"ids": [...]} or {"filter": {"search": ..., "<field>": value}}, plus
+        {"patch": {"assigned_to": "..."}}. Optional current_user_id limits the update
+        to contacts that user can see; dry_run returns the matching ids without writing.
+        """
+        try:
+            body = json.loads(self._read_request_body().decode('utf-8') or '{}')
+            query_params = parse_qs(query_string) if query_string else {}
+            ids = body.get('ids')
+            contact_filter = body.get('filter')
+            patch = body.get('patch') or {}
+            current_user_id = body.get('current_user_id') or query_params.get('current_user_id', [None])[0]
+            dry_run = bool(body.get('dry_run'))
+            
+            if (ids is None) == (contact_filter is None):
+                self._send_error('Provide either ids or filter')
+                return
+            if ids is not None and (not isinstance(ids, list) or not all(isinstance(i, str) for i in ids)):
+                self._send_error('ids must be a list of contact ids')
+                return
+            if contact_filter is not None and (not isinstance(contact_filter, dict) or not contact_filter):
+                self._send_error('filter must be an object with at least one condition')
+                return
+            if not isinstance(patch, dict) or not patch:
+                self._send_error('patch must be an object with at least one field')
+                return
+            
+            conn = self._get_db_connection()
+            cursor = conn.cursor()
+            try:
+                if patch.get('assigned_to') is not None:
+                    cursor.execute('SELECT 1 FROM users WHERE id = ?', (patch['assigned_to'],))
+                    if cursor.fetchone() is None:
+                        self._send_error(f"Unknown user for assigned_to: {patch['assigned_to']}")
+                        return
+                
+                _, visibility_condition, visibility_params = contact_visibility_condition(cursor, current_user_id)
+                
+                if contact_filter is not None:
+                    conditions, params = contact_filter_conditions(conn, contact_filter)
+                    if visibility_condition:
+                        conditions.append(visibility_condition)
+                        params.extend(visibility_params)
+                    cursor.execute(
+                        f"SELECT c.id FROM contacts c WHERE {' AND '.join(conditions)} LIMIT ?",
+                        params + [MAX_BULK_UPDATE_IDS + 1]
+                    )
+                    ids = [row[0] for row in cursor.fetchall()]
+                
+                if len(ids) > MAX_BULK_UPDATE_IDS:
+                    self._send_error(f'Bulk update is limited to {MAX_BULK_UPDATE_IDS} contacts per request', 413)
+                    return
+                
+                updater = BulkContactUpdater(conn, patch)
+                if dry_run:
+                    self._send_json_response({'success': True, 'dry_run': True, 'matched': len(ids), 'ids': ids})
+                    return
+                result = updater.update_ids(ids, visibility_condition, visibility_params)
+            finally:
+                conn.close()
+            
+            contacts_count_cache.invalidate()
+            print(f"✅ Bulk update: {result['updated']} of {result['matched']} contacts in {result['elapsed_seconds']}s")
+            response_data = {'success': True}
+            response_data.update(result)
+            self._send_json_response(response_data)
+            
+        except ValueError as e:
+            self._send_error(str(e))
+        except Exception as e:
+            print(f"Error in bulk update: {e}")
+            print(traceback.format_exc())
+            self._send_error(f'Error updating contacts: {str(e)}', 500)
+    
     def _handle_get_users(self, query_string):
         """Get users with role-based filtering - MODIFIED: Now shows all users to everyone"""
         try:
@@ -685,15 +1460,24 @@ class ContactsAPI(BaseHTTPRequestHandler):
                     current_role = current_user['role']
             
             # MODIFIED: Always show admin view (all users) regardless of actual role
-            users_query = '''
-                SELECT u.id, u.email, u.first_name, u.last_name, u.role, u.is_active,
+            # scope=team narrows to the current user's reports (any depth) via user_hierarchy
+            scope = query_params.get('scope', ['all'])[0]
+            team_join = ''
+            users_params = []
+            if scope == 'team' and current_user_id:
+                team_join = 'JOIN user_hierarchy h ON h.descendant_id = u.id AND h.ancestor_id = ?'
+                users_params.append(current_user_id)
+            users_query = f'''
+                SELECT u.id, u.email, u.first_name, u.last_name, u.role, u.is_active, u.manager_id,
                        m.first_name as manager_first_name, m.last_name as manager_last_name
+                       {', h.depth as depth' if team_join else ''}
                 FROM users u
+                {team_join}
                 LEFT JOIN users m ON u.manager_id = m.id
                 WHERE u.is_active = 1
                 ORDER BY u.role, u.first_name, u.last_name
             '''
-            cursor.execute(users_query)
+            cursor.execute(users_query, users_params)
             
             users = []
             for row in cursor.fetchall():
@@ -717,105 +1501,224 @@ class ContactsAPI(BaseHTTPRequestHandler):
         """Handle incoming delivery reports from the SMS provider"""
         try:
             # Get request body
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
+            post_data = self._read_request_body()
             
             # Parse JSON data
             report_data = json.loads(post_data.decode('utf-8'))
             
             # Validate required fields
+            if not isinstance(report_data, dict):
+                raise InvalidReport('Delivery report must be an object')
             required_fields = ['id', 'message_id', 'phone_number', 'status', 'timestamp']
             for field in required_fields:
                 if field not in report_data:
                     self._send_error(f'Missing required field: {field}', 400)
                     return
             
-            conn = self._get_db_connection()
-            cursor = conn.cursor()
-            
-            # Insert or update delivery report
-            report_id = report_data['id']
-            cursor.execute('''
-                INSERT INTO delivery_reports (id, message_id, phone_number, status, timestamp, error_code, error_text, provider)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ON CONFLICT(id) DO UPDATE SET
-                    status = excluded.status,
-                    timestamp = excluded.timestamp,
-                    error_code = excluded.error_code,
-                    error_text = excluded.error_text,
-                    provider = excluded.provider,
-                    received_at = CURRENT_TIMESTAMP
-            ''', (
-                report_id,
-                report_data.get('message_id'),
-                report_data.get('phone_number'),
-                report_data.get('status'),
-                report_data.get('timestamp'),
-                report_data.get('error_code'),
-                report_data.get('error_text'),
-                report_data.get('provider')
-            ))
-            
-            conn.commit()
-            conn.close()
+            # Queue for the group-commit writer and acknowledge right away
+            get_delivery_writer().submit([build_report_row(report_data)])
             
             self._send_json_response({'success': True, 'message': 'Delivery report processed'})
             
+        except InvalidReport as e:
+            self._send_error(str(e), 400)
+        except IngestQueueFull as e:
+            self._send_error(str(e), 503)
         except Exception as e:
             print(f"Error in delivery report handling: {e}")
             print(traceback.format_exc())
             self._send_error(f'Error processing delivery report: {str(e)}', 500)
     
-    def _handle_get_delivery_reports(self):
-        """Handle GET /api/delivery-reports - Return all delivery reports"""
+    def _handle_get_delivery_reports(self, query_string=''):
+        """Handle GET /api/delivery-reports - filtered, keyset-paginated delivery reports
+
+        Filters: since/until (received_at range), status (comma-separated), provider,
+        phone, message_id. limit + cursor page newest-first; without limit every
+        matching report is returned (what the dashboard pages expect).
+        format=ndjson streams one report per line instead of building the dict.
+        """
         try:
-            conn = sqlite3.connect(DB_FILE)
-            cursor = conn.cursor()
+            query_params = parse_qs(query_string) if query_string else {}
+            def param(name):
+                return query_params.get(name, [None])[0]
             
-            cursor.execute('''
-                SELECT id, message_id, phone_number, status, timestamp, 
-                       error_code, error_text, provider, received_at
-                FROM delivery_reports
-                ORDER BY received_at DESC
-            ''')
+            where_conditions = []
+            params = []
+            # Newest partition to read; older ones are only read when a page needs them
+            upper_bound = param('until')
+            if param('since'):
+                where_conditions.append('received_at >= ?')
+                params.append(param('since'))
+            if param('until'):
+                where_conditions.append('received_at < ?')
+                params.append(param('until'))
+            if param('status'):
+                statuses = [status.strip() for status in param('status').split(',') if status.strip()]
+                where_conditions.append(f"status IN ({', '.join('?' for _ in statuses)})")
+                params.extend(statuses)
+            if param('provider'):
+                where_conditions.append('provider = ?')
+                params.append(param('provider'))
+            if param('phone'):
+                where_conditions.append('phone_number = ?')
+                params.append(param('phone'))
+            if param('message_id'):
+                where_conditions.append('message_id = ?')
+                params.append(param('message_id'))
+            
+            cursor_token = param('cursor')
+            if cursor_token:
+                try:
+                    after_key = decode_keyset_cursor(cursor_token)
+                except ValueError as e:
+                    self._send_error(str(e), 400)
+                    return
+                where_conditions.append('(received_at, id) < (?, ?)')
+                params.extend(after_key)
+                upper_bound = min(upper_bound, after_key[0]) if upper_bound else after_key[0]
             
-            reports = cursor.fetchall()
-            conn.close()
+            limit = int(param('limit')) if param('limit') else None
+            if limit is not None and not 1 <= limit <= MAX_DELIVERY_REPORTS_PAGE:
+                self._send_error(f'limit must be between 1 and {MAX_DELIVERY_REPORTS_PAGE}', 400)
+                return
+            
+            conn = self._get_db_connection()
+            rows = iter_report_rows(
+                conn, where_conditions, params, since=param('since'), until=upper_bound,
+                limit=limit + 1 if limit is not None else None
+            )
+            
+            reports_page = KeysetPage(RowIteratorCursor(rows), limit)
+            try:
+                if param('format') == 'ndjson':
+                    self._stream_ndjson_rows(reports_page)
+                    return
+                
+                # Reports keep the dict-by-id shape, streamed from the cursor
+                self._send_json_response({
+                    'success': True,
+                    'reports': JSONObjectStream((report['id'], dict(report)) for report in reports_page),
+                    'count': lambda: reports_page.count,
+                    'pagination': lambda: {
+                        'limit': limit,
+                        'cursor': cursor_token,
+                        'next_cursor': reports_page.next_cursor('received_at'),
+                        'has_more': reports_page.has_more
+                    }
+                })
+            finally:
+                conn.close()
+            
+        except ValueError as e:
+            self._send_error(f'Invalid parameter: {str(e)}', 400)
+        except Exception as e:
+            print(f"[ERROR] Error fetching delivery reports: {e}")
+            self._send_error(f'Error fetching delivery reports: {str(e)}', 500)
+    
+    def _handle_delete_delivery_reports(self, query_string=''):
+        """Handle DELETE /api/delivery-reports?before=YYYY-MM-DD[&archive=1]
+        
+        Drops every delivery report partition whose whole period ends by `before`
+        (archive=1 compacts them to gzipped NDJSON first). Whole partitions only -
+        reports from a partly covered period stay. /api/delivery-stats keeps the
+        counts either way.
+        """
+        try:
+            query_params = parse_qs(query_string) if query_string else {}
+            before = query_params.get('before', [None])[0]
+            if not before:
+                self._send_error('before (YYYY-MM-DD) is required', 400)
+                return
+            before = datetime.fromisoformat(before)
+            archive = query_params.get('archive', [''])[0].lower() in ('1', 'true', 'yes')
             
-            # Convert to dict format
-            report_dict = {}
-            for report in reports:
-                report_dict[report[0]] = {
-                    'id': report[0],
-                    'message_id': report[1],
-                    'phone_number': report[2],
-                    'status': report[3],
-                    'timestamp': report[4],
-                    'error_code': report[5],
-                    'error_text': report[6],
-                    'provider': report[7],
-                    'received_at': report[8]
-                }
+            conn = self._get_db_connection()
+            try:
+                affected = drop_partitions_before(conn, before, archive=archive)
+                conn.commit()
+                remaining = [key for key, _ in list_partitions(conn)]
+            finally:
+                conn.close()
             
             self._send_json_response({
                 'success': True,
-                'reports': report_dict,
-                'count': len(reports)
+                'archived' if archive else 'dropped': affected,
+                'partitions': remaining
             })
             
+        except ValueError as e:
+            self._send_error(f'Invalid parameter: {str(e)}', 400)
         except Exception as e:
-            print(f"[ERROR] Error fetching delivery reports: {e}")
-            self._send_error(f'Error fetching delivery reports: {str(e)}', 500)
+            print(f"[ERROR] Error deleting delivery reports: {e}")
+            self._send_error(f'Error deleting delivery reports: {str(e)}', 500)
+    
+    def _handle_get_delivery_stats(self, query_string=''):
+        """Handle GET /api/delivery-stats - time-bucketed delivery counts from the hourly rollup
+        
+        bucket=hour|day|month (default day), since/until (dates or hours, until exclusive),
+        group_by=comma list of provider,status,error_code (default provider,status),
+        and provider/status/error_code filters (comma-separated values).
+        """
+        try:
+            query_params = parse_qs(query_string) if query_string else {}
+            def param(name, default=None):
+                return query_params.get(name, [default])[0]
+            
+            group_by = [name.strip() for name in param('group_by', 'provider,status').split(',') if name.strip()]
+            filters = {
+                name: [value.strip() for value in param(name).split(',') if value.strip()]
+                for name in ('provider', 'status', 'error_code') if param(name)
+            }
+            bucket = param('bucket', 'day')
+            
+            conn = self._get_db_connection()
+            try:
+                stats = query_delivery_stats(conn, param('since'), param('until'), bucket, group_by, filters)
+            finally:
+                conn.close()
+            
+            totals = {}
+            for row in stats:
+                status = row.get('status', 'all')
+                totals[status] = totals.get(status, 0) + row['count']
+            
+            self._send_json_response({
+                'success': True,
+                'bucket': bucket,
+                'group_by': group_by,
+                'since': param('since'),
+                'until': param('until'),
+                'stats': stats,
+                'totals': totals,
+                'total': sum(totals.values())
+            })
+            
+        except ValueError as e:
+            self._send_error(str(e), 400)
+        except Exception as e:
+            print(f"[ERROR] Error fetching delivery stats: {e}")
+            self._send_error(f'Error fetching delivery stats: {str(e)}', 500)
+    
+    def _stream_ndjson_rows(self, rows, block_rows=500):
+        """Write rows as NDJSON without materializing the result set"""
+        def blocks():
+            lines = []
+            for row in rows:
+                lines.append(json.dumps(dict(row), separators=(',', ':'), default=str) + '\n')
+                if len(lines) >= block_rows:
+                    yield ''.join(lines).encode('utf-8')
+                    lines = []
+            if lines:
+                yield ''.join(lines).encode('utf-8')
+        
+        self._send_body_stream(blocks(), 'application/x-ndjson')
     
     def _handle_clicksend_webhook(self):
         """Handle POST /api/webhook/clicksend - ClickSend delivery report webhook"""
         try:
-            # Get the content length
-            content_length = int(self.headers.get('Content-Length', 0))
-            
             # Read the request body
-            if content_length > 0:
-                post_data = self.rfile.read(content_length)
+            post_data = self._read_request_body()
+            if post_data:
                 webhook_data = json.loads(post_data.decode('utf-8'))
             else:
                 webhook_data = {}
@@ -824,39 +1727,27 @@ class ContactsAPI(BaseHTTPRequestHandler):
             
             # Process the webhook data
             if 'messages' in webhook_data:
-                conn = sqlite3.connect(DB_FILE)
-                cursor = conn.cursor()
-                
+                received_at = datetime.now().isoformat()
+                rows = []
+                if not isinstance(webhook_data['messages'], list):
+                    raise InvalidReport('messages must be a list')
                 for message in webhook_data['messages']:
+                    if not isinstance(message, dict):
+                        raise InvalidReport('Each message must be an object')
                     # Extract message details
                     message_id = message.get('message_id')
-                    phone_number = message.get('to', message.get('phone_number'))
-                    status = message.get('status')
-                    timestamp = message.get('date', datetime.now().isoformat())
-                    error_code = message.get('error_code')
-                    error_text = message.get('error_text')
-                    
-                    # Insert or update delivery report
-                    cursor.execute('''
-                        INSERT OR REPLACE INTO delivery_reports 
-                        (id, message_id, phone_number, status, timestamp, error_code, error_text, provider, received_at)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        message_id or str(uuid.uuid4()),
-                        message_id,
-                        phone_number,
-                        status,
-                        timestamp,
-                        error_code,
-                        error_text,
-                        'clicksend',
-                        datetime.now().isoformat()
-                    ))
-                
-                conn.commit()
-                conn.close()
+                    rows.append(build_report_row({
+                        'id': message_id or str(uuid.uuid4()),
+                        'message_id': message_id,
+                        'phone_number': message.get('to', message.get('phone_number')),
+                        'status': message.get('status'),
+                        'timestamp': message.get('date', received_at),
+                        'error_code': message.get('error_code'),
+                        'error_text': message.get('error_text')
+                    }, provider='clicksend', received_at=received_at))
                 
-                print(f"[DEBUG] Processed {len(webhook_data['messages'])} delivery reports")
+                # Queue for the group-commit writer instead of a connection + commit per callback
+                get_delivery_writer().submit(rows)
             
             # Send success response
             self._send_json_response({
@@ -864,141 +1755,125 @@ class ContactsAPI(BaseHTTPRequestHandler):
                 'message': 'Webhook processed successfully'
             })
             
+        except InvalidReport as e:
+            self._send_error(f'Invalid webhook payload: {e}', 400)
+        except IngestQueueFull as e:
+            self._send_error(str(e), 503)
         except Exception as e:
             print(f"[ERROR] Error processing ClickSend webhook: {e}")
             print(f"[ERROR] Traceback: {traceback.format_exc()}")
             self._send_error(f'Error processing webhook: {str(e)}', 500)
 
+def print_users_debug():
+    """Print every row in users (development startup only)"""
+    conn = sqlite3.connect(DB_FILE)
+    try:
+        users = conn.execute('SELECT id, email, role FROM users').fetchall()
+    finally:
+        conn.close()
+    print(f"[DEBUG] Users in database:")
+    for user in users:
+        print(f"  ID: {user[0]}, Email: {user[1]}, Role: {user[2]}")
+
+def seed_sample_delivery_reports():
+    """Add sample delivery reports for testing when the table is empty (development startup only)"""
+    conn = sqlite3.connect(DB_FILE)
+    try:
+        if conn.execute('SELECT 1 FROM delivery_reports LIMIT 1').fetchone():
+            return
+        
+        sample_reports = [
+            {
+                'id': 'msg-001',
+                'message_id': 'CS-MSG-001',
+                'phone_number': '+1234567890',
+                'status': 'Delivered',
+                'timestamp': '2025-07-06T10:30:00Z',
+                'error_code': None,
+                'error_text': None,
+                'provider': 'clicksend'
+            },
+            {
+                'id': 'msg-002',
+                'message_id': 'CS-MSG-002',
+                'phone_number': '+1234567891',
+                'status': 'Failed',
+                'timestamp': '2025-07-06T10:31:00Z',
+                'error_code': '400',
+                'error_text': 'Invalid phone number',
+                'provider': 'clicksend'
+            },
+            {
+                'id': 'msg-003',
+                'message_id': 'CS-MSG-003',
+                'phone_number': '+1234567892',
+                'status': 'Delivered',
+                'timestamp': '2025-07-06T10:32:00Z',
+                'error_code': None,
+                'error_text': None,
+                'provider': 'clicksend'
+            },
+            {
+                'id': 'msg-004',
+                'message_id': 'CS-MSG-004',
+                'phone_number': '+1234567893',
+                'status': 'Failed',
+                'timestamp': '2025-07-06T10:33:00Z',
+                'error_code': '500',
+                'error_text': 'Carrier rejected',
+                'provider': 'clicksend'
+            },
+            {
+                'id': 'msg-005',
+                'message_id': 'CS-MSG-005',
+                'phone_number': '+1234567894',
+                'status': 'Delivered',
+                'timestamp': '2025-07-06T10:34:00Z',
+                'error_code': None,
+                'error_text': None,
+                'provider': 'clicksend'
+            }
+        ]
+        
+        write_report_rows(conn, [build_report_row(report) for report in sample_reports])
+        conn.commit()
+        print(f"✅ Added {len(sample_reports)} sample delivery reports")
+    finally:
+        conn.close()
+
 def main():
     """Start the API server"""
     # Change to the directory containing the script
     os.chdir(Path(__file__).parent)
     
-    # Initialize database
+    # Bring the schema up to date (a single version check once it is current)
     try:
-        # Create a temporary instance just to initialize the database
-        temp_db = ContactsAPI
-        temp_db._init_database = lambda self: init_database()
-        init_database()
+        init_database(background_indexes=True)
         print(f"✅ Database initialized at {DB_FILE}")
     except Exception as e:
         print(f"Error initializing database: {e}")
         return
     
-    # Initialize delivery reports database
-    try:
-        init_delivery_reports_db()
-        
-        # Add some sample delivery reports for testing
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        # Check if sample data already exists
-        cursor.execute('SELECT COUNT(*) FROM delivery_reports')
-        report_count = cursor.fetchone()[0]
-        
-        if report_count == 0:
-            # Add sample delivery reports
-            sample_reports = [
-                {
-                    'id': 'msg-001',
-                    'message_id': 'CS-MSG-001',
-                    'phone_number': '+1234567890',
-                    'status': 'Delivered',
-                    'timestamp': '2025-07-06T10:30:00Z',
-                    'error_code': None,
-                    'error_text': None,
-                    'provider': 'clicksend'
-                },
-                {
-                    'id': 'msg-002',
-                    'message_id': 'CS-MSG-002',
-                    'phone_number': '+1234567891',
-                    'status': 'Failed',
-                    'timestamp': '2025-07-06T10:31:00Z',
-                    'error_code': '400',
-                    'error_text': 'Invalid phone number',
-                    'provider': 'clicksend'
-                },
-                {
-                    'id': 'msg-003',
-                    'message_id': 'CS-MSG-003',
-                    'phone_number': '+1234567892',
-                    'status': 'Delivered',
-                    'timestamp': '2025-07-06T10:32:00Z',
-                    'error_code': None,
-                    'error_text': None,
-                    'provider': 'clicksend'
-                },
-                {
-                    'id': 'msg-004',
-                    'message_id': 'CS-MSG-004',
-                    'phone_number': '+1234567893',
-                    'status': 'Failed',
-                    'timestamp': '2025-07-06T10:33:00Z',
-                    'error_code': '500',
-                    'error_text': 'Carrier rejected',
-                    'provider': 'clicksend'
-                },
-                {
-                    'id': 'msg-005',
-                    'message_id': 'CS-MSG-005',
-                    'phone_number': '+1234567894',
-                    'status': 'Delivered',
-                    'timestamp': '2025-07-06T10:34:00Z',
-                    'error_code': None,
-                    'error_text': None,
-                    'provider': 'clicksend'
-                }
-            ]
-            
-            for report in sample_reports:
-                cursor.execute('''
-                    INSERT INTO delivery_reports 
-                    (id, message_id, phone_number, status, timestamp, error_code, error_text, provider, received_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    report['id'],
-                    report['message_id'],
-                    report['phone_number'],
-                    report['status'],
-                    report['timestamp'],
-                    report['error_code'],
-                    report['error_text'],
-                    report['provider'],
-                    datetime.now().isoformat()
-                ))
-            
-            conn.commit()
-            print(f"✅ Added {len(sample_reports)} sample delivery reports")
-        
-        conn.close()
-        
-    except Exception as e:
-        print(f"Error initializing delivery reports database: {e}")
-        return
-    
-    # Start server
-    server = HTTPServer(('localhost', PORT), ContactsAPI)
-    print(f"🚀 Contacts API server running at http://localhost:{PORT}")
-    print(f"📊 Health check: http://localhost:{PORT}/api/health")
-    print(f"📋 Contacts endpoint: http://localhost:{PORT}/api/contacts")
-    print(f"📤 Import endpoint: http://localhost:{PORT}/api/contacts/import")
-    print(f"📦 Delivery reports endpoint: http://localhost:{PORT}/api/delivery-reports")
-    print("\nPress Ctrl+C to stop the server")
+    if not PRODUCTION_STARTUP:
+        # Development conveniences; production startup skips these table reads
+        try:
+            print_users_debug()
+            seed_sample_delivery_reports()
+        except Exception as e:
+            print(f"Error adding sample delivery reports: {e}")
+            return
     
-    try:
-        server.serve_forever()
-    except KeyboardInterrupt:
-        print("\n👋 Server stopped")
-        server.shutdown()
-    except Exception as e:
-        print(f"Error initializing delivery reports database: {e}")
-        return
+    start_partition_maintenance()
     
     # Start server
-    server = HTTPServer(('localhost', PORT), ContactsAPI)
-    print(f"🚀 Contacts API server running at http://localhost:{PORT}")
+    global startup_ms
+    server = create_server('localhost', PORT)
+    startup_ms = round((time.perf_counter() - _import_started) * 1000, 1)
+    print(f"🚀 Contacts API server running at http://localhost:{PORT} (ready in {startup_ms:.0f} ms)")
+    if startup_ms > STARTUP_BUDGET_MS:
+        print(f"⚠️ Startup took {startup_ms:.0f} ms, over the {STARTUP_BUDGET_MS} ms budget")
+    if isinstance(server, PooledHTTPServer):
+        print(f"🧵 Workers: {server.max_workers}, max in-flight requests: {server.max_in_flight}")
     print(f"📊 Health check: http://localhost:{PORT}/api/health")
     print(f"📋 Contacts endpoint: http://localhost:{PORT}/api/contacts")
     print(f"📤 Import endpoint: http://localhost:{PORT}/api/contacts/import")
@@ -1008,129 +1883,177 @@ def main():
     try:
         server.serve_forever()
     except KeyboardInterrupt:
-        print("\n🛑 API server stopped")
+        print("\n👋 Server stopped")
+    finally:
+        server.server_close()
+        close_delivery_writer()
+        close_db_pool()
 
-def init_database():
-    """Initialize the database with users and contacts tables (standalone function)"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
-    # Create users table for role-based access
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(16)))),
-            email TEXT UNIQUE NOT NULL,
-            first_name TEXT,
-            last_name TEXT,
-            role TEXT CHECK(role IN ('user', 'manager', 'supervisor', 'admin')) DEFAULT 'user',
-            manager_id TEXT,
-            is_active INTEGER DEFAULT 1,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (manager_id) REFERENCES users (id)
-        )
-    ''')
-    
-    # Create contacts table (SQLite version of the PostgreSQL schema)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS contacts (
-            id TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(16)))),
-            
-            -- Assignment information
-            assigned_to TEXT,
-            
-            -- Sponsor information
-            sponsor TEXT,
-            sponsor_first TEXT,
-            sponsor_last TEXT,
-            
-            -- User and contact details
-            user_id TEXT,
-            first_name TEXT,
-            last_name TEXT,
-            email TEXT,
-            email_valid INTEGER DEFAULT NULL,
-            phone TEXT,
-            
-            -- Address information
-            address TEXT,
-            city TEXT,
-            state TEXT,
-            zip TEXT,
-            
-            -- Status and rating
-            status TEXT,
-            rating TEXT,
-            
-            -- Technical details
-            ip_address TEXT,
-            date_created TEXT DEFAULT CURRENT_TIMESTAMP,
-            timezone TEXT,
-            
-            -- Phone type information
-            cell INTEGER DEFAULT NULL,
-            carrier TEXT,
-            landline INTEGER DEFAULT NULL,
-            voip INTEGER DEFAULT NULL,
-            other_phone INTEGER DEFAULT NULL,
-            foreign_number INTEGER DEFAULT NULL,
-            country TEXT DEFAULT 'US',
-            
-            -- Metadata
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            
-            FOREIGN KEY (assigned_to) REFERENCES users (id)
-        )
-    ''')
-    
-    # Create indexes for users table
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_role ON users(role)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_manager ON users(manager_id)')
-    
-    # Create indexes for contacts table
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_contacts_assigned_to ON contacts(assigned_to)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_contacts_email ON contacts(email)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_contacts_phone ON contacts(phone)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_contacts_name ON contacts(first_name, last_name)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_contacts_sponsor ON contacts(sponsor)')
-    
-    conn.commit()
-    
-    # Create default admin user if none exists
-    cursor.execute('SELECT COUNT(*) FROM users WHERE role = "admin"')
-    admin_count = cursor.fetchone()[0]
-    
-    if admin_count == 0:
-        admin_id = str(uuid.uuid4())
+# Schema: every change to contacts.db is a numbered step below. Append new steps
+# with the next version; never edit or renumber one that has shipped.
+USERS_TABLE_DDL = '''
+    CREATE TABLE IF NOT EXISTS users (
+        id TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(16)))),
+        email TEXT UNIQUE NOT NULL,
+        first_name TEXT,
+        last_name TEXT,
+        role TEXT CHECK(role IN ('user', 'manager', 'supervisor', 'admin')) DEFAULT 'user',
+        manager_id TEXT,
+        is_active INTEGER DEFAULT 1,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (manager_id) REFERENCES users (id)
+    )
+'''
+
+# SQLite version of the PostgreSQL contacts schema
+CONTACTS_TABLE_DDL = '''
+    CREATE TABLE IF NOT EXISTS contacts (
+        id TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(16)))),
+        
+        -- Assignment information
+        assigned_to TEXT,
+        
+        -- Sponsor information
+        sponsor TEXT,
+        sponsor_first TEXT,
+        sponsor_last TEXT,
+        
+        -- User and contact details
+        user_id TEXT,
+        first_name TEXT,
+        last_name TEXT,
+        email TEXT,
+        email_valid INTEGER DEFAULT NULL,
+        phone TEXT,
+        
+        -- Address information
+        address TEXT,
+        city TEXT,
+        state TEXT,
+        zip TEXT,
+        
+        -- Status and rating
+        status TEXT,
+        rating TEXT,
+        
+        -- Technical details
+        ip_address TEXT,
+        date_created TEXT DEFAULT CURRENT_TIMESTAMP,
+        timezone TEXT,
+        
+        -- Phone type information
+        cell INTEGER DEFAULT NULL,
+        carrier TEXT,
+        landline INTEGER DEFAULT NULL,
+        voip INTEGER DEFAULT NULL,
+        other_phone INTEGER DEFAULT NULL,
+        foreign_number INTEGER DEFAULT NULL,
+        country TEXT DEFAULT 'US',
+        
+        -- Metadata
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        
+        FOREIGN KEY (assigned_to) REFERENCES users (id)
+    )
+'''
+
+DELIVERY_REPORTS_TABLE_DDL = '''
+    CREATE TABLE IF NOT EXISTS delivery_reports (
+        id TEXT PRIMARY KEY,
+        message_id TEXT,
+        phone_number TEXT,
+        status TEXT,
+        timestamp TEXT,
+        error_code TEXT,
+        error_text TEXT,
+        provider TEXT,
+        received_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+def create_core_tables(cursor):
+    """users and contacts"""
+    cursor.execute(USERS_TABLE_DDL)
+    cursor.execute(CONTACTS_TABLE_DDL)
+
+def add_contacts_assigned_to(cursor):
+    """contacts tables created before role-based assignment lack assigned_to"""
+    cursor.execute('PRAGMA table_info(contacts)')
+    if 'assigned_to' not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute('ALTER TABLE contacts ADD COLUMN assigned_to TEXT')
+
+def seed_default_users(cursor):
+    """Default admin, plus the manager user the frontend signs in as"""
+    cursor.execute("SELECT COUNT(*) FROM users WHERE role = 'admin'")
+    if cursor.fetchone()[0] == 0:
         cursor.execute('''
             INSERT INTO users (id, email, first_name, last_name, role, is_active)
             VALUES (?, ?, ?, ?, ?, ?)
-        ''', (admin_id, 'admin@sparky.com', 'Admin', 'User', 'admin', 1))
-        conn.commit()
+        ''', (str(uuid.uuid4()), 'admin@sparky.com', 'Admin', 'User', 'admin', 1))
         print(f"✅ Created default admin user: admin@sparky.com")
     
-    # Check if manager user exists (the one used by frontend)
-    cursor.execute('SELECT COUNT(*) FROM users WHERE id = ?', ('user-manager-example-com',))
-    manager_count = cursor.fetchone()[0]
-    
-    if manager_count == 0:
-        cursor.execute('''
-            INSERT INTO users (id, email, first_name, last_name, role, is_active)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', ('user-manager-example-com', 'john+3@tpnlife.com', 'John', 'Manager', 'manager', 1))
-        conn.commit()
+    cursor.execute('''
+        INSERT OR IGNORE INTO users (id, email, first_name, last_name, role, is_active)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', ('user-manager-example-com', 'john+3@tpnlife.com', 'John', 'Manager', 'manager', 1))
+    if cursor.rowcount:
         print(f"✅ Created manager user: user-manager-example-com")
-    
-    # Debug: Show all users
-    cursor.execute('SELECT id, email, role FROM users')
-    users = cursor.fetchall()
-    print(f"[DEBUG] Users in database:")
-    for user in users:
-        print(f"  ID: {user[0]}, Email: {user[1]}, Role: {user[2]}")
-    
-    conn.close()
+
+def create_delivery_reports_table(cursor):
+    cursor.execute(DELIVERY_REPORTS_TABLE_DDL)
+
+SCHEMA_MIGRATIONS = [
+    Migration(1, 'users and contacts tables', create_core_tables),
+    Migration(2, 'contacts.assigned_to column', add_contacts_assigned_to),
+    IndexMigration(3, 'idx_users_email', 'users', 'email'),
+    IndexMigration(4, 'idx_users_role', 'users', 'role'),
+    IndexMigration(5, 'idx_users_manager', 'users', 'manager_id'),
+    IndexMigration(6, 'idx_contacts_assigned_to', 'contacts', 'assigned_to'),
+    IndexMigration(7, 'idx_contacts_email', 'contacts', 'email'),
+    IndexMigration(8, 'idx_contacts_phone', 'contacts', 'phone'),
+    IndexMigration(9, 'idx_contacts_name', 'contacts', 'first_name, last_name'),
+    IndexMigration(10, 'idx_contacts_sponsor', 'contacts', 'sponsor'),
+    IndexMigration(11, 'idx_contacts_created_id', 'contacts', 'created_at DESC, id DESC'),
+    # Normalized email/phone keys (unique) for dedupe-on-import
+    Migration(12, 'contact dedupe keys', init_contact_dedupe_keys),
+    # Full-text search index for contact search
+    Migration(13, 'contacts_fts search index', init_contacts_search_index),
+    # Incremental contact totals for list pagination
+    Migration(14, 'contacts_stats counters', init_contacts_stats),
+    # Manager hierarchy closure table for role-based visibility
+    Migration(15, 'user_hierarchy closure table', init_user_hierarchy),
+    Migration(16, 'default users', seed_default_users),
+    Migration(17, 'delivery_reports table', create_delivery_reports_table),
+    # Indexes for filtered, keyset-paginated report queries
+    IndexMigration(18, 'idx_delivery_reports_received', 'delivery_reports', 'received_at DESC, id DESC'),
+    IndexMigration(19, 'idx_delivery_reports_status', 'delivery_reports', 'status, received_at, id'),
+    IndexMigration(20, 'idx_delivery_reports_provider', 'delivery_reports', 'provider, received_at, id'),
+    IndexMigration(21, 'idx_delivery_reports_phone', 'delivery_reports', 'phone_number, received_at, id'),
+    IndexMigration(22, 'idx_delivery_reports_message_id', 'delivery_reports', 'message_id'),
+    # Hourly rollup behind /api/delivery-stats, maintained by write_report_rows
+    Migration(23, 'delivery_stats_hourly rollup', init_delivery_stats),
+    # Month/day partitions behind a delivery_reports view (see delivery_partitions)
+    Migration(24, 'partition delivery_reports by received_at', partition_delivery_reports),
+    # Dedupe keys for contacts written outside the importer and PUT
+    Migration(25, 'contact dedupe key triggers', init_contact_dedupe_triggers),
+    # Keyset pagination on (created_at, id) needs created_at on every contact
+    Migration(26, 'contacts.created_at always set', init_contact_created_at),
+]
+
+# Builder for index steps deferred at startup (None when nothing is pending)
+_index_builder = None
+
+def init_database(background_indexes=False):
+    """Bring DB_FILE up to the latest schema version
+
+    On a current database this is one SELECT on schema_version. The server passes
+    background_indexes=True so index builds on large tables don't delay startup.
+    """
+    global _index_builder
+    _index_builder = run_migrations(DB_FILE, SCHEMA_MIGRATIONS, background_indexes)
+    return _index_builder
 
 if __name__ == "__main__":
     main()
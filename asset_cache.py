@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+In-memory cache for static and HTML assets
+Holds file bytes with precompressed gzip/brotli variants and validators (ETag,
+Last-Modified); entries are refreshed when the file's mtime or size changes
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+from datetime import timezone
+from email.utils import formatdate, parsedate_to_datetime
+
+from http_keepalive import accepts_encoding
+
+try:
+    import brotli
+except ImportError:  # optional - gzip is always available
+    brotli = None
+
+# Only text-like assets are worth compressing; images are already compressed
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+MIN_COMPRESS_BYTES = 1024
+MAX_CACHED_FILE_BYTES = 8 * 1024 * 1024   # larger files are read per request instead of cached
+MAX_CACHE_BYTES = 128 * 1024 * 1024       # total bytes (all variants) before entries are evicted
+# Files too big to cache are compressed per request, so only with a fast gzip level
+UNCACHED_GZIP_LEVEL = 1
+
+
+class CachedAsset:
+    """One file's bytes, compressed variants and HTTP validators"""
+
+    __slots__ = ('path', 'content_type', 'body', 'gzip', 'br', 'etag', 'last_modified', 'mtime', 'mtime_ns', 'size')
+
+    def __init__(self, path, content_type, body, stat_result, cached=True):
+        self.path = path
+        self.content_type = content_type
+        self.body = body
+        self.mtime_ns = stat_result.st_mtime_ns
+        self.mtime = int(stat_result.st_mtime)
+        self.size = stat_result.st_size
+        self.etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        self.last_modified = formatdate(self.mtime, usegmt=True)
+        self.gzip = None
+        self.br = None
+        if len(body) >= MIN_COMPRESS_BYTES and content_type.startswith(COMPRESSIBLE_TYPES):
+            # Cached variants are compressed once, so they get the maximum level
+            compressed = gzip.compress(body, compresslevel=9 if cached else UNCACHED_GZIP_LEVEL, mtime=0)
+            if len(compressed) < len(body):
+                self.gzip = compressed
+            if brotli is not None and cached:
+                compressed = brotli.compress(body, quality=11)
+                if len(compressed) < len(body):
+                    self.br = compressed
+
+    def memory_size(self):
+        return len(self.body) + len(self.gzip or b'') + len(self.br or b'')
+
+    def variant(self, accept_encoding):
+        """Pick (content_encoding, bytes) for the client's Accept-Encoding header"""
+        if self.br is not None and accepts_encoding(accept_encoding, 'br'):
+            return 'br', self.br
+        if self.gzip is not None and accepts_encoding(accept_encoding, 'gzip'):
+            return 'gzip', self.gzip
+        return None, self.body
+
+    def not_modified(self, if_none_match, if_modified_since):
+        """Whether the request's validators still match this version"""
+        if if_none_match:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            return '*' in tags or any(tag.removeprefix('W/') == self.etag for tag in tags)
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+                if since.tzinfo is None:
+                    # HTTP dates are GMT; a '-0000' zone parses as naive
+                    since = since.replace(tzinfo=timezone.utc)
+                return int(since.timestamp()) >= self.mtime
+            except (TypeError, ValueError):
+                return False
+        return False
+
+
+class AssetCache:
+    """Thread-safe cache of CachedAsset keyed by file path, validated by stat() on each lookup"""
+
+    def __init__(self, max_bytes=MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.loads = 0
+
+    def get(self, path, content_type):
+        """Return the CachedAsset for path, (re)loading it if the file changed; None if missing"""
+        path = str(path)
+        try:
+            stat_result = os.stat(path)
+        except OSError:
+            self._evict(path)
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        with self._lock:
+            asset = self._entries.get(path)
+            if asset is not None and asset.mtime_ns == stat_result.st_mtime_ns and asset.size == stat_result.st_size:
+                self.hits += 1
+                return asset
+
+        with open(path, 'rb') as f:
+            body = f.read()
+        if stat_result.st_size > MAX_CACHED_FILE_BYTES:
+            return CachedAsset(path, content_type, body, stat_result, cached=False)
+        asset = CachedAsset(path, content_type, body, stat_result)
+
+        with self._lock:
+            self.loads += 1
+            previous = self._entries.pop(path, None)
+            if previous is not None:
+                self._bytes -= previous.memory_size()
+            # Simple size bound: drop the oldest entries when over budget
+            while self._entries and self._bytes + asset.memory_size() > self.max_bytes:
+                oldest_path = next(iter(self._entries))
+                self._bytes -= self._entries.pop(oldest_path).memory_size()
+            self._entries[path] = asset
+            self._bytes += asset.memory_size()
+        return asset
+
+    def _evict(self, path):
+        with self._lock:
+            asset = self._entries.pop(path, None)
+            if asset is not None:
+                self._bytes -= asset.memory_size()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'loads': self.loads,
+                'brotli': brotli is not None,
+            }
@@ -13,6 +13,7 @@ from datetime import datetime
 import threading
 import time
 from bulk_sms_system import BulkSMSSystem, SMSProvider
+from message_template import compile_template
 import logging
 
 app = Flask(__name__)
@@ -76,10 +77,10 @@ def index():
   "session_id": "uuid-from-upload",
   "message": "Hi {name}, this is your message!",
   "provider": "clicksend",
-  "from": "YourBusiness",
-  "delay": 1.0
+  "from": "YourBusiness"
 }</code>
         </div>
+        <p><strong>delay</strong> (optional): seconds between messages, to pace a campaign below the provider rate limit. Any delay sends messages one at a time instead of in provider batches (up to 1000 per ClickSend request), so leave it out unless you need the pacing.</p>
     </div>
     
     <div class="endpoint">
@@ -164,26 +165,30 @@ def upload_csv():
         filepath = os.path.join(UPLOAD_FOLDER, filename)
         file.save(filepath)
         
-        # Load and validate CSV
+        # Validate and count the CSV a chunk at a time; jobs stream it again from disk
         system = BulkSMSSystem()
-        contacts = system.load_contacts_from_csv(filepath)
+        contact_count = 0
+        sample_contacts = []
+        for chunk in system.iter_contact_chunks(filepath):
+            if len(sample_contacts) < 3:
+                sample_contacts.extend(chunk.head(3 - len(sample_contacts)).to_dict('records'))
+            contact_count += len(chunk)
         
         # Store session data
         upload_sessions[session_id] = {
             'filename': filename,
             'filepath': filepath,
-            'contact_count': len(contacts),
-            'contacts': contacts,
+            'contact_count': contact_count,
             'uploaded_at': datetime.now().isoformat(),
-            'sample_contacts': contacts[:3] if contacts else []  # First 3 for preview
+            'sample_contacts': sample_contacts  # First 3 for preview
         }
         
         return jsonify({
             'success': True,
             'session_id': session_id,
-            'contact_count': len(contacts),
-            'sample_contacts': contacts[:3] if contacts else [],
-            'message': f'Successfully uploaded {len(contacts)} contacts'
+            'contact_count': contact_count,
+            'sample_contacts': sample_contacts,
+            'message': f'Successfully uploaded {contact_count} contacts'
         })
         
     except Exception as e:
@@ -212,6 +217,9 @@ def send_bulk():
         available_providers = [p.value for p in SMSProvider]
         return jsonify({'error': f'Invalid provider. Available: {available_providers}'}), 400
     
+    # Placeholders no contact field fills would go out literally
+    unknown_placeholders = compile_template(data['message']).unknown_fields
+    
     # Create job
     job_id = str(uuid.uuid4())
     
@@ -222,7 +230,7 @@ def send_bulk():
         'message': data['message'],
         'provider': provider_name,
         'from': data.get('from', 'SMS'),
-        'delay': data.get('delay', 1.0),
+        'delay': data.get('delay'),  # optional; the provider rate limit applies either way
         'created_at': datetime.now().isoformat(),
         'contact_count': upload_sessions[session_id]['contact_count'],
         'sent_count': 0,
@@ -242,7 +250,8 @@ def send_bulk():
         'success': True,
         'job_id': job_id,
         'status': 'queued',
-        'message': f'Bulk SMS job started for {job_data["contact_count"]} contacts'
+        'message': f'Bulk SMS job started for {job_data["contact_count"]} contacts',
+        'unknown_placeholders': unknown_placeholders
     })
 
 def process_bulk_job(job_id):
@@ -258,9 +267,9 @@ def process_bulk_job(job_id):
         # Initialize SMS system
         system = BulkSMSSystem()
         
-        # Prepare messages
-        messages = system.prepare_messages(
-            session_data['contacts'],
+        # Stream messages from the uploaded CSV
+        messages = system.iter_messages_from_csv(
+            session_data['filepath'],
             job_data['message'],
             job_data['from']
         )
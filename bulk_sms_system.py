@@ -4,17 +4,21 @@ Supports CSV import, API integration, and multiple providers
 """
 
 import pandas as pd
-import requests
 import json
 import time
 import logging
 from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Iterable, Iterator
+from itertools import islice
 import os
 from dataclasses import dataclass
 from enum import Enum
 import asyncio
 import aiohttp
+from http_pool import get_session, get_async_session, close_async_session
+from rate_limit import TokenBucket, get_limiter
+from clicksend_batch import CLICKSEND_BATCH_SIZE, send_batch, send_batch_async
+from message_template import compile_template
 
 # Configure logging
 logging.basicConfig(
@@ -26,6 +30,23 @@ logging.basicConfig(
     ]
 )
 
+# Rows per chunk when streaming a contacts CSV; the first chunk is small so
+# sending starts before the rest of the file has been parsed
+CSV_CHUNK_SIZE = int(os.getenv('BULK_CSV_CHUNK_SIZE', 10000))
+CSV_FIRST_CHUNK_SIZE = 100
+
+REQUIRED_COLUMNS = ['phone_number']
+OPTIONAL_COLUMNS = ['name', 'email', 'message', 'first_name', 'last_name']
+
+def iter_batches(items: Iterable, size: int) -> Iterator[List]:
+    """Lists of up to size items, consuming items lazily"""
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
 class SMSProvider(Enum):
     CLICKSEND = "clicksend"
     TWILIO = "twilio"
@@ -65,27 +86,9 @@ class BulkSMSSystem:
     def load_contacts_from_csv(self, csv_file: str) -> List[Dict]:
         """Load contacts from CSV file with validation"""
         try:
-            df = pd.read_csv(csv_file)
-            
-            # Validate required columns
-            required_columns = ['phone_number']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            
-            if missing_columns:
-                raise ValueError(f"Missing required columns: {missing_columns}")
-            
-            # Clean and validate phone numbers
-            df['phone_number'] = df['phone_number'].astype(str).str.strip()
-            df = df[df['phone_number'].str.len() > 0]  # Remove empty phone numbers
-            
-            # Add optional columns if they don't exist
-            optional_columns = ['name', 'email', 'message', 'first_name', 'last_name']
-            for col in optional_columns:
-                if col not in df.columns:
-                    df[col] = ''
-            
-            # Convert to list of dictionaries
-            contacts = df.to_dict('records')
+            contacts = []
+            for chunk in self.iter_contact_chunks(csv_file):
+                contacts.extend(self._frame_records(chunk))
             
             logging.info(f"Loaded {len(contacts)} contacts from {csv_file}")
             return contacts
@@ -94,106 +97,201 @@ class BulkSMSSystem:
             logging.error(f"Error loading CSV: {str(e)}")
             raise
     
+    def iter_contact_chunks(self, csv_file: str, chunk_size: int = CSV_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+        """Validated, cleaned contact frames read from csv_file a chunk at a time
+        
+        Cells are read as text (empty cells as ''), so every chunk has the same
+        types and phone numbers keep leading '+' and zeros.
+        """
+        with pd.read_csv(csv_file, dtype=str, keep_default_na=False, chunksize=chunk_size) as reader:
+            size = min(CSV_FIRST_CHUNK_SIZE, chunk_size)
+            while True:
+                try:
+                    chunk = reader.get_chunk(size)
+                except StopIteration:
+                    return
+                size = chunk_size
+                yield self._clean_contacts(chunk)
+    
+    def _clean_contacts(self, df: pd.DataFrame) -> pd.DataFrame:
+        # Validate required columns
+        missing_columns = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+        
+        if missing_columns:
+            raise ValueError(f"Missing required columns: {missing_columns}")
+        
+        # Add optional columns if they don't exist
+        for col in OPTIONAL_COLUMNS:
+            if col not in df.columns:
+                df[col] = ''
+        
+        # Clean and validate phone numbers
+        df['phone_number'] = df['phone_number'].str.strip()
+        return df[df['phone_number'].str.len() > 0]  # Remove empty phone numbers
+    
+    def _frame_records(self, frame: pd.DataFrame) -> List[Dict]:
+        # Built from column lists: DataFrame.to_dict('records') boxes every cell separately
+        columns = list(frame.columns)
+        return [dict(zip(columns, row)) for row in zip(*(frame[col].tolist() for col in columns))]
+    
+    def iter_messages_from_csv(self, csv_file: str, template: str, from_number: str = "SMS",
+                               chunk_size: int = CSV_CHUNK_SIZE) -> Iterator[SMSMessage]:
+        """Stream SMS messages from a contacts CSV, reading and rendering a chunk at a time
+        
+        Pass the result straight to send_bulk_sync/send_bulk_async: only the chunk
+        being sent is held in memory, and the first messages go out after the
+        first few rows are parsed.
+        """
+        for chunk in self.iter_contact_chunks(csv_file, chunk_size):
+            yield from self.prepare_messages_from_frame(chunk, template, from_number)
+    
     def prepare_messages(self, contacts: List[Dict], template: str, from_number: str = "SMS") -> List[SMSMessage]:
         """Prepare SMS messages from contacts and template"""
         messages = []
+        compiled = compile_template(template)
         
         for contact in contacts:
             # Handle phone number
             phone = str(contact.get('phone_number', '')).strip()
             if not phone:
                 continue
-                
-            # Handle name (try different variations)
-            name = (
-                contact.get('name', '') or 
-                f"{contact.get('first_name', '')} {contact.get('last_name', '')}".strip() or 
-                'Friend'
-            )
-            
-            # Handle custom message
-            message = contact.get('message', '').strip() or template
             
-            # Replace placeholders
-            message = self._replace_placeholders(message, contact)
+            # Handle custom message (compiled once per distinct text)
+            custom = contact.get('message', '').strip()
+            message = (compile_template(custom) if custom else compiled).render(contact)
             
-            messages.append(SMSMessage(
-                to=phone,
-                message=message,
-                from_=from_number,
-                name=name,
-                custom_fields=contact
-            ))
+            messages.append(self._make_message(contact, phone, message, from_number))
         
         logging.info(f"Prepared {len(messages)} SMS messages")
         return messages
     
-    def _replace_placeholders(self, message: str, contact: Dict) -> str:
-        """Replace placeholders in message template"""
-        replacements = {
-            '{name}': contact.get('name', 'Friend'),
-            '{first_name}': contact.get('first_name', ''),
-            '{lastName}': contact.get('last_name', ''),
-            '{email}': contact.get('email', ''),
-            '{phone}': contact.get('phone_number', ''),
-            '{company}': contact.get('company', ''),
-        }
+    def prepare_messages_from_frame(self, frame: pd.DataFrame, template: str, from_number: str = "SMS") -> List[SMSMessage]:
+        """prepare_messages for a contact DataFrame, rendering each template a column at a time"""
+        phones = frame['phone_number'].astype(str).str.strip()
+        frame = frame[phones.str.len() > 0]
+        phones = phones[phones.str.len() > 0]
+        
+        # Rows with a custom message render with their own template
+        if 'message' in frame.columns:
+            texts = frame['message'].fillna('').astype(str).str.strip()
+            texts = texts.where(texts.str.len() > 0, template)
+        else:
+            texts = pd.Series(template, index=frame.index)
+        rendered = pd.Series('', index=frame.index, dtype=object)
+        for text, index in texts.groupby(texts, sort=False).groups.items():
+            rendered.loc[index] = compile_template(text).render_frame(frame.loc[index])
+        
+        messages = [
+            self._make_message(contact, phone, message, from_number)
+            for contact, phone, message in zip(self._frame_records(frame), phones.tolist(), rendered.tolist())
+        ]
         
-        for placeholder, value in replacements.items():
-            message = message.replace(placeholder, str(value))
+        logging.info(f"Prepared {len(messages)} SMS messages")
+        return messages
+    
+    def _make_message(self, contact: Dict, phone: str, message: str, from_number: str) -> SMSMessage:
+        # Handle name (try different variations)
+        name = (
+            contact.get('name', '') or 
+            f"{contact.get('first_name', '')} {contact.get('last_name', '')}".strip() or 
+            'Friend'
+        )
         
-        return message
+        return SMSMessage(
+            to=phone,
+            message=message,
+            from_=from_number,
+            name=name,
+            custom_fields=contact
+        )
     
-    async def send_bulk_async(self, messages: List[SMSMessage], provider: SMSProvider, 
-                            delay: float = 1.0, batch_size: int = 50) -> List[SMSResult]:
-        """Send bulk SMS asynchronously with rate limiting"""
+    async def send_bulk_async(self, messages: Iterable[SMSMessage], provider: SMSProvider, 
+                            delay: Optional[float] = None, batch_size: int = 50) -> List[SMSResult]:
+        """Send bulk SMS asynchronously at the provider's rate and in-flight limits
+        
+        messages may be a list or a stream such as iter_messages_from_csv; it is
+        read only as fast as the provider limits allow. Providers with a batch API
+        (ClickSend) send max_batch_size messages per request. delay (seconds
+        between messages) optionally paces the campaign below the limits and sends
+        one message per request; batch_size then sets how often progress is logged.
+        """
         
         if provider not in self.providers:
             raise ValueError(f"Provider {provider} not supported")
         
         provider_instance = self.providers[provider]
-        results = []
+        limiter = get_limiter(provider.value)
+        # Shared keep-alive session: all sends reuse the provider connections
+        session = get_async_session()
+        
+        # delay paces individual messages, so it turns batching off
+        if delay and provider_instance.max_batch_size > 1:
+            logging.warning(f"delay={delay}s sends {provider.value} messages one at a time instead of "
+                            f"batches of {provider_instance.max_batch_size}; omit delay to batch")
+        if not delay and provider_instance.max_batch_size > 1:
+            return await self._send_batched_async(messages, provider_instance, session, limiter)
+        
+        pace = TokenBucket(1 / delay) if delay else None
+        total = len(messages) if isinstance(messages, (list, tuple)) else '?'
+        tasks = []
         
-        # Process in batches
-        for i in range(0, len(messages), batch_size):
-            batch = messages[i:i + batch_size]
-            batch_results = await self._send_batch_async(batch, provider_instance, delay)
-            results.extend(batch_results)
+        for i, message in enumerate(messages):
+            if pace:
+                await asyncio.sleep(pace.reserve())
+            # Waits for a free in-flight slot and a rate token before the send starts
+            await limiter.acquire_async()
+            tasks.append(asyncio.create_task(self._send_limited_async(message, provider_instance, session, limiter)))
             
             # Log progress
-            logging.info(f"Processed batch {i//batch_size + 1}/{(len(messages)-1)//batch_size + 1}")
+            if (i + 1) % batch_size == 0:
+                logging.info(f"Processed {i + 1}/{total}")
+        
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        logging.info(f"Processed {len(results)}/{total}")
+        
+        # Handle exceptions
+        processed_results = []
+        for result in results:
+            if isinstance(result, Exception):
+                processed_results.append(SMSResult(
+                    success=False,
+                    error=str(result),
+                    provider=provider_instance.__class__.__name__
+                ))
+            else:
+                processed_results.append(result)
+        
+        self.results = processed_results
+        return processed_results
+    
+    async def _send_batched_async(self, messages: Iterable[SMSMessage], provider, session, limiter) -> List[SMSResult]:
+        """One request per max_batch_size messages, run concurrently within the provider limits
+        
+        A batch is only read from messages once a request slot is free, so a
+        stream is never read far ahead of what has been sent.
+        """
+        tasks = []
+        pending = set()
         
+        for batch in iter_batches(messages, provider.max_batch_size):
+            if len(pending) >= limiter.max_in_flight:
+                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            task = asyncio.create_task(provider.send_batch_async(batch, session, limiter))
+            tasks.append(task)
+            pending.add(task)
+        
+        batch_results = await asyncio.gather(*tasks)
+        results = [result for batch in batch_results for result in batch]
+        logging.info(f"Sent {len(results)} messages in {len(tasks)} batch request(s)")
         self.results = results
         return results
     
-    async def _send_batch_async(self, batch: List[SMSMessage], provider, delay: float) -> List[SMSResult]:
-        """Send a batch of messages asynchronously"""
-        async with aiohttp.ClientSession() as session:
-            tasks = []
-            
-            for message in batch:
-                task = asyncio.create_task(self._send_single_async(message, provider, session))
-                tasks.append(task)
-                
-                # Add delay between requests
-                if delay > 0:
-                    await asyncio.sleep(delay)
-            
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            
-            # Handle exceptions
-            processed_results = []
-            for result in results:
-                if isinstance(result, Exception):
-                    processed_results.append(SMSResult(
-                        success=False,
-                        error=str(result),
-                        provider=provider.__class__.__name__
-                    ))
-                else:
-                    processed_results.append(result)
-            
-            return processed_results
+    async def _send_limited_async(self, message: SMSMessage, provider, session, limiter) -> SMSResult:
+        """Send one message, releasing the in-flight slot taken by send_bulk_async"""
+        try:
+            return await self._send_single_async(message, provider, session)
+        finally:
+            limiter.release()
     
     async def _send_single_async(self, message: SMSMessage, provider, session) -> SMSResult:
         """Send a single SMS message asynchronously"""
@@ -206,26 +304,47 @@ class BulkSMSSystem:
                 provider=provider.__class__.__name__
             )
     
-    def send_bulk_sync(self, messages: List[SMSMessage], provider: SMSProvider, 
-                      delay: float = 1.0) -> List[SMSResult]:
-        """Send bulk SMS synchronously (fallback method)"""
+    def send_bulk_sync(self, messages: Iterable[SMSMessage], provider: SMSProvider, 
+                      delay: Optional[float] = None) -> List[SMSResult]:
+        """Send bulk SMS synchronously (fallback method) at the provider's rate limit
+        
+        messages may be a list or a stream such as iter_messages_from_csv.
+        Providers with a batch API send max_batch_size messages per request unless
+        delay (seconds between messages) is given to pace the campaign below the limit.
+        """
         
         if provider not in self.providers:
             raise ValueError(f"Provider {provider} not supported")
         
         provider_instance = self.providers[provider]
+        limiter = get_limiter(provider.value)
+        total = len(messages) if isinstance(messages, (list, tuple)) else '?'
+        
+        # delay paces individual messages, so it turns batching off
+        if delay and provider_instance.max_batch_size > 1:
+            logging.warning(f"delay={delay}s sends {provider.value} messages one at a time instead of "
+                            f"batches of {provider_instance.max_batch_size}; omit delay to batch")
+        if not delay and provider_instance.max_batch_size > 1:
+            results = []
+            for batch in iter_batches(messages, provider_instance.max_batch_size):
+                results.extend(provider_instance.send_batch_sync(batch, limiter))
+                logging.info(f"Sent {len(results)}/{total}")
+            self.results = results
+            return results
+        
+        pace = TokenBucket(1 / delay) if delay else None
         results = []
         
         for i, message in enumerate(messages):
             try:
-                result = provider_instance.send_sync(message)
+                if pace:
+                    time.sleep(pace.reserve())
+                # Shared with other jobs sending through this provider
+                with limiter:
+                    result = provider_instance.send_sync(message)
                 results.append(result)
                 
-                logging.info(f"Sent {i+1}/{len(messages)} - Success: {result.success}")
-                
-                # Rate limiting
-                if delay > 0 and i < len(messages) - 1:
-                    time.sleep(delay)
+                logging.info(f"Sent {i+1}/{total} - Success: {result.success}")
                     
             except Exception as e:
                 result = SMSResult(
@@ -287,6 +406,9 @@ class BulkSMSSystem:
 
 # Provider implementations
 class BaseProvider:
+    # Messages per request; providers above 1 implement send_batch_sync/send_batch_async
+    max_batch_size = 1
+    
     def __init__(self):
         self.name = self.__class__.__name__
     
@@ -297,87 +419,47 @@ class BaseProvider:
         raise NotImplementedError
 
 class ClickSendProvider(BaseProvider):
+    # /sms/send takes many messages per request
+    max_batch_size = CLICKSEND_BATCH_SIZE
+    
     def __init__(self):
         super().__init__()
         self.username = os.getenv('CLICKSEND_USERNAME')
         self.api_key = os.getenv('CLICKSEND_API_KEY')
         self.base_url = 'https://rest.clicksend.com/v3'
     
+    def _payload_messages(self, messages: List[SMSMessage]) -> List[Dict]:
+        return [{"to": m.to, "body": m.message, "from": m.from_} for m in messages]
+    
+    def _to_results(self, results: List[Dict]) -> List[SMSResult]:
+        return [SMSResult(provider=self.name, **result) for result in results]
+    
+    def _not_configured(self, count: int) -> List[SMSResult]:
+        return [SMSResult(success=False, error="ClickSend credentials not configured") for _ in range(count)]
+    
     def send_sync(self, message: SMSMessage) -> SMSResult:
+        return self.send_batch_sync([message])[0]
+    
+    async def send_async(self, message: SMSMessage, session) -> SMSResult:
+        return (await self.send_batch_async([message], session))[0]
+    
+    def send_batch_sync(self, messages: List[SMSMessage], limiter=None) -> List[SMSResult]:
+        """Send up to max_batch_size messages in one request; results in message order"""
         if not self.username or not self.api_key:
-            return SMSResult(success=False, error="ClickSend credentials not configured")
-        
-        url = f"{self.base_url}/sms/send"
-        payload = {
-            "messages": [{
-                "to": message.to,
-                "body": message.message,
-                "from": message.from_
-            }]
-        }
+            return self._not_configured(len(messages))
         
-        try:
-            response = requests.post(
-                url,
-                json=payload,
-                auth=(self.username, self.api_key),
-                headers={'Content-Type': 'application/json'}
-            )
-            
-            result = response.json()
-            
-            if response.status_code == 200:
-                message_data = result['data']['messages'][0]
-                return SMSResult(
-                    success=True,
-                    message_id=message_data.get('message_id', ''),
-                    cost=float(message_data.get('message_price', 0)),
-                    provider=self.name
-                )
-            else:
-                return SMSResult(
-                    success=False,
-                    error=result.get('response_msg', 'Unknown error'),
-                    provider=self.name
-                )
-        except Exception as e:
-            return SMSResult(success=False, error=str(e), provider=self.name)
+        results = send_batch(get_session(), self._payload_messages(messages), (self.username, self.api_key),
+                             limiter, url=f"{self.base_url}/sms/send")
+        return self._to_results(results)
     
-    async def send_async(self, message: SMSMessage, session) -> SMSResult:
+    async def send_batch_async(self, messages: List[SMSMessage], session, limiter=None) -> List[SMSResult]:
         if not self.username or not self.api_key:
-            return SMSResult(success=False, error="ClickSend credentials not configured")
-        
-        url = f"{self.base_url}/sms/send"
-        payload = {
-            "messages": [{
-                "to": message.to,
-                "body": message.message,
-                "from": message.from_
-            }]
-        }
+            return self._not_configured(len(messages))
         
         auth = aiohttp.BasicAuth(self.username, self.api_key)
-        
-        try:
-            async with session.post(url, json=payload, auth=auth) as response:
-                result = await response.json()
-                
-                if response.status == 200:
-                    message_data = result['data']['messages'][0]
-                    return SMSResult(
-                        success=True,
-                        message_id=message_data.get('message_id', ''),
-                        cost=float(message_data.get('message_price', 0)),
-                        provider=self.name
-                    )
-                else:
-                    return SMSResult(
-                        success=False,
-                        error=result.get('response_msg', 'Unknown error'),
-                        provider=self.name
-                    )
-        except Exception as e:
-            return SMSResult(success=False, error=str(e), provider=self.name)
+        results = await send_batch_async(session, self._payload_messages(messages), auth,
+                                         limiter, url=f"{self.base_url}/sms/send")
+        return self._to_results(results)
 
 class TwilioProvider(BaseProvider):
     def __init__(self):
@@ -426,18 +508,14 @@ async def main_async():
     """Example usage - async version"""
     system = BulkSMSSystem()
     
-    # Load contacts from CSV
-    contacts = system.load_contacts_from_csv('contacts.csv')
-    
-    # Prepare messages
+    # Stream messages from the CSV a chunk at a time
     template = "Hi {name}, this is a test message from our system!"
-    messages = system.prepare_messages(contacts, template, "YourBusiness")
+    messages = system.iter_messages_from_csv('contacts.csv', template, "YourBusiness")
     
     # Send messages
     results = await system.send_bulk_async(
         messages, 
-        SMSProvider.CLICKSEND, 
-        delay=1.0,  # 1 second between messages
+        SMSProvider.CLICKSEND,  # paced by the ClickSend rate limit
         batch_size=50
     )
     
@@ -448,23 +526,21 @@ async def main_async():
     # Export results
     filename = system.export_results()
     print(f"Results exported to: {filename}")
+    
+    await close_async_session()
 
 def main_sync():
     """Example usage - sync version"""
     system = BulkSMSSystem()
     
-    # Load contacts from CSV
-    contacts = system.load_contacts_from_csv('contacts.csv')
-    
-    # Prepare messages
+    # Stream messages from the CSV a chunk at a time
     template = "Hi {name}, this is a test message from our system!"
-    messages = system.prepare_messages(contacts, template, "YourBusiness")
+    messages = system.iter_messages_from_csv('contacts.csv', template, "YourBusiness")
     
     # Send messages
     results = system.send_bulk_sync(
         messages, 
-        SMSProvider.CLICKSEND, 
-        delay=1.0  # 1 second between messages
+        SMSProvider.CLICKSEND  # paced by the ClickSend rate limit
     )
     
     # Get summary
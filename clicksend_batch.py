@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Batched ClickSend sends
+/v3/sms/send takes up to 1000 messages per request, so bulk senders pack
+prepared messages into batches and map the per-message results back in
+request order. A request refused as a whole is split in halves until the
+offending messages are isolated.
+"""
+
+import os
+
+CLICKSEND_SEND_URL = 'https://rest.clicksend.com/v3/sms/send'
+# Messages per /sms/send request allowed by the API
+CLICKSEND_BATCH_LIMIT = 1000
+CLICKSEND_BATCH_SIZE = min(int(os.getenv('CLICKSEND_BATCH_SIZE', CLICKSEND_BATCH_LIMIT)), CLICKSEND_BATCH_LIMIT)
+# Whole-request rejections caused by the payload; anything else (auth, rate
+# limit, server error) would fail the halves too
+SPLITTABLE_STATUSES = {400, 413, 422}
+
+
+class BatchRejected(Exception):
+    """ClickSend refused the whole request, so nothing in it was queued"""
+
+
+def chunked(items, size=CLICKSEND_BATCH_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _failed(count, error):
+    return [{'success': False, 'message_id': '', 'cost': 0.0, 'error': error} for _ in range(count)]
+
+
+def batch_results(status_code, result, count):
+    """Per-message results, in request order, from one /sms/send response
+
+    Each is a dict of success, message_id, cost and error. Raises BatchRejected
+    when a multi-message request was refused and is worth splitting.
+    """
+    if not isinstance(result, dict):
+        result = {}
+    if status_code != 200:
+        error = result.get('response_msg') or f'HTTP error {status_code}'
+        if status_code in SPLITTABLE_STATUSES and count > 1:
+            raise BatchRejected(error)
+        return _failed(count, error)
+    returned = (result.get('data') or {}).get('messages') or []
+    results = []
+    for i in range(count):
+        if i >= len(returned):
+            results.extend(_failed(1, 'No result returned for message'))
+            continue
+        item = returned[i]
+        status = item.get('status', 'SUCCESS')
+        ok = status == 'SUCCESS'
+        results.append({
+            'success': ok,
+            'message_id': item.get('message_id', '') if ok else '',
+            'cost': float(item.get('message_price') or 0) if ok else 0.0,
+            'error': '' if ok else status,
+        })
+    return results
+
+
+def send_batch(session, messages, auth, limiter=None, url=CLICKSEND_SEND_URL):
+    """POST messages ({'to', 'body', 'from'} dicts) as one request, splitting it if refused
+
+    Each request (including split halves) goes through limiter when given. A
+    request that failed in transit is not resent: ClickSend may have queued it.
+    """
+    try:
+        # The limiter's rate is messages per second, so a batch takes a token per message
+        if limiter:
+            limiter.acquire(len(messages))
+        try:
+            response = session.post(url, json={'messages': messages}, auth=auth)
+        finally:
+            if limiter:
+                limiter.release()
+        try:
+            result = response.json()
+        except ValueError:
+            result = {}
+        return batch_results(response.status_code, result, len(messages))
+    except BatchRejected:
+        middle = len(messages) // 2
+        return (send_batch(session, messages[:middle], auth, limiter, url) +
+                send_batch(session, messages[middle:], auth, limiter, url))
+    except Exception as e:
+        return _failed(len(messages), str(e))
+
+
+async def send_batch_async(session, messages, auth, limiter=None, url=CLICKSEND_SEND_URL):
+    """Async send_batch on an aiohttp session (auth is an aiohttp.BasicAuth)"""
+    try:
+        if limiter:
+            await limiter.acquire_async(len(messages))
+        try:
+            async with session.post(url, json={'messages': messages}, auth=auth) as response:
+                try:
+                    result = await response.json(content_type=None)
+                except ValueError:
+                    result = {}
+                status = response.status
+        finally:
+            if limiter:
+                limiter.release()
+        return batch_results(status, result, len(messages))
+    except BatchRejected:
+        middle = len(messages) // 2
+        return (await send_batch_async(session, messages[:middle], auth, limiter, url) +
+                await send_batch_async(session, messages[middle:], auth, limiter, url))
+    except Exception as e:
+        return _failed(len(messages), str(e))
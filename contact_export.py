@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Streaming contact export
+Encodes rows from an open SQLite cursor batch by batch as CSV, NDJSON or -
+when pyarrow is installed - Parquet / Arrow IPC, so memory stays bounded
+however many contacts are exported
+"""
+
+import csv
+import importlib.util
+import io
+import json
+
+# pyarrow is optional (CSV and NDJSON always work) and slow to import, so it is
+# only loaded by the first Parquet/Arrow export rather than at server startup
+pa = None
+pq = None
+
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+COLUMNAR_FORMATS = ('parquet', 'arrow')
+
+EXPORT_BATCH_SIZE = 5000        # rows fetched from the cursor (and Parquet row group size)
+
+# Dedupe keys derived from email/phone - not part of the contact record
+INTERNAL_COLUMNS = {'email_normalized', 'phone_e164'}
+
+
+def pyarrow_available():
+    return pa is not None or importlib.util.find_spec('pyarrow') is not None
+
+
+def _load_pyarrow():
+    global pa, pq
+    if pa is None:
+        import pyarrow
+        import pyarrow.parquet
+        pa, pq = pyarrow, pyarrow.parquet
+
+
+def available_formats():
+    """Export formats this install can produce"""
+    if not pyarrow_available():
+        return [fmt for fmt in EXPORT_CONTENT_TYPES if fmt not in COLUMNAR_FORMATS]
+    return list(EXPORT_CONTENT_TYPES)
+
+
+def export_columns(conn):
+    """(name, declared type) of every exported contacts column, in table order"""
+    rows = conn.execute('PRAGMA table_info(contacts)').fetchall()
+    return [(row[1], (row[2] or '').upper()) for row in rows if row[1] not in INTERNAL_COLUMNS]
+
+
+def iter_cursor_batches(cursor, batch_size=EXPORT_BATCH_SIZE):
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
+
+
+def iter_csv_blocks(cursor, columns, batch_size=EXPORT_BATCH_SIZE):
+    """CSV with a header row, one encoded block per batch"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in columns])
+    for rows in iter_cursor_batches(cursor, batch_size):
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def iter_ndjson_blocks(cursor, columns, batch_size=EXPORT_BATCH_SIZE):
+    """One JSON object per line, one encoded block per batch"""
+    names = [name for name, _ in columns]
+    for rows in iter_cursor_batches(cursor, batch_size):
+        yield ''.join(
+            json.dumps(dict(zip(names, row)), separators=(',', ':'), default=str) + '\n' for row in rows
+        ).encode('utf-8')
+
+
+def arrow_schema(columns):
+    """Fixed Arrow schema from the SQLite declared types, so every batch matches"""
+    fields = []
+    for name, declared in columns:
+        if 'INT' in declared:
+            fields.append(pa.field(name, pa.int64()))
+        elif any(kind in declared for kind in ('REAL', 'FLOA', 'DOUB')):
+            fields.append(pa.field(name, pa.float64()))
+        else:
+            fields.append(pa.field(name, pa.string()))
+    return pa.schema(fields)
+
+
+def _column_array(values, arrow_type):
+    """Arrow array for one column; SQLite is dynamically typed, so stray values are coerced"""
+    try:
+        return pa.array(values, type=arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, ValueError):
+        pass
+    if pa.types.is_string(arrow_type):
+        return pa.array([None if value is None else str(value) for value in values], type=arrow_type)
+    convert = int if pa.types.is_integer(arrow_type) else float
+    coerced = []
+    for value in values:
+        try:
+            coerced.append(None if value is None else convert(value))
+        except (TypeError, ValueError):
+            coerced.append(None)
+    return pa.array(coerced, type=arrow_type)
+
+
+class _BlockSink:
+    """Write-only file object that collects what pyarrow writes until it is drained"""
+
+    closed = False
+
+    def __init__(self):
+        self.blocks = []
+
+    def write(self, data):
+        self.blocks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.blocks)
+        self.blocks = []
+        return data
+
+
+def iter_columnar_blocks(cursor, columns, export_format, batch_size=EXPORT_BATCH_SIZE):
+    """Parquet (one row group per batch) or Arrow IPC stream blocks; needs pyarrow"""
+    if not pyarrow_available():
+        raise RuntimeError(f'{export_format} export requires pyarrow')
+    _load_pyarrow()
+    schema = arrow_schema(columns)
+    sink = _BlockSink()
+    if export_format == 'parquet':
+        writer = pq.ParquetWriter(sink, schema, compression='snappy')
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    for rows in iter_cursor_batches(cursor, batch_size):
+        arrays = [_column_array([row[i] for row in rows], field.type) for i, field in enumerate(schema)]
+        batch = pa.RecordBatch.from_arrays(arrays, schema=schema)
+        if export_format == 'parquet':
+            writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            writer.write_batch(batch)
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    yield sink.drain()
+
+
+def iter_export_blocks(cursor, columns, export_format, batch_size=EXPORT_BATCH_SIZE):
+    """Encoded export body for rows selected as `columns` on cursor"""
+    if export_format == 'csv':
+        return iter_csv_blocks(cursor, columns, batch_size)
+    if export_format == 'ndjson':
+        return iter_ndjson_blocks(cursor, columns, batch_size)
+    if export_format in COLUMNAR_FORMATS:
+        return iter_columnar_blocks(cursor, columns, export_format, batch_size)
+    raise ValueError(f"format must be one of: {', '.join(available_formats())}")
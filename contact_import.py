@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+"""
+Bulk contact import engine
+Inserts contacts with one prepared statement, executemany per chunk and savepoints
+so a bad row only costs its own chunk a retry instead of failing the whole import
+"""
+
+import codecs
+import csv
+import json
+import re
+import time
+import uuid
+from datetime import datetime
+
+# Columns written by an import, in statement order
+CONTACT_IMPORT_COLUMNS = [
+    'id', 'assigned_to', 'sponsor', 'sponsor_first', 'sponsor_last', 'user_id',
+    'first_name', 'last_name', 'email', 'email_valid', 'phone', 'address', 'city',
+    'state', 'zip', 'status', 'rating', 'ip_address', 'date_created', 'timezone',
+    'cell', 'carrier', 'landline', 'voip', 'other_phone', 'foreign_number', 'country',
+    'created_at', 'updated_at'
+]
+
+# Columns stored as 0/1/NULL flags
+BOOLEAN_COLUMNS = {'email_valid', 'cell', 'landline', 'voip', 'other_phone', 'foreign_number'}
+
+# Plain text columns copied straight from the submitted row
+TEXT_COLUMNS = [
+    col for col in CONTACT_IMPORT_COLUMNS
+    if col not in BOOLEAN_COLUMNS and col not in ('id', 'country', 'created_at', 'updated_at')
+]
+
+MAX_REPORTED_ERRORS = 1000      # row errors kept for the response; the rest are only counted
+STREAM_READ_SIZE = 64 * 1024    # bytes read from the request body at a time
+
+# What an import does with a row whose normalized email or phone already exists
+ON_DUPLICATE_MODES = ('skip', 'update', 'merge')
+DEFAULT_ON_DUPLICATE = 'skip'
+
+# Countries whose national numbers are written without the +1 prefix (NANP)
+NANP_COUNTRIES = {'', 'US', 'USA', 'CA', 'CAN'}
+
+# Whitespace trimmed from dedupe key inputs and the separators dropped from phone
+# numbers; normalize_* and the *_key_sql expressions apply the same rules
+KEY_WHITESPACE = ' \t\n\r'
+PHONE_SEPARATORS = KEY_WHITESPACE + '-().+/'
+_ASCII_LOWER = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+_DROP_PHONE_SEPARATORS = str.maketrans('', '', PHONE_SEPARATORS)
+_DIGITS_RE = re.compile(r'[0-9]+')
+
+DEFAULT_CHUNK_SIZE = 1000       # rows per executemany / savepoint
+DEFAULT_CHUNKS_PER_COMMIT = 10  # chunks per transaction
+
+# While the importer's transaction holds a row in contacts_bulk_load, the per-row
+# search index and counter triggers on contacts stand down and the importer does
+# that work set-based per chunk. The row is never committed, and SQLite allows a
+# single writer, so every other connection keeps firing the triggers as usual.
+CONTACTS_BULK_LOAD_DDL = 'CREATE TABLE IF NOT EXISTS contacts_bulk_load (id INTEGER PRIMARY KEY CHECK (id = 1))'
+BULK_LOAD_IDLE = 'NOT EXISTS (SELECT 1 FROM contacts_bulk_load)'
+
+
+def convert_to_bool(value):
+    """Convert various values to boolean for database storage"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, str):
+        value = value.lower().strip()
+        if value in ('true', '1', 'yes', 'y', 'on'):
+            return 1
+        elif value in ('false', '0', 'no', 'n', 'off'):
+            return 0
+    return None
+
+
+def normalize_email(email):
+    """Dedupe key for an email address: trimmed and (ASCII) lowercased, None if not an address"""
+    if not isinstance(email, str):
+        return None
+    email = email.strip(KEY_WHITESPACE).translate(_ASCII_LOWER)
+    return email if '@' in email else None
+
+
+def normalize_phone_e164(phone, country='US'):
+    """Dedupe key for a phone number in E.164 form (+15551234567), None if it can't be normalized"""
+    if phone is None or phone == '':
+        return None
+    phone = str(phone).strip(KEY_WHITESPACE)
+    digits = phone.translate(_DROP_PHONE_SEPARATORS)
+    if not _DIGITS_RE.fullmatch(digits):
+        return None
+    if phone.startswith('+'):
+        pass
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    elif (country or '').strip(KEY_WHITESPACE).upper() in NANP_COUNTRIES:
+        if len(digits) == 10:
+            digits = '1' + digits
+        elif not (len(digits) == 11 and digits.startswith('1')):
+            return None
+    else:
+        return None
+    return '+' + digits if 8 <= len(digits) <= 15 else None
+
+
+def _sql_chars(chars):
+    return f"char({', '.join(str(ord(c)) for c in chars)})"
+
+
+def email_key_sql(email):
+    """SQL expression computing normalize_email() of the email expression"""
+    return (f"(CASE WHEN typeof({email}) = 'text' AND instr({email}, '@') > 0 "
+            f"THEN lower(trim({email}, {_sql_chars(KEY_WHITESPACE)})) END)")
+
+
+def phone_key_sql(phone, country):
+    """SQL expression computing normalize_phone_e164() of the phone and country expressions"""
+    text = f'trim(CAST({phone} AS TEXT), {_sql_chars(KEY_WHITESPACE)})'
+    digits = text
+    for separator in PHONE_SEPARATORS:
+        digits = f"replace({digits}, {_sql_chars(separator)}, '')"
+    international = f'substr({digits}, 3)'
+    nanp = ', '.join(f"'{code}'" for code in sorted(NANP_COUNTRIES))
+    return f"""(CASE
+        WHEN {phone} IS NULL OR {phone} = '' OR {digits} = '' OR {digits} GLOB '*[^0-9]*' THEN NULL
+        WHEN substr({text}, 1, 1) = '+' THEN
+            CASE WHEN length({digits}) BETWEEN 8 AND 15 THEN '+' || {digits} END
+        WHEN substr({digits}, 1, 2) = '00' THEN
+            CASE WHEN length({international}) BETWEEN 8 AND 15 THEN '+' || {international} END
+        WHEN upper(trim(COALESCE({country}, ''), {_sql_chars(KEY_WHITESPACE)})) IN ({nanp}) THEN
+            CASE WHEN length({digits}) = 10 THEN '+1' || {digits}
+                 WHEN length({digits}) = 11 AND substr({digits}, 1, 1) = '1' THEN '+' || {digits} END
+    END)"""
+
+
+# Column order produced by build_contact_row
+_BOOLEAN_ORDER = [col for col in CONTACT_IMPORT_COLUMNS if col in BOOLEAN_COLUMNS]
+_ROW_ORDER = ['id'] + TEXT_COLUMNS + _BOOLEAN_ORDER + [
+    'country', 'created_at', 'updated_at', 'email_normalized', 'phone_e164'
+]
+
+
+def build_contact_row(contact_data, timestamp):
+    """Turn one submitted contact dict into a parameter tuple in _ROW_ORDER
+
+    Empty strings are stored as NULL, matching the original per-row import.
+    """
+    get = contact_data.get
+    values = [None if (value := get(col)) == '' else value for col in TEXT_COLUMNS]
+    values.extend(convert_to_bool(get(col)) for col in _BOOLEAN_ORDER)
+    country = get('country', 'US')
+    return (
+        str(uuid.uuid4()), *values, None if country == '' else country, timestamp, timestamp,
+        normalize_email(get('email')), normalize_phone_e164(get('phone'), country)
+    )
+
+
+def iter_body_blocks(rfile, content_length=None, chunked=False):
+    """Yield the raw request body in blocks, decoding chunked transfer encoding"""
+    if chunked:
+        while True:
+            size_line = rfile.readline(1024)
+            if not size_line:
+                raise ValueError('Unexpected end of chunked body')
+            size = int(size_line.split(b';', 1)[0].strip(), 16)
+            if size == 0:
+                # Skip optional trailers up to the terminating blank line
+                while rfile.readline(1024) not in (b'\r\n', b'\n', b''):
+                    pass
+                return
+            remaining = size
+            while remaining:
+                block = rfile.read(min(remaining, STREAM_READ_SIZE))
+                if not block:
+                    raise ValueError('Unexpected end of chunked body')
+                remaining -= len(block)
+                yield block
+            rfile.readline(1024)  # CRLF after each chunk
+    else:
+        remaining = content_length or 0
+        while remaining > 0:
+            block = rfile.read(min(remaining, STREAM_READ_SIZE))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
+
+def iter_text_lines(blocks, encoding='utf-8'):
+    """Incrementally decode byte blocks and yield lines with their line endings"""
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    pending = ''
+    for block in blocks:
+        pending += decoder.decode(block)
+        lines = pending.split('\n')
+        # The last piece is a partial line (or '') - keep it for the next block
+        pending = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+
+def _normalize_header(name):
+    return name.strip().lower().replace(' ', '_').replace('-', '_')
+
+
+def iter_csv_contacts(lines):
+    """Parse CSV lines (header row first) into contact dicts one row at a time"""
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    if header and header[0].startswith('\ufeff'):
+        header[0] = header[0][1:]
+    fields = [_normalize_header(name) for name in header]
+    for values in reader:
+        if not any(values):
+            continue
+        yield dict(zip(fields, values))
+
+
+def iter_ndjson_contacts(lines):
+    """Parse NDJSON lines into contact dicts; a malformed line becomes an error row"""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            contact = json.loads(line)
+        except ValueError as e:
+            yield InvalidRow(f'Invalid JSON: {e}')
+            continue
+        if not isinstance(contact, dict):
+            yield InvalidRow('Expected a JSON object')
+            continue
+        yield contact
+
+
+class InvalidRow:
+    """Placeholder for a row the parser could not read; counted as an import error"""
+
+    def __init__(self, reason):
+        self.reason = reason
+
+
+def build_upsert_sql(on_duplicate):
+    """INSERT statement for the import mode, resolving email/phone key conflicts with ON CONFLICT
+
+    skip   - keep the existing contact, drop the incoming row
+    update - overwrite the existing contact with the incoming row
+    merge  - fill in the existing contact with the incoming row's non-empty values
+    """
+    insert = (
+        f"INSERT INTO contacts ({', '.join(_ROW_ORDER)}) "
+        f"VALUES ({', '.join('?' for _ in _ROW_ORDER)})"
+    )
+    if on_duplicate == 'skip':
+        return insert + ' ON CONFLICT DO NOTHING'
+
+    update_columns = [col for col in _ROW_ORDER if col not in ('id', 'created_at')]
+    if on_duplicate == 'update':
+        assignments = ', '.join(f'{col} = excluded.{col}' for col in update_columns)
+    else:
+        assignments = ', '.join(f'{col} = COALESCE(excluded.{col}, {col})' for col in update_columns)
+    return (
+        f'{insert} '
+        f'ON CONFLICT(email_normalized) WHERE email_normalized IS NOT NULL DO UPDATE SET {assignments} '
+        f'ON CONFLICT(phone_e164) WHERE phone_e164 IS NOT NULL DO UPDATE SET {assignments}'
+    )
+
+
+class BulkContactImporter:
+    """Chunked, transactional contact importer bound to one SQLite connection"""
+
+    def __init__(self, conn, chunk_size=DEFAULT_CHUNK_SIZE, chunks_per_commit=DEFAULT_CHUNKS_PER_COMMIT,
+                 on_duplicate=DEFAULT_ON_DUPLICATE):
+        if on_duplicate not in ON_DUPLICATE_MODES:
+            raise ValueError(f"on_duplicate must be one of: {', '.join(ON_DUPLICATE_MODES)}")
+        self.conn = conn
+        self.chunk_size = max(1, chunk_size)
+        self.chunks_per_commit = max(1, chunks_per_commit)
+        self.on_duplicate = on_duplicate
+        self.insert_sql = build_upsert_sql(on_duplicate)
+        self.updated = 0
+        self.skipped = 0
+        self.fts_columns = None
+        self.has_stats = False
+        self.deferred_triggers = False
+        self.imported = 0
+        self.submitted = 0
+        self.errors = []
+        self.error_count = 0
+        self.started_at = None
+        self.finished_at = None
+
+    def _detect_schema(self, cursor):
+        """Find which trigger-maintained side tables this database has"""
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name IN ('contacts_bulk_load', 'contacts_fts', 'contacts_stats')"
+        )
+        names = {row[0] for row in cursor.fetchall()}
+        self.deferred_triggers = 'contacts_bulk_load' in names
+        self.has_stats = 'contacts_stats' in names
+        if 'contacts_fts' in names:
+            cursor.execute('PRAGMA table_info(contacts_fts)')
+            self.fts_columns = [row[1] for row in cursor.fetchall()]
+
+    def _begin(self, cursor):
+        cursor.execute('BEGIN')
+        if self.deferred_triggers:
+            cursor.execute('INSERT INTO contacts_bulk_load (id) VALUES (1)')
+
+    def _commit(self, cursor):
+        if self.deferred_triggers:
+            cursor.execute('DELETE FROM contacts_bulk_load')
+        self.conn.commit()
+
+    def _max_rowid(self, cursor):
+        cursor.execute('SELECT MAX(rowid) FROM contacts')
+        return cursor.fetchone()[0] or 0
+
+    def _apply_deferred(self, cursor, after_rowid, inserted):
+        """Do the paused trigger work for rows appended after after_rowid"""
+        if not self.deferred_triggers or not inserted:
+            return
+        if self.fts_columns:
+            columns = ', '.join(self.fts_columns)
+            cursor.execute(
+                f'INSERT INTO contacts_fts(rowid, {columns}) SELECT rowid, {columns} FROM contacts WHERE rowid > ?',
+                (after_rowid,)
+            )
+        if self.has_stats:
+            cursor.execute(
+                'UPDATE contacts_stats SET total = total + ?, version = version + 1 WHERE id = 1',
+                (inserted,)
+            )
+
+    def _count_new_rows(self, cursor, after_rowid):
+        cursor.execute('SELECT COUNT(*) FROM contacts WHERE rowid > ?', (after_rowid,))
+        return cursor.fetchone()[0]
+
+    def _tally(self, attempted, changed, inserted):
+        """Split a chunk's outcome into inserted / updated (upserted) / skipped rows"""
+        self.imported += inserted
+        self.updated += changed - inserted
+        self.skipped += attempted - changed
+
+    def _insert_chunk(self, cursor, chunk):
+        """Insert one chunk of (row_number, params) under a savepoint"""
+        # New rows get rowids above the current max, so the chunk's inserts are exactly rowid > after_rowid
+        after_rowid = self._max_rowid(cursor)
+        cursor.execute('SAVEPOINT import_chunk')
+        try:
+            cursor.executemany(self.insert_sql, [params for _, params in chunk])
+            changed = cursor.rowcount
+            inserted = self._count_new_rows(cursor, after_rowid)
+            self._apply_deferred(cursor, after_rowid, inserted)
+            cursor.execute('RELEASE import_chunk')
+            self._tally(len(chunk), changed, inserted)
+            return
+        except Exception:
+            cursor.execute('ROLLBACK TO import_chunk')
+            cursor.execute('RELEASE import_chunk')
+
+        # Isolate the bad rows - each single-row INSERT is atomic on its own
+        attempted = changed = 0
+        for row_number, params in chunk:
+            try:
+                cursor.execute(self.insert_sql, params)
+                changed += cursor.rowcount
+                attempted += 1
+            except Exception as row_error:
+                self._record_error(row_number, row_error)
+        inserted = self._count_new_rows(cursor, after_rowid)
+        self._apply_deferred(cursor, after_rowid, inserted)
+        self._tally(attempted, changed, inserted)
+
+    def _record_error(self, row_number, error):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f'Row {row_number}: {str(error)}')
+            print(f"Error importing row {row_number}: {error}")
+
+    def _read_chunks(self, contacts, timestamp):
+        """Pull up to chunks_per_commit chunks of (row_number, params) from the iterator
+
+        Returns [] once the iterator is exhausted.
+        """
+        chunks = []
+        chunk = []
+        for contact_data in contacts:
+            self.submitted += 1
+            if isinstance(contact_data, InvalidRow):
+                self._record_error(self.submitted, contact_data.reason)
+                continue
+            try:
+                chunk.append((self.submitted, build_contact_row(contact_data, timestamp)))
+            except Exception as row_error:
+                self._record_error(self.submitted, row_error)
+                continue
+
+            if len(chunk) >= self.chunk_size:
+                chunks.append(chunk)
+                chunk = []
+                if len(chunks) >= self.chunks_per_commit:
+                    return chunks
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def import_contacts(self, contacts):
+        """Import an iterable of contact dicts; returns the stats dict
+
+        The iterable is consumed lazily one transaction (chunks_per_commit chunks)
+        at a time, so generators (streamed uploads) keep memory bounded. Each
+        transaction's rows are read before it begins: a slow client never holds
+        the write lock. stats() can be read from another thread meanwhile.
+        """
+        self.started_at = time.perf_counter()
+        cursor = self.conn.cursor()
+        contacts = iter(contacts)
+
+        if self.conn.in_transaction:
+            self.conn.commit()
+        self._detect_schema(cursor)
+        try:
+            while True:
+                chunks = self._read_chunks(contacts, datetime.now().isoformat())
+                if not chunks:
+                    break
+                self._begin(cursor)
+                for chunk in chunks:
+                    self._insert_chunk(cursor, chunk)
+                self._commit(cursor)
+        except BaseException:
+            self.conn.rollback()
+            raise
+        finally:
+            self.finished_at = time.perf_counter()
+
+        return self.stats()
+
+    def stats(self):
+        """Progress / result counters including throughput"""
+        end = self.finished_at if self.finished_at is not None else time.perf_counter()
+        elapsed = (end - self.started_at) if self.started_at is not None else 0.0
+        return {
+            'imported': self.imported,
+            'updated': self.updated,
+            'skipped': self.skipped,
+            'on_duplicate': self.on_duplicate,
+            'total_submitted': self.submitted,
+            'errors': self.errors,
+            'error_count': self.error_count,
+            'elapsed_seconds': round(elapsed, 3),
+            'rows_per_second': round(self.imported / elapsed) if elapsed > 0 else None,
+        }
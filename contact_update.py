@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Bulk contact update engine
+Applies one field patch to many contacts inside a single transaction, as
+set-based UPDATE ... WHERE id IN (...) chunks with per-id results
+"""
+
+import time
+from datetime import datetime
+
+from contact_import import normalize_email, normalize_phone_e164
+
+# Fields a client may change with PUT /api/contacts/<id> or a bulk patch
+UPDATABLE_CONTACT_FIELDS = [
+    'assigned_to', 'sponsor', 'sponsor_first', 'sponsor_last', 'user_id', 'first_name', 'last_name',
+    'email', 'email_valid', 'phone', 'address', 'city', 'state', 'zip', 'status',
+    'rating', 'ip_address', 'date_created', 'timezone', 'cell', 'carrier',
+    'landline', 'voip', 'other_phone', 'foreign_number', 'country'
+]
+
+BULK_UPDATE_CHUNK_SIZE = 500    # ids per UPDATE statement / savepoint
+MAX_BULK_UPDATE_IDS = 50000     # ids one request may touch
+
+
+def build_patch_assignments(patch):
+    """SET clause and params for a patch dict, keeping the dedupe key columns in step
+
+    Expressions on the right-hand side of an UPDATE see the row's old values, so
+    phone_e164 is recomputed from the new phone/country where the patch has them
+    and from the stored ones otherwise (needs register_contact_functions).
+    """
+    unknown = [field for field in patch if field not in UPDATABLE_CONTACT_FIELDS]
+    if unknown:
+        raise ValueError(f"Fields cannot be updated: {', '.join(unknown)}")
+    if not patch:
+        raise ValueError('patch must contain at least one field')
+
+    set_clauses = [f'{field} = ?' for field in patch]
+    params = list(patch.values())
+    if 'email' in patch:
+        set_clauses.append('email_normalized = ?')
+        params.append(normalize_email(patch['email']))
+    if 'phone' in patch or 'country' in patch:
+        phone_expr = '?' if 'phone' in patch else 'phone'
+        country_expr = '?' if 'country' in patch else 'country'
+        set_clauses.append(f'phone_e164 = normalize_phone_e164({phone_expr}, {country_expr})')
+        params.extend(patch[field] for field in ('phone', 'country') if field in patch)
+    set_clauses.append('updated_at = ?')
+    params.append(datetime.now().isoformat())
+    return ', '.join(set_clauses), params
+
+
+def register_contact_functions(conn):
+    """Expose the dedupe key normalizers to SQL on this connection"""
+    conn.create_function('normalize_email', 1, normalize_email, deterministic=True)
+    conn.create_function('normalize_phone_e164', 2, normalize_phone_e164, deterministic=True)
+
+
+class BulkContactUpdater:
+    """Apply one patch to a list of contact ids on one SQLite connection
+
+    Each chunk runs under a savepoint; when a chunk hits a unique-key conflict
+    (two contacts given the same email or phone) it is retried id by id so only
+    the conflicting contacts fail. The whole request commits once.
+    """
+
+    def __init__(self, conn, patch, chunk_size=BULK_UPDATE_CHUNK_SIZE):
+        self.conn = conn
+        self.set_sql, self.set_params = build_patch_assignments(patch)
+        self.chunk_size = max(1, chunk_size)
+        self.results = []
+        self.updated = 0
+        self.not_found = 0
+        self.conflicts = 0
+        self.elapsed = 0.0
+
+    def _update_sql(self, id_count, visibility_condition):
+        placeholders = ', '.join('?' for _ in range(id_count))
+        where = f'c.id IN ({placeholders})'
+        if visibility_condition:
+            where += f' AND {visibility_condition}'
+        return f'UPDATE contacts AS c SET {self.set_sql} WHERE {where} RETURNING id'
+
+    def _update_chunk(self, cursor, ids, visibility_condition, visibility_params):
+        """Update one chunk; returns {id: status}"""
+        cursor.execute('SAVEPOINT bulk_update_chunk')
+        try:
+            cursor.execute(self._update_sql(len(ids), visibility_condition),
+                           self.set_params + list(ids) + list(visibility_params))
+            updated = {row[0] for row in cursor.fetchall()}
+            cursor.execute('RELEASE bulk_update_chunk')
+            return {contact_id: 'updated' if contact_id in updated else 'not_found' for contact_id in ids}
+        except Exception:
+            cursor.execute('ROLLBACK TO bulk_update_chunk')
+            cursor.execute('RELEASE bulk_update_chunk')
+
+        statuses = {}
+        single_sql = self._update_sql(1, visibility_condition)
+        for contact_id in ids:
+            try:
+                cursor.execute(single_sql, self.set_params + [contact_id] + list(visibility_params))
+                statuses[contact_id] = 'updated' if cursor.fetchall() else 'not_found'
+            except Exception as e:
+                statuses[contact_id] = f'conflict: {e}'
+        return statuses
+
+    def update_ids(self, ids, visibility_condition=None, visibility_params=()):
+        """Patch every id (duplicates ignored) in one transaction; returns the result dict"""
+        started = time.perf_counter()
+        ids = list(dict.fromkeys(ids))
+        register_contact_functions(self.conn)
+        cursor = self.conn.cursor()
+        if self.conn.in_transaction:
+            self.conn.commit()
+        cursor.execute('BEGIN')
+        try:
+            for start in range(0, len(ids), self.chunk_size):
+                chunk = ids[start:start + self.chunk_size]
+                statuses = self._update_chunk(cursor, chunk, visibility_condition, visibility_params)
+                for contact_id in chunk:
+                    status = statuses[contact_id]
+                    if status == 'updated':
+                        self.updated += 1
+                        self.results.append({'id': contact_id, 'status': 'updated'})
+                    elif status == 'not_found':
+                        self.not_found += 1
+                        self.results.append({'id': contact_id, 'status': 'not_found'})
+                    else:
+                        self.conflicts += 1
+                        self.results.append({'id': contact_id, 'status': 'conflict', 'error': status[len('conflict: '):]})
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+        finally:
+            self.elapsed = time.perf_counter() - started
+        return self.stats()
+
+    def stats(self):
+        return {
+            'matched': len(self.results),
+            'updated': self.updated,
+            'not_found': self.not_found,
+            'conflicts': self.conflicts,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'results': self.results,
+        }
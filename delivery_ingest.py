@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""
+Write-behind ingest queue for delivery report webhooks
+Webhook handlers enqueue reports and return right away; one writer thread
+group-commits them in batches by size or time into the current
+delivery_reports partition, keeping the hourly delivery_stats_hourly rollup
+current in the same transaction
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from delivery_partitions import REPORT_COLUMNS, ensure_partition, find_existing_reports, partition_key
+
+# Batching and durability settings
+BATCH_SIZE = int(os.getenv('DELIVERY_BATCH_SIZE', 500))              # reports per commit (max)
+FLUSH_INTERVAL = float(os.getenv('DELIVERY_FLUSH_INTERVAL', 0.25))   # seconds a report may wait for its batch
+QUEUE_MAX = int(os.getenv('DELIVERY_QUEUE_MAX', 50000))              # pending reports before webhooks get 503
+# 'queued'    - acknowledge as soon as the report is queued (fastest; a crash loses the unflushed batch)
+# 'committed' - acknowledge after the batch holding the report has committed
+ACK_MODE = os.getenv('DELIVERY_ACK_MODE', 'queued')
+# SQLite fsync policy for the writer connection: NORMAL or FULL
+SYNCHRONOUS = os.getenv('DELIVERY_SYNCHRONOUS', 'NORMAL')
+# Retries for a batch that found the database locked (each attempt already waits
+# out the connection's busy_timeout) before its reports count as write errors
+WRITE_RETRIES = int(os.getenv('DELIVERY_WRITE_RETRIES', 8))
+WRITE_RETRY_BACKOFF = 0.25          # seconds before the first retry, doubling per attempt
+WRITE_RETRY_BACKOFF_MAX = 5.0
+
+UPSERT_SQL = f'''
+    INSERT INTO {{table}} ({', '.join(REPORT_COLUMNS)})
+    VALUES ({', '.join('?' for _ in REPORT_COLUMNS)})
+    ON CONFLICT(id) DO UPDATE SET
+        message_id = COALESCE(excluded.message_id, message_id),
+        phone_number = COALESCE(excluded.phone_number, phone_number),
+        status = excluded.status,
+        timestamp = excluded.timestamp,
+        error_code = excluded.error_code,
+        error_text = excluded.error_text,
+        provider = excluded.provider,
+        received_at = excluded.received_at
+'''
+
+
+# Hourly counts per (hour, provider, status, error_code); missing values are stored as ''
+DELIVERY_STATS_DDL = '''
+    CREATE TABLE IF NOT EXISTS delivery_stats_hourly (
+        hour TEXT NOT NULL,
+        provider TEXT NOT NULL,
+        status TEXT NOT NULL,
+        error_code TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (hour, provider, status, error_code)
+    ) WITHOUT ROWID
+'''
+
+STATS_UPSERT_SQL = '''
+    INSERT INTO delivery_stats_hourly (hour, provider, status, error_code, count) VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(hour, provider, status, error_code) DO UPDATE SET count = count + excluded.count
+'''
+
+STATS_GROUP_COLUMNS = ('provider', 'status', 'error_code')
+STATS_BUCKETS = {'hour': 16, 'day': 10, 'month': 7}   # prefix length of the hour key per bucket
+
+# Column positions in a REPORT_COLUMNS row
+COLUMN_INDEX = {name: index for index, name in enumerate(REPORT_COLUMNS)}
+
+
+class IngestQueueFull(Exception):
+    """Raised when the ingest queue is at QUEUE_MAX"""
+
+
+class InvalidReport(ValueError):
+    """A delivery report payload that cannot be stored (not an object, or a field that is not a scalar)"""
+
+
+def is_lock_error(error):
+    """Whether a SQLite error means another writer held the lock (worth retrying)"""
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+class _Submission:
+    """A group of reports from one webhook call, with a completion signal"""
+
+    __slots__ = ('rows', 'done', 'error')
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.done = threading.Event()
+        self.error = None
+
+
+def _report_text(report, field):
+    value = report.get(field)
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        return str(value)
+    raise InvalidReport(f'Delivery report field {field} must be a string or number')
+
+
+def build_report_row(report, provider=None, received_at=None):
+    """Normalize one delivery report dict into a REPORT_COLUMNS tuple of str/None
+
+    Raises InvalidReport for a payload that is not an object, lacks an id or has
+    a list/object field, so a bad report is refused before it is queued.
+    """
+    if not isinstance(report, dict):
+        raise InvalidReport('Delivery report must be an object')
+    report_id = _report_text(report, 'id')
+    if not report_id:
+        raise InvalidReport('Delivery report id is required')
+    return (
+        report_id,
+        _report_text(report, 'message_id'),
+        _report_text(report, 'phone_number'),
+        _report_text(report, 'status'),
+        _report_text(report, 'timestamp'),
+        _report_text(report, 'error_code'),
+        _report_text(report, 'error_text'),
+        provider or _report_text(report, 'provider'),
+        received_at or datetime.now().isoformat(),
+    )
+
+
+def stats_hour(received_at):
+    """Hour bucket key ('2026-10-18T17:00') for an ISO received_at timestamp"""
+    return f'{(received_at or "")[:13]}:00'
+
+
+def stats_key(provider, status, error_code, received_at):
+    return (stats_hour(received_at), provider or '', status or '', str(error_code) if error_code is not None else '')
+
+
+def init_delivery_stats(cursor):
+    """Create delivery_stats_hourly, backfilling it from delivery_reports the first time"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'delivery_stats_hourly'")
+    exists = cursor.fetchone() is not None
+    cursor.execute(DELIVERY_STATS_DDL)
+    if not exists:
+        cursor.execute('''
+            INSERT INTO delivery_stats_hourly (hour, provider, status, error_code, count)
+            SELECT substr(COALESCE(received_at, ''), 1, 13) || ':00', COALESCE(provider, ''), COALESCE(status, ''),
+                   COALESCE(CAST(error_code AS TEXT), ''), COUNT(*)
+            FROM delivery_reports
+            GROUP BY 1, 2, 3, 4
+        ''')
+
+
+def row_stats_key(row):
+    return stats_key(row[COLUMN_INDEX['provider']], row[COLUMN_INDEX['status']],
+                     row[COLUMN_INDEX['error_code']], row[COLUMN_INDEX['received_at']])
+
+
+def write_partition_rows(conn, key, rows, deltas):
+    """Upsert rows belonging to one partition, recording rollup changes in deltas
+
+    A report already stored (a status update for the same id) leaves its old
+    bucket and joins the new one; only the last row per id counts. A copy found
+    in an earlier partition is moved into this one, keeping its message_id and
+    phone_number when the update lacks them.
+    """
+    table = ensure_partition(conn, key)
+    latest = {row[0]: row for row in rows}
+    existing = find_existing_reports(conn, list(latest), key)
+    moved = {}
+    for report_id, (old_table, old_row) in existing.items():
+        deltas[row_stats_key(old_row)] -= 1
+        if old_table != table:
+            moved[report_id] = old_row
+            conn.execute(f'DELETE FROM {old_table} WHERE id = ?', (report_id,))
+    if moved:
+        rows = [_merge_moved_row(row, moved[row[0]]) if row[0] in moved else row for row in rows]
+    conn.executemany(UPSERT_SQL.format(table=table), rows)
+    for row in latest.values():
+        deltas[row_stats_key(row)] += 1
+
+
+def _merge_moved_row(row, old_row):
+    row = list(row)
+    for column in ('message_id', 'phone_number'):
+        if row[COLUMN_INDEX[column]] is None:
+            row[COLUMN_INDEX[column]] = old_row[COLUMN_INDEX[column]]
+    return tuple(row)
+
+
+def write_report_rows(conn, rows):
+    """Upsert delivery report rows into their received_at partitions and roll them into delivery_stats_hourly on conn (caller commits)"""
+    by_partition = {}
+    for row in rows:
+        by_partition.setdefault(partition_key(row[COLUMN_INDEX['received_at']]), []).append(row)
+    deltas = Counter()
+    # Oldest partition first, so a report updated across a period boundary ends in the newest
+    for key in sorted(by_partition):
+        write_partition_rows(conn, key, by_partition[key], deltas)
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if deltas:
+        conn.executemany(STATS_UPSERT_SQL, [key + (delta,) for key, delta in deltas.items()])
+        emptied = [key for key, delta in deltas.items() if delta < 0]
+        if emptied:
+            conn.executemany(
+                'DELETE FROM delivery_stats_hourly WHERE hour = ? AND provider = ? AND status = ? AND error_code = ? AND count <= 0',
+                emptied
+            )
+
+
+def check_stats_query(bucket, group_by, filters=None):
+    """Raise ValueError for an unknown bucket or group/filter column"""
+    if bucket not in STATS_BUCKETS:
+        raise ValueError(f"bucket must be one of: {', '.join(STATS_BUCKETS)}")
+    for name in list(group_by) + list(filters or {}):
+        if name not in STATS_GROUP_COLUMNS:
+            raise ValueError(f"Cannot group or filter stats by: {name}")
+
+
+class DeliveryStatsRollup:
+    """In-memory delivery_stats_hourly for servers that keep reports in a dict"""
+
+    def __init__(self):
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, report, previous=None):
+        """Count report (a dict with provider/status/error_code/received_at), replacing previous"""
+        with self._lock:
+            if previous is not None:
+                old_key = stats_key(previous.get('provider'), previous.get('status'),
+                                    previous.get('error_code'), previous.get('received_at'))
+                self.counts[old_key] -= 1
+                if self.counts[old_key] <= 0:
+                    del self.counts[old_key]
+            self.counts[stats_key(report.get('provider'), report.get('status'),
+                                  report.get('error_code'), report.get('received_at'))] += 1
+
+    def clear(self):
+        with self._lock:
+            self.counts.clear()
+
+    def query(self, since=None, until=None, bucket='day', group_by=('provider', 'status'), filters=None):
+        """Same result rows as query_delivery_stats"""
+        check_stats_query(bucket, group_by, filters)
+        filters = filters or {}
+        totals = Counter()
+        with self._lock:
+            items = list(self.counts.items())
+        for (hour, provider, status, error_code), count in items:
+            values = {'provider': provider, 'status': status, 'error_code': error_code}
+            if (since and hour < since) or (until and hour >= until):
+                continue
+            if any(values[name] not in allowed for name, allowed in filters.items()):
+                continue
+            totals[(hour[:STATS_BUCKETS[bucket]],) + tuple(values[name] for name in group_by)] += count
+        return [
+            dict(zip(('bucket',) + tuple(group_by), key), count=count)
+            for key, count in sorted(totals.items())
+        ]
+
+
+def query_delivery_stats(conn, since=None, until=None, bucket='day', group_by=('provider', 'status'), filters=None):
+    """Time-bucketed delivery counts from delivery_stats_hourly
+
+    since/until compare against the hour key, so dates ('2026-10-01') and hours
+    ('2026-10-01T13') both work. filters maps a group column to allowed values.
+    Returns [{'bucket': ..., <group_by columns>..., 'count': n}] oldest first.
+    """
+    check_stats_query(bucket, group_by, filters)
+    conditions = []
+    params = []
+    if since:
+        conditions.append('hour >= ?')
+        params.append(since)
+    if until:
+        conditions.append('hour < ?')
+        params.append(until)
+    for name, allowed in (filters or {}).items():
+        conditions.append(f"{name} IN ({', '.join('?' for _ in allowed)})")
+        params.extend(allowed)
+    where_clause = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+    columns = ', '.join(group_by)
+    select_columns = f', {columns}' if group_by else ''
+    rows = conn.execute(f'''
+        SELECT substr(hour, 1, {STATS_BUCKETS[bucket]}) AS bucket{select_columns}, SUM(count)
+        FROM delivery_stats_hourly
+        {where_clause}
+        GROUP BY 1{select_columns}
+        ORDER BY 1{select_columns}
+    ''', params).fetchall()
+    return [dict(zip(('bucket',) + tuple(group_by), row[:-1]), count=row[-1]) for row in rows]
+
+
+class DeliveryReportWriter:
+    """Background group-commit writer for delivery reports"""
+
+    def __init__(self, connection_factory, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL,
+                 queue_max=QUEUE_MAX, ack_mode=ACK_MODE, synchronous=SYNCHRONOUS, write_retries=WRITE_RETRIES):
+        if ack_mode not in ('queued', 'committed'):
+            raise ValueError("ack_mode must be 'queued' or 'committed'")
+        self.connection_factory = connection_factory
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.0, flush_interval)
+        self.ack_mode = ack_mode
+        self.synchronous = synchronous
+        self.write_retries = max(0, write_retries)
+        self.queue_max = max(1, queue_max)
+        # Unbounded: the QUEUE_MAX limit is on reports (checked in submit), not on submissions
+        self._queue = queue.Queue()
+        self._pending_reports = 0
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='delivery-writer', daemon=True)
+        self.metrics = {
+            'reports_written': 0,
+            'batches_written': 0,
+            'last_batch_size': 0,
+            'last_flush_ms': 0.0,
+            'max_queue_depth': 0,
+            'rejected': 0,
+            'write_errors': 0,
+            'write_retries': 0,
+        }
+        self._thread.start()
+
+    def submit(self, rows, timeout=10.0):
+        """Queue report rows; in 'committed' ack mode, block until they are written
+
+        Raises IngestQueueFull when the queue is saturated, or the write error in
+        'committed' mode.
+        """
+        if not rows:
+            return
+        submission = _Submission(rows)
+        with self._lock:
+            if self._pending_reports + len(rows) > self.queue_max:
+                self.metrics['rejected'] += len(rows)
+                raise IngestQueueFull('Delivery report queue is full')
+            self._pending_reports += len(rows)
+            self.metrics['max_queue_depth'] = max(self.metrics['max_queue_depth'], self._pending_reports)
+        self._queue.put(submission)
+
+        if self.ack_mode == 'committed':
+            if not submission.done.wait(timeout):
+                raise TimeoutError('Timed out waiting for delivery report commit')
+            if submission.error is not None:
+                raise submission.error
+
+    def queue_depth(self):
+        """Reports accepted but not yet committed"""
+        with self._lock:
+            return self._pending_reports
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.metrics)
+            stats['queue_depth'] = self._pending_reports
+        stats.update({
+            'batch_size': self.batch_size,
+            'flush_interval': self.flush_interval,
+            'queue_max': self.queue_max,
+            'ack_mode': self.ack_mode,
+            'synchronous': self.synchronous,
+        })
+        return stats
+
+    def _collect_batch(self):
+        """Wait for the first submission, then gather more until the batch is full or the interval passes"""
+        try:
+            first = self._queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        batch = [first]
+        count = len(first.rows)
+        deadline = time.monotonic() + self.flush_interval
+        while count < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0 or self._stopping.is_set():
+                    submission = self._queue.get_nowait()
+                else:
+                    submission = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(submission)
+            count += len(submission.rows)
+        return batch
+
+    def _write_rows(self, conn, rows):
+        """Write and commit rows in one transaction; returns the error, or None"""
+        attempt = 0
+        # Reports may already be acknowledged, so a locked database is waited out
+        # rather than dropping them
+        while True:
+            try:
+                write_report_rows(conn, rows)
+                conn.commit()
+                return None
+            except Exception as e:
+                conn.rollback()
+                if not is_lock_error(e) or attempt >= self.write_retries:
+                    return e
+                delay = min(WRITE_RETRY_BACKOFF * 2 ** attempt, WRITE_RETRY_BACKOFF_MAX)
+                attempt += 1
+                print(f"⚠️ Delivery report batch of {len(rows)} found the database locked, "
+                      f"retry {attempt}/{self.write_retries} in {delay:.2f}s")
+                with self._lock:
+                    self.metrics['write_retries'] += 1
+                time.sleep(delay)
+
+    def _write_batch(self, conn, batch):
+        rows = [row for submission in batch for row in submission.rows]
+        started = time.perf_counter()
+        error = self._write_rows(conn, rows)
+        if error is None:
+            errors = [None] * len(batch)
+        elif len(batch) > 1 and not is_lock_error(error):
+            # One bad submission must not fail the reports co-batched with it:
+            # write each in its own transaction so only the culprit fails
+            print(f"⚠️ Delivery report batch of {len(rows)} failed ({error}), writing its submissions one by one")
+            errors = [self._write_rows(conn, submission.rows) for submission in batch]
+        else:
+            errors = [error] * len(batch)
+
+        failed = 0
+        for submission, submission_error in zip(batch, errors):
+            if submission_error is not None:
+                failed += len(submission.rows)
+                print(f"[ERROR] Delivery report submission of {len(submission.rows)} failed: {submission_error}")
+        with self._lock:
+            self._pending_reports -= len(rows)
+            self.metrics['write_errors'] += failed
+            if failed < len(rows):
+                self.metrics['reports_written'] += len(rows) - failed
+                self.metrics['batches_written'] += 1
+                self.metrics['last_batch_size'] = len(rows) - failed
+                self.metrics['last_flush_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        for submission, submission_error in zip(batch, errors):
+            submission.error = submission_error
+            submission.done.set()
+
+    def _run(self):
+        conn = self.connection_factory()
+        conn.execute(f'PRAGMA synchronous = {self.synchronous}')
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._collect_batch()
+            if batch:
+                self._write_batch(conn, batch)
+        conn.close()
+
+    def close(self, timeout=10.0):
+        """Flush everything queued and stop the writer thread"""
+        self._stopping.set()
+        self._thread.join(timeout)
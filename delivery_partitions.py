@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+"""
+Time-partitioned delivery report storage
+Reports live in one table per month (or day) of received_at, with a
+delivery_reports view over all of them for ad-hoc reads. Webhook writes only
+touch the current partition, old partitions can be archived to read-only
+gzipped NDJSON, and retention drops whole partitions instead of deleting rows
+"""
+
+import glob
+import gzip
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+# 'month' or 'day' - partitions of both kinds can coexist if this is changed later
+PARTITION_PERIOD = os.getenv('DELIVERY_PARTITION_PERIOD', 'month')
+# Older partitions searched for an earlier copy of an incoming report (status
+# updates arriving just after a period rolls over); older copies are not found
+PARTITION_LOOKBACK = int(os.getenv('DELIVERY_PARTITION_LOOKBACK', 1))
+# Policy (0 disables): archive partitions whose period ended this many days ago,
+# and drop partitions/archives past the retention age
+ARCHIVE_AFTER_DAYS = int(os.getenv('DELIVERY_ARCHIVE_AFTER_DAYS', 0))
+RETENTION_DAYS = int(os.getenv('DELIVERY_RETENTION_DAYS', 0))
+ARCHIVE_DIR = os.getenv('DELIVERY_ARCHIVE_DIR', 'delivery_archive')
+MAINTENANCE_INTERVAL = float(os.getenv('DELIVERY_MAINTENANCE_INTERVAL', 3600))
+
+REPORT_COLUMNS = [
+    'id', 'message_id', 'phone_number', 'status', 'timestamp',
+    'error_code', 'error_text', 'provider', 'received_at'
+]
+
+PARTITION_COLUMNS_DDL = '''
+    id TEXT PRIMARY KEY,
+    message_id TEXT,
+    phone_number TEXT,
+    status TEXT,
+    timestamp TEXT,
+    error_code TEXT,
+    error_text TEXT,
+    provider TEXT,
+    received_at TEXT DEFAULT CURRENT_TIMESTAMP
+'''
+
+# Same indexes the single table had, for filtered, keyset-paginated reads
+PARTITION_INDEXES = [
+    ('received', 'received_at DESC, id DESC'),
+    ('status', 'status, received_at, id'),
+    ('provider', 'provider, received_at, id'),
+    ('phone', 'phone_number, received_at, id'),
+    ('message_id', 'message_id'),
+]
+
+PARTITION_KEY_LENGTHS = {'month': 7, 'day': 10}
+PARTITION_KEY_RE = re.compile(r'^\d{4}-\d{2}(-\d{2})?$')
+PARTITION_TABLE_RE = re.compile(r'^delivery_reports_(\d{4}_\d{2}(?:_\d{2})?)$')
+# Reports without a usable received_at
+UNDATED_KEY = '0000-00'
+
+ARCHIVE_BATCH_SIZE = 5000
+# Partitions per UNION ALL of the delivery_reports view; SQLite refuses a compound
+# SELECT of more than 500 terms, so larger sets go through delivery_reports_group_N views
+VIEW_GROUP_SIZE = 400
+
+
+def partition_key(received_at, period=PARTITION_PERIOD):
+    """Partition key ('2026-10' or '2026-10-18') for an ISO received_at"""
+    key = (received_at or '')[:PARTITION_KEY_LENGTHS[period]]
+    return key if PARTITION_KEY_RE.match(key) else UNDATED_KEY
+
+
+def partition_table(key):
+    return 'delivery_reports_' + key.replace('-', '_')
+
+
+def partition_end(key):
+    """First moment after the partition's period"""
+    if key == UNDATED_KEY:
+        return datetime.min
+    if len(key) == PARTITION_KEY_LENGTHS['day']:
+        return datetime.strptime(key, '%Y-%m-%d') + timedelta(days=1)
+    start = datetime.strptime(key, '%Y-%m')
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def list_partitions(conn):
+    """(key, table) for every live partition, oldest first"""
+    rows = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB 'delivery_reports_[0-9]*'"
+    ).fetchall()
+    partitions = []
+    for (name,) in rows:
+        match = PARTITION_TABLE_RE.match(name)
+        if match:
+            partitions.append((match.group(1).replace('_', '-'), name))
+    return sorted(partitions)
+
+
+@contextmanager
+def ddl_transaction(conn):
+    """Make partition DDL and the view rebuild one atomic change
+
+    Pooled connections use legacy isolation, where each DDL statement would
+    commit on its own and readers could see the view over a dropped table. The
+    block joins the caller's open transaction (a migration step, say), otherwise
+    it runs in its own BEGIN IMMEDIATE ... COMMIT.
+    """
+    connection = getattr(conn, 'connection', conn)    # conn may be a cursor
+    if connection.in_transaction:
+        yield
+        return
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+
+def rebuild_reports_view(conn):
+    """Point the delivery_reports view at the current set of partitions (run inside ddl_transaction)"""
+    columns = ', '.join(REPORT_COLUMNS)
+    tables = [table for _, table in list_partitions(conn)]
+    conn.execute('DROP VIEW IF EXISTS delivery_reports')
+    groups = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'view' AND name GLOB 'delivery_reports_group_*'"
+    ).fetchall()
+    for (name,) in groups:
+        conn.execute(f'DROP VIEW {name}')
+    if len(tables) > VIEW_GROUP_SIZE:
+        # e.g. day partitions kept for years: union groups of partitions instead
+        grouped = []
+        for start in range(0, len(tables), VIEW_GROUP_SIZE):
+            name = f'delivery_reports_group_{start // VIEW_GROUP_SIZE}'
+            group = tables[start:start + VIEW_GROUP_SIZE]
+            conn.execute(f"CREATE VIEW {name} AS {' UNION ALL '.join(f'SELECT {columns} FROM {table}' for table in group)}")
+            grouped.append(name)
+        tables = grouped
+    if tables:
+        body = ' UNION ALL '.join(f'SELECT {columns} FROM {table}' for table in tables)
+    else:
+        body = 'SELECT ' + ', '.join(f'NULL AS {column}' for column in REPORT_COLUMNS) + ' WHERE 0'
+    conn.execute(f'CREATE VIEW delivery_reports AS {body}')
+
+
+def _partition_exists(conn, table):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is not None
+
+
+def ensure_partition(conn, key):
+    """Create the partition for key (with its indexes) if needed; returns its table name
+
+    PartitionMaintainer creates the next period's partition ahead of time, so
+    webhook writes normally only run the existence check.
+    """
+    table = partition_table(key)
+    if _partition_exists(conn, table):
+        return table
+    with ddl_transaction(conn):
+        conn.execute(f'CREATE TABLE IF NOT EXISTS {table} ({PARTITION_COLUMNS_DDL})')
+        for suffix, columns in PARTITION_INDEXES:
+            conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_{suffix} ON {table}({columns})')
+        rebuild_reports_view(conn)
+    return table
+
+
+def next_partition_key(key):
+    """Key of the period after key"""
+    end = partition_end(key)
+    return end.strftime('%Y-%m-%d' if len(key) == PARTITION_KEY_LENGTHS['day'] else '%Y-%m')
+
+
+def precreate_partitions(conn, now=None):
+    """Create the current and next period's partitions, keeping DDL off the webhook path at rollover"""
+    key = partition_key((now or datetime.now()).isoformat())
+    return [ensure_partition(conn, key), ensure_partition(conn, next_partition_key(key))]
+
+
+def drop_partition(conn, key):
+    with ddl_transaction(conn):
+        conn.execute(f'DROP TABLE IF EXISTS {partition_table(key)}')
+        rebuild_reports_view(conn)
+
+
+def partition_delivery_reports(cursor):
+    """Migration: move a plain delivery_reports table into partitions behind the view"""
+    # Runs inside the migration's transaction, which ddl_transaction joins
+    cursor.execute("SELECT type FROM sqlite_master WHERE name = 'delivery_reports'")
+    row = cursor.fetchone()
+    if row is None or row[0] != 'table':
+        rebuild_reports_view(cursor)
+        return
+    cursor.execute('ALTER TABLE delivery_reports RENAME TO delivery_reports_unpartitioned')
+    length = PARTITION_KEY_LENGTHS[PARTITION_PERIOD]
+    prefix_sql = f"substr(COALESCE(received_at, ''), 1, {length})"
+    prefixes = [row[0] for row in cursor.execute(f'SELECT DISTINCT {prefix_sql} FROM delivery_reports_unpartitioned').fetchall()]
+    columns = ', '.join(REPORT_COLUMNS)
+    for prefix in prefixes:
+        table = ensure_partition(cursor, partition_key(prefix))
+        cursor.execute(
+            f'INSERT OR REPLACE INTO {table} ({columns}) SELECT {columns} FROM delivery_reports_unpartitioned WHERE {prefix_sql} = ?',
+            (prefix,)
+        )
+    cursor.execute('DROP TABLE delivery_reports_unpartitioned')
+    rebuild_reports_view(cursor)
+
+
+def find_existing_reports(conn, ids, key, chunk_size=500):
+    """{id: (table, row)} for ids already stored in partition key or the PARTITION_LOOKBACK before it"""
+    tables = [table for partition, table in list_partitions(conn) if partition <= key]
+    tables = tables[-(PARTITION_LOOKBACK + 1):]
+    columns = ', '.join(REPORT_COLUMNS)
+    found = {}
+    for table in reversed(tables):
+        remaining = [report_id for report_id in ids if report_id not in found]
+        for start in range(0, len(remaining), chunk_size):
+            chunk = remaining[start:start + chunk_size]
+            rows = conn.execute(
+                f"SELECT {columns} FROM {table} WHERE id IN ({', '.join('?' for _ in chunk)})", chunk
+            ).fetchall()
+            for row in rows:
+                found[row[0]] = (table, tuple(row))
+    return found
+
+
+def partitions_in_range(conn, since=None, until=None):
+    """Live partitions that can hold received_at values in [since, until], newest first"""
+    selected = []
+    for key, table in list_partitions(conn):
+        if since and key < since[:len(key)]:
+            continue
+        if until and key > until[:len(key)]:
+            continue
+        selected.append((key, table))
+    return selected[::-1]
+
+
+def iter_report_rows(conn, conditions=(), params=(), since=None, until=None, limit=None, batch_size=500):
+    """Rows in received_at DESC, id DESC order across partitions
+
+    Partitions are read newest first and only while limit is unmet, so the
+    usual newest-first page reads the current partition alone.
+    """
+    columns = ', '.join(REPORT_COLUMNS)
+    where_clause = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+    remaining = limit
+    for _, table in partitions_in_range(conn, since, until):
+        sql = f'SELECT {columns} FROM {table} {where_clause} ORDER BY received_at DESC, id DESC'
+        args = list(params)
+        if remaining is not None:
+            sql += ' LIMIT ?'
+            args.append(remaining)
+        cursor = conn.execute(sql, args)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+            if remaining is not None:
+                remaining -= len(rows)
+        if remaining is not None and remaining <= 0:
+            return
+
+
+class RowIteratorCursor:
+    """fetchmany() over a row iterator, for code written against a DB-API cursor"""
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+
+    def fetchmany(self, size=500):
+        batch = []
+        for row in self._rows:
+            batch.append(row)
+            if len(batch) >= size:
+                break
+        return batch
+
+
+ARCHIVE_TEMP_SUFFIX = '.tmp'
+
+
+def archive_path(key, archive_dir=ARCHIVE_DIR):
+    path = os.path.join(archive_dir, f'{key}.ndjson.gz')
+    if os.path.exists(path):
+        # Rows that reached an already archived period get their own file
+        path = os.path.join(archive_dir, f'{key}.{int(time.time())}.ndjson.gz')
+    return path
+
+
+def archive_partition(conn, key, archive_dir=ARCHIVE_DIR):
+    """Compact a partition into a read-only <key>.ndjson.gz and drop its table
+
+    Returns the path, or None when the partition changed while it was being
+    compressed (it is left for the next run). The archive is written from a
+    plain read snapshot, so webhook writes carry on meanwhile; the write lock is
+    only taken to confirm the row count and highest rowid are unchanged and to
+    drop the table. The file keeps its temporary name until that has committed:
+    a rollback or crash never leaves an archive of rows that are still live (a
+    retry would archive them twice). recover_archives() finishes a crash after
+    the commit.
+    """
+    connection = getattr(conn, 'connection', conn)
+    if connection.in_transaction:
+        raise RuntimeError('archive_partition must run outside a transaction')
+    table = partition_table(key)
+    os.makedirs(archive_dir, exist_ok=True)
+    path = archive_path(key, archive_dir)
+    temp_path = path + ARCHIVE_TEMP_SUFFIX
+    try:
+        # One SELECT reads one consistent snapshot, so the count and max rowid
+        # seen while writing describe exactly the rows archived
+        cursor = conn.execute(f"SELECT rowid, {', '.join(REPORT_COLUMNS)} FROM {table} ORDER BY received_at, id")
+        count, max_rowid = 0, None
+        with gzip.open(temp_path, 'wt', encoding='utf-8', compresslevel=9) as archive:
+            while True:
+                rows = cursor.fetchmany(ARCHIVE_BATCH_SIZE)
+                if not rows:
+                    break
+                count += len(rows)
+                max_rowid = max(max_rowid or 0, max(row[0] for row in rows))
+                archive.writelines(
+                    json.dumps(dict(zip(REPORT_COLUMNS, row[1:])), separators=(',', ':')) + '\n' for row in rows
+                )
+        with ddl_transaction(conn):
+            if tuple(conn.execute(f'SELECT COUNT(*), MAX(rowid) FROM {table}').fetchone()) != (count, max_rowid):
+                print(f"⚠️ Delivery report partition {key} changed while archiving, retrying next run")
+                os.remove(temp_path)
+                return None
+            conn.execute(f'DROP TABLE {table}')
+            rebuild_reports_view(conn)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    _finish_archive(temp_path)
+    return path
+
+
+def _finish_archive(temp_path):
+    path = temp_path[:-len(ARCHIVE_TEMP_SUFFIX)]
+    os.replace(temp_path, path)
+    os.chmod(path, 0o444)
+
+
+def recover_archives(conn, archive_dir=ARCHIVE_DIR):
+    """Settle temporary archive files left by a crash; returns the keys finished
+
+    A partition table that is gone was dropped by a committed archive, so its
+    file is finished; one that still exists was rolled back and its file is
+    removed (the next run archives it again).
+    """
+    finished = []
+    live = {key for key, _ in list_partitions(conn)}
+    for temp_path in glob.glob(os.path.join(archive_dir, '*.ndjson.gz' + ARCHIVE_TEMP_SUFFIX)):
+        key = os.path.basename(temp_path).split('.', 1)[0]
+        if key in live:
+            os.remove(temp_path)
+        else:
+            _finish_archive(temp_path)
+            finished.append(key)
+    return finished
+
+
+def list_archives(archive_dir=ARCHIVE_DIR):
+    """(key, path) for every archive file, oldest first"""
+    archives = []
+    for path in glob.glob(os.path.join(archive_dir, '*.ndjson.gz')):
+        key = os.path.basename(path).split('.', 1)[0]
+        if PARTITION_KEY_RE.match(key):
+            archives.append((key, path))
+    return sorted(archives)
+
+
+def iter_archived_reports(key, archive_dir=ARCHIVE_DIR):
+    """Report dicts from every archive file for a partition key"""
+    for archive_key, path in list_archives(archive_dir):
+        if archive_key != key:
+            continue
+        with gzip.open(path, 'rt', encoding='utf-8') as archive:
+            for line in archive:
+                yield json.loads(line)
+
+
+def drop_partitions_before(conn, before, archive=False, archive_dir=ARCHIVE_DIR):
+    """Drop (or archive) every live partition whose whole period ends by `before` (a datetime)
+
+    Returns the affected partition keys. The delivery_stats_hourly rollup keeps
+    their counts. Undated reports (the UNDATED_KEY partition) have no period to
+    age out, so they are never dropped here.
+    """
+    affected = []
+    for key, _ in list_partitions(conn):
+        if key == UNDATED_KEY or partition_end(key) > before:
+            continue
+        if archive:
+            if archive_partition(conn, key, archive_dir) is None:
+                continue
+        else:
+            drop_partition(conn, key)
+        affected.append(key)
+    return affected
+
+
+def apply_retention(conn, now=None, archive_after_days=ARCHIVE_AFTER_DAYS,
+                    retention_days=RETENTION_DAYS, archive_dir=ARCHIVE_DIR):
+    """Pre-create partitions and apply the archive and retention policy once; returns what changed"""
+    now = now or datetime.now()
+    result = {'archived': [], 'dropped': [], 'archives_deleted': []}
+    precreate_partitions(conn, now)
+    if os.path.isdir(archive_dir):
+        result['archived'] = recover_archives(conn, archive_dir)
+    if retention_days:
+        cutoff = now - timedelta(days=retention_days)
+        result['dropped'] = drop_partitions_before(conn, cutoff)
+        for key, path in list_archives(archive_dir):
+            if partition_end(key) <= cutoff:
+                os.remove(path)
+                result['archives_deleted'].append(key)
+    if archive_after_days:
+        result['archived'] += drop_partitions_before(
+            conn, now - timedelta(days=archive_after_days), archive=True, archive_dir=archive_dir
+        )
+    return result
+
+
+class PartitionMaintainer(threading.Thread):
+    """Pre-creates upcoming partitions and applies the archive/retention policy
+    every MAINTENANCE_INTERVAL seconds on its own connection"""
+
+    def __init__(self, connection_factory, interval=MAINTENANCE_INTERVAL):
+        super().__init__(name='delivery-partition-maintenance', daemon=True)
+        self.connection_factory = connection_factory
+        self.interval = interval
+        self.last_run = None
+        self.last_result = None
+        self._stopping = threading.Event()
+
+    def run(self):
+        while not self._stopping.is_set():
+            conn = self.connection_factory()
+            try:
+                self.last_result = apply_retention(conn)
+                conn.commit()
+                if any(self.last_result.values()):
+                    print(f"🗄️ Delivery report partitions maintained: {self.last_result}")
+            except Exception as e:
+                conn.rollback()
+                print(f"[ERROR] Delivery report partition maintenance failed: {e}")
+            finally:
+                conn.close()
+            self.last_run = datetime.now().isoformat()
+            self._stopping.wait(self.interval)
+
+    def stop(self):
+        self._stopping.set()
+
+    def stats(self):
+        return {'last_run': self.last_run, 'last_result': self.last_result, 'interval': self.interval}
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Export contacts from contacts.db to CSV, NDJSON, or Parquet/Arrow (with pyarrow)
+Streams rows in batches, so exporting the whole table uses little memory
+"""
+
+import argparse
+import sqlite3
+import sys
+import time
+
+from api_server import DB_FILE, open_contact_export
+from contact_export import available_formats, iter_export_blocks
+from contact_update import UPDATABLE_CONTACT_FIELDS
+
+def main():
+    parser = argparse.ArgumentParser(description='Export contacts')
+    parser.add_argument('output', help="output file, or '-' for stdout")
+    parser.add_argument('--format', choices=available_formats(), help='default: from the output file extension, else csv')
+    parser.add_argument('--db', default=DB_FILE, help=f'database file (default: {DB_FILE})')
+    parser.add_argument('--search', default='', help='same search as the contacts list')
+    parser.add_argument('--user', help='only contacts visible to this user id')
+    parser.add_argument('--where', action='append', default=[], metavar='FIELD=VALUE',
+                        help='exact-match filter, may be repeated (e.g. --where status=new)')
+    args = parser.parse_args()
+    
+    export_format = args.format
+    if export_format is None:
+        extension = args.output.rsplit('.', 1)[-1].lower() if '.' in args.output else ''
+        export_format = extension if extension in available_formats() else 'csv'
+    contact_filter = {}
+    for item in args.where:
+        field, separator, value = item.partition('=')
+        if not separator:
+            parser.error(f"--where expects FIELD=VALUE, got '{item}'")
+        if field not in UPDATABLE_CONTACT_FIELDS:
+            parser.error(f"--where cannot filter on '{field}'; valid fields: {', '.join(UPDATABLE_CONTACT_FIELDS)}")
+        contact_filter[field] = value
+    
+    conn = sqlite3.connect(args.db)
+    conn.row_factory = sqlite3.Row
+    start = time.time()
+    cursor, columns = open_contact_export(conn, args.search.strip(), contact_filter, args.user)
+    
+    output = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+    written = 0
+    try:
+        for block in iter_export_blocks(cursor, columns, export_format):
+            output.write(block)
+            written += len(block)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+        conn.close()
+    
+    print(f"✅ Exported contacts as {export_format} ({written / 1e6:.1f} MB) in {time.time() - start:.2f}s", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
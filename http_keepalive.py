@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+HTTP/1.1 request handler base for the stdlib API servers
+Keeps connections open between requests, frames every response (Content-Length
+or chunked) and gzips larger responses for clients that accept it
+"""
+
+import os
+import select
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+
+# Seconds an idle keep-alive connection may wait for its next request
+KEEP_ALIVE_TIMEOUT = float(os.getenv('API_KEEP_ALIVE_TIMEOUT', 5))
+# How often an idle connection checks whether the server needs its worker back
+KEEP_ALIVE_POLL_INTERVAL = 0.05
+# Requests served on one connection before it is closed
+KEEP_ALIVE_MAX_REQUESTS = int(os.getenv('API_KEEP_ALIVE_MAX_REQUESTS', 100))
+# Responses at least this big are gzipped when the client sends Accept-Encoding: gzip
+GZIP_MIN_BYTES = int(os.getenv('API_GZIP_MIN_BYTES', 1024))
+GZIP_LEVEL = int(os.getenv('API_GZIP_LEVEL', 5))
+
+
+def accepts_encoding(accept_encoding, name):
+    """Whether an Accept-Encoding header allows the given coding (honours q=0)
+
+    An explicit entry for the coding wins over '*'.
+    """
+    wildcard = False
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if coding not in (name, '*'):
+            continue
+        quality = params.strip().lower()
+        allowed = True
+        if quality.startswith('q='):
+            try:
+                allowed = float(quality[2:]) > 0
+            except ValueError:
+                allowed = False
+        if coding == name:
+            return allowed
+        wildcard = allowed
+    return wildcard
+
+
+def gzip_blocks(blocks, level=GZIP_LEVEL):
+    """Gzip a stream of byte blocks, yielding compressed blocks as they fill"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for block in blocks:
+        compressed = compressor.compress(block)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class KeepAliveRequestHandler(BaseHTTPRequestHandler):
+    """BaseHTTPRequestHandler speaking HTTP/1.1 with persistent connections
+
+    A connection is closed after the current response when the request body was
+    not read, KEEP_ALIVE_MAX_REQUESTS is reached, or the server has requests
+    waiting for a worker (so idle connections never starve new clients).
+    """
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are separate writes; without TCP_NODELAY a reused
+    # connection stalls ~40 ms per response on Nagle + delayed ACK
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.requests_on_connection = 0
+
+    def handle_one_request(self):
+        if self.requests_on_connection and not self._wait_for_next_request():
+            self.close_connection = True
+            return
+        # Waiting for the request line is bounded; the request itself is not
+        self.connection.settimeout(KEEP_ALIVE_TIMEOUT)
+        self._waiting_for_request = True
+        self._request_body_read = False
+        super().handle_one_request()
+
+    def parse_request(self):
+        self.connection.settimeout(None)
+        self._waiting_for_request = False
+        self.requests_on_connection += 1
+        return super().parse_request()
+
+    def _wait_for_next_request(self):
+        """Wait for the next request on an idle connection
+
+        Gives up after KEEP_ALIVE_TIMEOUT, or as soon as the server has other
+        connections waiting for a worker.
+        """
+        deadline = time.monotonic() + KEEP_ALIVE_TIMEOUT
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            readable, _, _ = select.select([self.connection], [], [], min(remaining, KEEP_ALIVE_POLL_INTERVAL))
+            if readable:
+                return True
+            if not self._keep_alive_allowed():
+                return False
+
+    def _keep_alive_allowed(self):
+        keep_alive_available = getattr(self.server, 'keep_alive_available', None)
+        if keep_alive_available is not None:
+            return keep_alive_available()
+        # A single-threaded server can't hold a connection open for one client
+        return isinstance(self.server, ThreadingMixIn)
+
+    def log_error(self, format, *args):
+        # An idle keep-alive connection timing out is normal, not an error
+        if getattr(self, '_waiting_for_request', False) and format.startswith('Request timed out'):
+            return
+        super().log_error(format, *args)
+
+    def end_headers(self):
+        if not self.close_connection and self._should_close_after_response():
+            self.send_header('Connection', 'close')
+        super().end_headers()
+
+    def _should_close_after_response(self):
+        if self._has_unread_body():
+            return True
+        if self.requests_on_connection >= KEEP_ALIVE_MAX_REQUESTS:
+            return True
+        return not self._keep_alive_allowed()
+
+    def _has_unread_body(self):
+        if getattr(self, '_request_body_read', True):
+            return False
+        headers = getattr(self, 'headers', None)
+        if headers is None:
+            return False
+        if 'chunked' in (headers.get('Transfer-Encoding') or '').lower():
+            return True
+        try:
+            return int(headers.get('Content-Length') or 0) > 0
+        except ValueError:
+            return True
+
+    def _read_request_body(self):
+        """Read the whole Content-Length body so the connection can be reused"""
+        content_length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(content_length) if content_length > 0 else b''
+        self._request_body_read = True
+        return body
+
+    def _mark_request_body_read(self):
+        """For handlers that consume the body themselves (streaming uploads)"""
+        self._request_body_read = True
+
+    def _send_empty_response(self, status_code=200):
+        self.send_response(status_code)
+        self._send_cors_headers()
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _send_body_stream(self, blocks, content_type, status_code=200, headers=None, compressible=True):
+        """Send a body produced as byte blocks
+
+        A body that fits in one block gets a Content-Length. Longer bodies are sent
+        chunked to HTTP/1.1 clients, otherwise delimited by closing the connection.
+        Compressible bodies of GZIP_MIN_BYTES or more are gzipped when the client
+        accepts it. Errors before the first block propagate so the caller can still
+        send an error.
+        """
+        blocks = iter(blocks)
+        first = next(blocks, b'')
+        second = next(blocks, None)
+        gzip_ok = compressible and accepts_encoding(self.headers.get('Accept-Encoding'), 'gzip')
+        compress = gzip_ok and (second is not None or len(first) >= GZIP_MIN_BYTES)
+
+        self.send_response(status_code)
+        self.send_header('Content-Type', content_type)
+        if compressible:
+            self.send_header('Vary', 'Accept-Encoding')
+        if compress:
+            self.send_header('Content-Encoding', 'gzip')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self._send_cors_headers()
+        if second is None:
+            if compress:
+                first = b''.join(gzip_blocks([first]))
+            self.send_header('Content-Length', str(len(first)))
+            self.end_headers()
+            self.wfile.write(first)
+            return
+
+        chunked = self.request_version == 'HTTP/1.1'
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            # No Content-Length - the body ends when the connection closes
+            self.close_connection = True
+        self.end_headers()
+
+        def body():
+            yield first
+            yield second
+            yield from blocks
+
+        def write(block):
+            if not block:
+                return
+            if chunked:
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(block), block))
+            else:
+                self.wfile.write(block)
+
+        try:
+            for block in (gzip_blocks(body()) if compress else body()):
+                write(block)
+        except Exception as e:
+            # Headers are already out; drop the connection so the client sees a truncated body
+            print(f"[ERROR] Streaming response failed: {e}")
+            self.close_connection = True
+            return
+        if chunked:
+            self.wfile.write(b'0\r\n\r\n')
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Shared HTTP connection pools for the SMS/RVM provider clients
+One process-wide requests session keeps a keep-alive pool per provider host
+for the sync senders, and one aiohttp session per event loop (with a DNS
+cache) serves the async bulk sender, so batches reuse warm TLS connections
+instead of handshaking per message
+"""
+
+import asyncio
+import os
+import threading
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# aiohttp is only needed by the async bulk sender
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# Provider hosts kept in the pool manager (ClickSend, TextBelt, Slybroadcast, ...)
+HTTP_POOL_HOSTS = int(os.getenv('HTTP_POOL_HOSTS', 16))
+# Keep-alive connections kept per host; also the async per-host connection limit
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', 20))
+# Total concurrent connections of an async session across all hosts
+HTTP_ASYNC_LIMIT = int(os.getenv('HTTP_ASYNC_LIMIT', 100))
+# Seconds a resolved host stays in the async DNS cache
+HTTP_DNS_TTL = int(os.getenv('HTTP_DNS_TTL', 300))
+# Seconds an idle async connection is kept open
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv('HTTP_KEEPALIVE_TIMEOUT', 30))
+# Default request timeout for calls that do not pass one
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', 30))
+# Retries for failed connects only - a request that reached the provider is
+# never resent, as that could deliver a message twice
+HTTP_CONNECT_RETRIES = int(os.getenv('HTTP_CONNECT_RETRIES', 2))
+
+
+class PooledSession(requests.Session):
+    """requests session with a default timeout and no cookie sharing between providers"""
+
+    def __init__(self):
+        super().__init__()
+        self.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        retries = Retry(
+            total=HTTP_CONNECT_RETRIES,
+            connect=HTTP_CONNECT_RETRIES,
+            read=0,
+            status=0,
+            backoff_factor=0.2,
+        )
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_MAXSIZE,
+                              max_retries=retries)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', HTTP_TIMEOUT)
+        return super().request(method, url, **kwargs)
+
+
+_session = None
+_session_lock = threading.Lock()
+_async_sessions = {}
+
+
+def get_session():
+    """The process-wide sync session; thread-safe, created on first use"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = PooledSession()
+    return _session
+
+
+def get_async_session():
+    """Shared aiohttp session for the running event loop; call from a coroutine
+
+    aiohttp sessions are bound to the loop that created them, so each loop gets
+    its own. Sessions of loops that have since closed are dropped.
+    """
+    if aiohttp is None:
+        raise RuntimeError('aiohttp is required for async sending')
+    loop = asyncio.get_running_loop()
+    session = _async_sessions.get(loop)
+    if session is None or session.closed:
+        for stale in [other for other in _async_sessions if other.is_closed()]:
+            del _async_sessions[stale]
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_ASYNC_LIMIT,
+            limit_per_host=HTTP_POOL_MAXSIZE,
+            ttl_dns_cache=HTTP_DNS_TTL,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        )
+        session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT),
+        )
+        _async_sessions[loop] = session
+    return session
+
+
+async def close_async_session():
+    """Close the running loop's shared session; call before the loop shuts down"""
+    session = _async_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+def close_session():
+    """Close the sync session's pooled connections (a new one is created on next use)"""
+    global _session
+    with _session_lock:
+        session, _session = _session, None
+    if session is not None:
+        session.close()
+
+
+def pool_stats():
+    """Per-host connection counts of the sync pool and limits of the async sessions"""
+    hosts = {}
+    session = _session
+    if session is not None:
+        pools = session.get_adapter('https://').poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            idle = sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0
+            hosts[f'{pool.scheme}://{pool.host}:{pool.port}'] = {
+                'connections_opened': pool.num_connections,
+                'requests': pool.num_requests,
+                'idle': idle,
+                'maxsize': HTTP_POOL_MAXSIZE,
+            }
+    return {
+        'hosts': hosts,
+        'async_sessions': sum(1 for s in _async_sessions.values() if not s.closed),
+        'limits': {
+            'pool_hosts': HTTP_POOL_HOSTS,
+            'pool_maxsize': HTTP_POOL_MAXSIZE,
+            'async_limit': HTTP_ASYNC_LIMIT,
+            'dns_ttl': HTTP_DNS_TTL,
+            'timeout': HTTP_TIMEOUT,
+        },
+    }
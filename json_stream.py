@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+JSON response encoding for the API servers
+Compact by default; large arrays/objects can be streamed from a cursor piece by
+piece instead of being built as one big list and one big string
+"""
+
+import json
+
+# Encoder settings: compact separators drop the whitespace indent=2 adds
+COMPACT_SEPARATORS = (',', ':')
+PRETTY_INDENT = 2
+
+# Streamed bodies are written in blocks of about this many bytes
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+class JSONArrayStream:
+    """Value that is written as a JSON array, one item at a time, from any iterable"""
+
+    def __init__(self, items):
+        self.items = items
+
+
+class JSONObjectStream:
+    """Value that is written as a JSON object from an iterable of (key, value) pairs"""
+
+    def __init__(self, pairs):
+        self.pairs = pairs
+
+
+def wants_pretty(query_params):
+    """True when ?pretty=1/true/yes was requested"""
+    value = query_params.get('pretty', [''])[0].lower()
+    return value in ('1', 'true', 'yes')
+
+
+def encode_json(data, pretty=False):
+    """Encode a plain (non-streamed) value to UTF-8 JSON bytes"""
+    if pretty:
+        text = json.dumps(data, indent=PRETTY_INDENT, default=str)
+    else:
+        text = json.dumps(data, separators=COMPACT_SEPARATORS, default=str)
+    return text.encode('utf-8')
+
+
+def iter_json(data, pretty=False, level=0):
+    """Yield the JSON text for data in pieces
+
+    JSONArrayStream/JSONObjectStream values are expanded lazily. Any callable
+    value is called when its key is reached, so a summary field placed after a
+    stream (a count, a next cursor) can use what the stream saw.
+    """
+    if callable(data):
+        data = data()
+    if isinstance(data, JSONArrayStream):
+        yield from _iter_container('[', ']', ((None, item) for item in data.items), pretty, level)
+    elif isinstance(data, JSONObjectStream):
+        yield from _iter_container('{', '}', data.pairs, pretty, level)
+    elif isinstance(data, dict) and any(_is_lazy(value) for value in data.values()):
+        yield from _iter_container('{', '}', data.items(), pretty, level)
+    else:
+        text = encode_json(data, pretty).decode('utf-8')
+        if pretty and level:
+            text = text.replace('\n', '\n' + ' ' * (PRETTY_INDENT * level))
+        yield text
+
+
+def _is_lazy(value):
+    return callable(value) or isinstance(value, (JSONArrayStream, JSONObjectStream))
+
+
+def _iter_container(open_char, close_char, pairs, pretty, level):
+    """Write an array (keys are None) or object from (key, value) pairs, matching json.dumps layout"""
+    if pretty:
+        inner = '\n' + ' ' * (PRETTY_INDENT * (level + 1))
+        separator, colon = ',' + inner, ': '
+    else:
+        inner = ''
+        separator, colon = ',', ':'
+    yield open_char
+    first = True
+    for key, value in pairs:
+        yield inner if first else separator
+        first = False
+        if key is not None:
+            yield json.dumps(str(key)) + colon
+        yield from iter_json(value, pretty, level + 1)
+    if pretty and not first:
+        yield '\n' + ' ' * (PRETTY_INDENT * level)
+    yield close_char
+
+
+def iter_json_blocks(data, pretty=False, block_size=STREAM_BLOCK_SIZE):
+    """Encode data to UTF-8 and group the pieces into blocks of about block_size bytes"""
+    buffer = []
+    size = 0
+    for piece in iter_json(data, pretty):
+        chunk = piece.encode('utf-8')
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= block_size:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Precompiled message templates
+A template is parsed once into literal and {field} segments; rendering a
+contact is then a single join, and render_frame renders a whole pandas
+contact frame column by column. Placeholders the sender does not know are
+reported when the template is compiled instead of silently going out as-is.
+"""
+
+import logging
+import re
+from functools import lru_cache
+from itertools import repeat
+
+PLACEHOLDER_RE = re.compile(r'\{(\w+)\}')
+
+# Placeholders of bulk SMS campaigns: field -> (contact key, default when the key is missing)
+CONTACT_FIELDS = {
+    'name': ('name', 'Friend'),
+    'first_name': ('first_name', ''),
+    'lastName': ('last_name', ''),
+    'email': ('email', ''),
+    'phone': ('phone_number', ''),
+    'company': ('company', ''),
+}
+
+# Placeholders of the simple senders that only personalise the greeting
+NAME_FIELDS = {
+    'name': ('name', 'Friend'),
+}
+
+# Placeholders of the simple SMS API, which also fills in the recipient's number
+NAME_PHONE_FIELDS = {
+    **NAME_FIELDS,
+    'phone': ('phone', ''),
+}
+
+
+class MessageTemplate:
+    """A message parsed into segments against a field map
+
+    Unknown placeholders stay in the text unchanged (as with str.replace) and
+    are listed in unknown_fields.
+    """
+
+    def __init__(self, text, fields=CONTACT_FIELDS):
+        self.text = text
+        self.segments = []          # (literal, None, None) or (None, key, default)
+        self.fields = []
+        self.unknown_fields = []
+        position = 0
+        for match in PLACEHOLDER_RE.finditer(text):
+            field = match.group(1)
+            if field not in fields:
+                if field not in self.unknown_fields:
+                    self.unknown_fields.append(field)
+                continue
+            if match.start() > position:
+                self.segments.append((text[position:match.start()], None, None))
+            key, default = fields[field]
+            self.segments.append((None, key, default))
+            if field not in self.fields:
+                self.fields.append(field)
+            position = match.end()
+        if position < len(text):
+            self.segments.append((text[position:], None, None))
+
+    def render(self, record):
+        """Message for one contact dict"""
+        get = record.get
+        return ''.join([literal if key is None else str(get(key, default))
+                        for literal, key, default in self.segments])
+
+    def render_frame(self, frame):
+        """Messages for every row of a pandas DataFrame, in row order
+
+        Each field column is converted to str once and rows are joined in one
+        C-level pass; missing columns use the field default, matching render()
+        on the frame's records.
+        """
+        columns = []
+        for literal, key, default in self.segments:
+            if key is None:
+                columns.append(repeat(literal))
+            elif key in frame.columns:
+                columns.append(frame[key].astype(str).tolist())
+            else:
+                columns.append(repeat(str(default)))
+        if not any(isinstance(column, list) for column in columns):
+            return [self.render({})] * len(frame)
+        return list(map(''.join, zip(*columns)))
+
+
+@lru_cache(maxsize=1024)
+def _compile(text, field_items):
+    template = MessageTemplate(text, dict(field_items))
+    if template.unknown_fields:
+        logging.warning(f"Unknown placeholder(s) in message template: "
+                        f"{', '.join('{' + field + '}' for field in template.unknown_fields)}")
+    return template
+
+
+def compile_template(text, fields=CONTACT_FIELDS):
+    """MessageTemplate for text, compiled once per distinct text and field map
+
+    Unknown placeholders are logged as a warning on first compile.
+    """
+    return _compile(text, tuple(fields.items()))
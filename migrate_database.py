@@ -1,85 +1,41 @@
 #!/usr/bin/env python3
 """
-Database migration script to add role-based assignment features
+Database migration script
+Applies the pending steps from api_server.SCHEMA_MIGRATIONS - the same versioned
+steps the API server checks at startup - building every index inline
 """
 
-import sqlite3
-import uuid
+import argparse
+import sys
 
-DB_FILE = 'contacts.db'
+from api_server import DB_FILE, SCHEMA_MIGRATIONS
+from schema_migrations import run_migrations, schema_status
 
-def migrate_database():
-    """Add new tables and columns for role-based assignments"""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    
+def migrate_database(db_file=DB_FILE):
+    """Bring db_file up to the latest schema version"""
+    print("🔄 Starting database migration...")
     try:
-        print("🔄 Starting database migration...")
-        
-        # Check if users table exists
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='users'")
-        if not cursor.fetchone():
-            print("📋 Creating users table...")
-            cursor.execute('''
-                CREATE TABLE users (
-                    id TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(16)))),
-                    email TEXT UNIQUE NOT NULL,
-                    first_name TEXT,
-                    last_name TEXT,
-                    role TEXT CHECK(role IN ('user', 'manager', 'supervisor', 'admin')) DEFAULT 'user',
-                    manager_id TEXT,
-                    is_active INTEGER DEFAULT 1,
-                    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (manager_id) REFERENCES users (id)
-                )
-            ''')
-            
-            # Create indexes for users table
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_role ON users(role)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_manager ON users(manager_id)')
-            
-            print("✅ Users table created")
-        else:
-            print("✅ Users table already exists")
-        
-        # Check if assigned_to column exists in contacts table
-        cursor.execute("PRAGMA table_info(contacts)")
-        columns = [row[1] for row in cursor.fetchall()]
-        
-        if 'assigned_to' not in columns:
-            print("📋 Adding assigned_to column to contacts table...")
-            cursor.execute('ALTER TABLE contacts ADD COLUMN assigned_to TEXT')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_contacts_assigned_to ON contacts(assigned_to)')
-            print("✅ Added assigned_to column")
-        else:
-            print("✅ assigned_to column already exists")
-        
-        # Create default admin user if none exists
-        cursor.execute('SELECT COUNT(*) FROM users WHERE role = "admin"')
-        admin_count = cursor.fetchone()[0]
-        
-        if admin_count == 0:
-            print("📋 Creating default admin user...")
-            admin_id = str(uuid.uuid4())
-            cursor.execute('''
-                INSERT INTO users (id, email, first_name, last_name, role, is_active)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (admin_id, 'admin@sparky.com', 'Admin', 'User', 'admin', 1))
-            print("✅ Created default admin user: admin@sparky.com")
-        else:
-            print("✅ Admin user already exists")
-        
-        conn.commit()
-        print("🎉 Database migration completed successfully!")
-        
+        run_migrations(db_file, SCHEMA_MIGRATIONS)
     except Exception as e:
         print(f"❌ Migration failed: {e}")
-        conn.rollback()
         raise
-    finally:
-        conn.close()
+    print(f"🎉 Database migration completed successfully! (schema version {SCHEMA_MIGRATIONS[-1].version})")
+
+def main():
+    parser = argparse.ArgumentParser(description='Migrate contacts.db to the current schema')
+    parser.add_argument('--db', default=DB_FILE, help=f'database file (default {DB_FILE})')
+    parser.add_argument('--status', action='store_true', help='list applied and pending migrations without changing anything')
+    args = parser.parse_args()
+    
+    if args.status:
+        status = schema_status(args.db, SCHEMA_MIGRATIONS)
+        print(f"📋 Schema version {status['version']} of {status['latest']}")
+        for step in status['pending']:
+            print(f"  pending {step['version']}: {step['name']}")
+        return 0 if not status['pending'] else 1
+    
+    migrate_database(args.db)
+    return 0
 
 if __name__ == "__main__":
-    migrate_database()
+    sys.exit(main())
@@ -9,6 +9,7 @@ import json
 from datetime import datetime
 from dotenv import load_dotenv
 from multi_provider_sms import MultiProviderSMSManager
+from message_template import NAME_FIELDS, compile_template
 import logging
 
 load_dotenv()
@@ -124,14 +125,16 @@ class MultiChannelCommunicationManager:
         """
         
         results = []
+        sms_template = compile_template(sms_message, NAME_FIELDS)
+        rvm_template = compile_template(rvm_message, NAME_FIELDS)
         
         for contact in contacts:
             phone = contact.get('phone')
             name = contact.get('name', 'Friend')
             
             # Personalize messages
-            personalized_sms = sms_message.replace('{name}', name)
-            personalized_rvm = rvm_message.replace('{name}', name)
+            personalized_sms = sms_template.render({'name': name})
+            personalized_rvm = rvm_template.render({'name': name})
             
             contact_result = {
                 'phone': phone,
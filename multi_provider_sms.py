@@ -8,7 +8,8 @@ import json
 from datetime import datetime, date
 from dotenv import load_dotenv
 from twilio.rest import Client
-import requests
+from http_pool import get_session
+from rate_limit import get_limiter
 import time
 from dataclasses import dataclass
 from typing import List, Optional
@@ -156,7 +157,8 @@ class MultiProviderSMSManager:
         }
         
         try:
-            response = requests.post(url, data=data)
+            with get_limiter('textbelt'):
+                response = get_session().post(url, data=data)
             result = response.json()
             
             if result.get('success'):
@@ -187,12 +189,13 @@ class MultiProviderSMSManager:
         }
         
         try:
-            response = requests.post(
-                url,
-                json=payload,
-                auth=(username, api_key),
-                headers={'Content-Type': 'application/json'}
-            )
+            with get_limiter('clicksend'):
+                response = get_session().post(
+                    url,
+                    json=payload,
+                    auth=(username, api_key),
+                    headers={'Content-Type': 'application/json'}
+                )
             
             if response.status_code == 200:
                 return True, "ClickSend: Message sent successfully"
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Per-provider send rate limiting
+Each provider gets one process-wide limiter: a token bucket for messages per
+second (with a burst allowance) plus a cap on requests in flight. The sync and
+async send paths both go through it, so campaigns run at the rate the provider
+allows rather than a fixed delay between messages.
+"""
+
+import asyncio
+import collections
+import os
+import threading
+import time
+
+# (messages per second, burst, max in flight) - conservative defaults; set
+# <PROVIDER>_RATE_PER_SEC, <PROVIDER>_BURST and <PROVIDER>_MAX_IN_FLIGHT to the
+# limits of your account (e.g. CLICKSEND_RATE_PER_SEC=20)
+PROVIDER_RATE_LIMITS = {
+    'clicksend': (5.0, 5, 5),
+    'twilio': (10.0, 10, 20),
+    'plivo': (5.0, 5, 10),
+    'textmagic': (5.0, 5, 5),
+    'bulksms': (5.0, 5, 5),
+    'messagebird': (10.0, 10, 10),
+    'textbelt': (1.0, 1, 1),
+}
+DEFAULT_RATE_LIMIT = (1.0, 1, 1)
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, holding up to `burst`
+
+    reserve() always takes its tokens (one per message) and returns how long the
+    caller must wait before using them, so concurrent callers queue in order
+    instead of polling.
+    """
+
+    def __init__(self, rate, burst=1):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class ProviderLimiter:
+    """Rate and in-flight limit for one provider
+
+    Use `with limiter:` around a blocking send or `async with limiter:` around
+    an awaited one; both take an in-flight slot, then wait for a token. A
+    batched request calls acquire(len(batch)) / release() itself so the bucket
+    is charged per message, not per request.
+    """
+
+    def __init__(self, name, rate, burst, max_in_flight):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.in_flight = 0
+        self.sent = 0
+        self.throttled_seconds = 0.0
+        self._cond = threading.Condition()
+        self._async_waiters = collections.deque()
+
+    def _take_token(self, tokens=1):
+        wait = self.bucket.reserve(tokens)
+        with self._cond:
+            self.sent += tokens
+            self.throttled_seconds += wait
+        return wait
+
+    def acquire(self, tokens=1):
+        with self._cond:
+            while self.in_flight >= self.max_in_flight:
+                self._cond.wait()
+            self.in_flight += 1
+        wait = self._take_token(tokens)
+        if wait:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens=1):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                if self.in_flight < self.max_in_flight:
+                    self.in_flight += 1
+                    break
+                waiter = (loop, loop.create_future())
+                self._async_waiters.append(waiter)
+            try:
+                await waiter[1]
+            except asyncio.CancelledError:
+                with self._cond:
+                    try:
+                        self._async_waiters.remove(waiter)
+                    except ValueError:
+                        # Already woken for a free slot - hand it to the next waiter
+                        self._wake_async_waiter()
+                raise
+        wait = self._take_token(tokens)
+        if wait:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                self.release()
+                raise
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+            self._wake_async_waiter()
+
+    def _wake_async_waiter(self):
+        # Called with _cond held; waiters may belong to other threads' loops
+        while self._async_waiters:
+            loop, future = self._async_waiters.popleft()
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(_resolve, future)
+                return
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    async def __aenter__(self):
+        await self.acquire_async()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'rate_per_sec': self.bucket.rate,
+                'burst': self.bucket.burst,
+                'max_in_flight': self.max_in_flight,
+                'in_flight': self.in_flight,
+                'sent': self.sent,
+                'throttled_seconds': round(self.throttled_seconds, 3),
+            }
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def provider_rate_limit(name):
+    """(rate, burst, max in flight) for a provider, with environment overrides"""
+    rate, burst, in_flight = PROVIDER_RATE_LIMITS.get(name, DEFAULT_RATE_LIMIT)
+    prefix = name.upper()
+    return (
+        float(os.getenv(f'{prefix}_RATE_PER_SEC', rate)),
+        int(os.getenv(f'{prefix}_BURST', burst)),
+        int(os.getenv(f'{prefix}_MAX_IN_FLIGHT', in_flight)),
+    )
+
+
+def get_limiter(name):
+    """The process-wide limiter for a provider name such as 'clicksend'"""
+    name = name.lower()
+    limiter = _limiters.get(name)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(name)
+            if limiter is None:
+                limiter = ProviderLimiter(name, *provider_rate_limit(name))
+                _limiters[name] = limiter
+    return limiter
+
+
+def limiter_stats():
+    return {name: limiter.stats() for name, limiter in list(_limiters.items())}
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Rebuild the contacts full-text search index (contacts_fts)
+Run after upgrading an existing contacts.db or if search results look stale
+"""
+
+import sqlite3
+import sys
+import time
+
+from api_server import DB_FILE, rebuild_contacts_search_index
+
+def main():
+    db_file = sys.argv[1] if len(sys.argv) > 1 else DB_FILE
+    print(f"🔄 Rebuilding contact search index in {db_file}...")
+    
+    start = time.time()
+    if not rebuild_contacts_search_index(db_file):
+        print("❌ FTS5 is not available in this SQLite build - search will keep using LIKE")
+        return 1
+    
+    conn = sqlite3.connect(db_file)
+    contact_count = conn.execute('SELECT COUNT(*) FROM contacts').fetchone()[0]
+    conn.close()
+    
+    print(f"✅ Indexed {contact_count} contacts in {time.time() - start:.2f}s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
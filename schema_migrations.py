@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations for contacts.db
+Each step runs once, in order, in its own transaction and is recorded in
+schema_version, so a server starting against a current database only runs a
+single version query. Plain index builds on large tables can be handed to a
+background thread instead of holding up startup.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+SCHEMA_VERSION_DDL = '''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TEXT NOT NULL
+    )
+'''
+
+# Index steps on tables with at least this many rows are built after startup
+ONLINE_INDEX_MIN_ROWS = int(os.getenv('SCHEMA_ONLINE_INDEX_MIN_ROWS', 50000))
+# Seconds the background builder waits between indexes so queued writes get the lock
+ONLINE_INDEX_PAUSE = 0.5
+# ms a migration waits on another writer (a request, another process migrating)
+MIGRATION_BUSY_TIMEOUT = 30000
+
+
+class Migration:
+    """One schema step; apply(cursor) must also be safe on a database that already has it
+
+    Databases from before schema_version existed run every step once, so steps
+    use IF NOT EXISTS / column checks rather than assuming an empty schema.
+    """
+
+    def __init__(self, version, name, apply):
+        self.version = version
+        self.name = name
+        self.apply = apply
+
+    def deferrable(self, conn):
+        """Whether this step may run in the background instead of at startup"""
+        return False
+
+
+class IndexMigration(Migration):
+    """A plain CREATE INDEX, built in the background when its table is large
+
+    Only query plans depend on it, so later steps and requests work before it
+    exists. Unique indexes enforce data rules and belong in a regular Migration.
+    """
+
+    def __init__(self, version, index_name, table, columns):
+        self.table = table
+        self.sql = f'CREATE INDEX IF NOT EXISTS {index_name} ON {table}({columns})'
+        super().__init__(version, f'index {index_name}', self._create_index)
+
+    def _create_index(self, cursor):
+        # A later step may have replaced the table (by a view, say); then there is nothing to index
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (self.table,))
+        if cursor.fetchone():
+            cursor.execute(self.sql)
+
+    def deferrable(self, conn):
+        try:
+            # MAX(rowid) is a single b-tree seek; COUNT(*) would scan the table
+            row = conn.execute(f'SELECT MAX(rowid) FROM {self.table}').fetchone()
+        except sqlite3.OperationalError:
+            return False
+        return (row[0] or 0) >= ONLINE_INDEX_MIN_ROWS
+
+
+def check_migration_order(migrations):
+    """Versions must be unique and listed in increasing order"""
+    versions = [migration.version for migration in migrations]
+    if versions != sorted(set(versions)):
+        raise ValueError('Schema migrations must have unique, increasing versions')
+
+
+def connect_for_migrations(db_file):
+    """Autocommit connection; each step manages its own transaction"""
+    conn = sqlite3.connect(db_file, isolation_level=None, check_same_thread=False)
+    conn.execute(f'PRAGMA busy_timeout = {MIGRATION_BUSY_TIMEOUT}')
+    return conn
+
+
+def applied_versions(conn):
+    """Versions recorded in schema_version - the one query a current database needs"""
+    try:
+        return {row[0] for row in conn.execute('SELECT version FROM schema_version')}
+    except sqlite3.OperationalError:
+        conn.execute(SCHEMA_VERSION_DDL)
+        return set()
+
+
+def apply_migration(conn, migration):
+    """Run one step and record it in a single transaction
+
+    Returns False when another process applied it first (the version is
+    re-checked after taking the write lock).
+    """
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if conn.execute('SELECT 1 FROM schema_version WHERE version = ?', (migration.version,)).fetchone():
+            conn.execute('ROLLBACK')
+            return False
+        migration.apply(conn.cursor())
+        conn.execute(
+            'INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)',
+            (migration.version, migration.name, datetime.now().isoformat())
+        )
+        conn.execute('COMMIT')
+        return True
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        raise
+
+
+def _apply_and_report(conn, migration):
+    started = time.perf_counter()
+    if apply_migration(conn, migration):
+        print(f"✅ Schema migration {migration.version}: {migration.name} ({time.perf_counter() - started:.2f}s)")
+
+
+class BackgroundIndexBuilder(threading.Thread):
+    """Builds deferred IndexMigrations one per transaction after the server has started
+
+    SQLite builds an index in a single statement, so the batch is one index:
+    other writers wait at most one build, and the builder pauses in between. A
+    build interrupted by shutdown rolls back and is retried on the next start.
+    """
+
+    def __init__(self, db_file, migrations, pause=ONLINE_INDEX_PAUSE):
+        super().__init__(name='schema-index-builder', daemon=True)
+        self.db_file = db_file
+        self.remaining = list(migrations)
+        self.pause = pause
+        self.errors = []
+
+    def run(self):
+        conn = connect_for_migrations(self.db_file)
+        try:
+            while self.remaining:
+                migration = self.remaining[0]
+                try:
+                    _apply_and_report(conn, migration)
+                except sqlite3.Error as e:
+                    print(f"[ERROR] Background index build failed for {migration.name}: {e}")
+                    self.errors.append(f'{migration.name}: {e}')
+                self.remaining.pop(0)
+                if self.remaining:
+                    time.sleep(self.pause)
+        finally:
+            conn.close()
+
+    def stats(self):
+        return {
+            'pending': [migration.name for migration in self.remaining],
+            'errors': list(self.errors),
+        }
+
+
+def run_migrations(db_file, migrations, background_indexes=False):
+    """Apply every pending migration to db_file, in version order
+
+    With background_indexes, IndexMigrations on large tables are skipped here and
+    built by a BackgroundIndexBuilder, which is started and returned; otherwise
+    returns None once everything is applied.
+    """
+    check_migration_order(migrations)
+    conn = connect_for_migrations(db_file)
+    deferred = []
+    try:
+        done = applied_versions(conn)
+        for migration in migrations:
+            if migration.version in done:
+                continue
+            if background_indexes and migration.deferrable(conn):
+                deferred.append(migration)
+                continue
+            _apply_and_report(conn, migration)
+    finally:
+        conn.close()
+    if not deferred:
+        return None
+    print(f"🔨 Building {len(deferred)} index(es) in the background")
+    builder = BackgroundIndexBuilder(db_file, deferred)
+    builder.start()
+    return builder
+
+
+def schema_status(db_file, migrations):
+    """Applied and pending migrations, without changing anything"""
+    conn = sqlite3.connect(db_file)
+    try:
+        try:
+            rows = conn.execute('SELECT version, name, applied_at FROM schema_version ORDER BY version').fetchall()
+        except sqlite3.OperationalError:
+            rows = []
+    finally:
+        conn.close()
+    done = {row[0] for row in rows}
+    return {
+        'version': max(done) if done else 0,
+        'latest': migrations[-1].version if migrations else 0,
+        'applied': [{'version': v, 'name': name, 'applied_at': at} for v, name, at in rows],
+        'pending': [{'version': m.version, 'name': m.name} for m in migrations if m.version not in done],
+    }
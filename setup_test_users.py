@@ -14,11 +14,17 @@ def setup_test_users_and_assignments():
     # Enable foreign keys
     cursor.execute('PRAGMA foreign_keys = ON')
     
+    # Users are upserted, not INSERT OR REPLACEd: a replace deletes the old row
+    # without firing the user_hierarchy delete trigger, leaving stale ancestors
+    
     # Create a test user (mapped from Supabase user with role 'user')
     test_user_id = 'user-john-example-com'  # This matches the mapping pattern
     cursor.execute('''
-        INSERT OR REPLACE INTO users (id, email, first_name, last_name, role, created_at, updated_at)
+        INSERT INTO users (id, email, first_name, last_name, role, created_at, updated_at)
         VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(id) DO UPDATE SET
+            email = excluded.email, first_name = excluded.first_name, last_name = excluded.last_name,
+            role = excluded.role, updated_at = excluded.updated_at
     ''', (
         test_user_id,
         'john@example.com',
@@ -32,8 +38,11 @@ def setup_test_users_and_assignments():
     # Create a manager user
     manager_user_id = 'user-manager-example-com'
     cursor.execute('''
-        INSERT OR REPLACE INTO users (id, email, first_name, last_name, role, created_at, updated_at)
+        INSERT INTO users (id, email, first_name, last_name, role, created_at, updated_at)
         VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(id) DO UPDATE SET
+            email = excluded.email, first_name = excluded.first_name, last_name = excluded.last_name,
+            role = excluded.role, updated_at = excluded.updated_at
     ''', (
         manager_user_id,
         'manager@example.com',
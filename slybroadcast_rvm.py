@@ -4,6 +4,8 @@ Handles Ringless Voicemail sending via Slybroadcast API
 """
 
 import requests
+from http_pool import get_session
+from message_template import NAME_FIELDS, compile_template
 import os
 import json
 import time
@@ -96,7 +98,7 @@ class SlybroadcastRVM:
         try:
             logger.info(f"Sending RVM to {phone_number} via Slybroadcast")
             
-            response = requests.post(url, data=data, timeout=30)
+            response = get_session().post(url, data=data, timeout=30)
             
             if response.status_code == 200:
                 result_text = response.text.strip()
@@ -154,6 +156,7 @@ class SlybroadcastRVM:
             delay (int): Delay between sends in seconds
         """
         results = []
+        template = compile_template(message_text_or_audio_url, NAME_FIELDS) if use_tts else None
         
         for contact in contacts:
             phone = contact.get('phone', contact.get('phone_number', ''))
@@ -161,7 +164,7 @@ class SlybroadcastRVM:
             
             # Personalize message if using TTS
             if use_tts:
-                personalized_message = message_text_or_audio_url.replace('{name}', name)
+                personalized_message = template.render({'name': name})
                 success, result = self.send_text_to_speech_rvm(
                     phone, 
                     personalized_message,
@@ -205,7 +208,7 @@ class SlybroadcastRVM:
         }
         
         try:
-            response = requests.post(url, data=data, timeout=10)
+            response = get_session().post(url, data=data, timeout=10)
             
             if response.status_code == 200:
                 return True, response.text
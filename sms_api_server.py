@@ -3,12 +3,14 @@ Flask API Server for SMS Integration with GoHighLevel
 Provides webhook endpoints that GHL workflows can call to send SMS messages
 """
 
+import time
+# Cold start is measured from here (module import) to app.run()
+_import_started = time.perf_counter()
+
 from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
-import pandas as pd
 import os
 from dotenv import load_dotenv
-from twilio.rest import Client
 import re
 import json
 from datetime import datetime
@@ -17,11 +19,10 @@ from werkzeug.utils import secure_filename
 import tempfile
 import hashlib
 import secrets
+import threading
 from functools import wraps
-from multi_provider_sms import MultiProviderSMSManager
-from slybroadcast_rvm import SlybroadcastRVM
-from simpletalk_ai import SimpleTalkAI
-from multi_provider_email import MultiProviderEmailManager
+from delivery_ingest import DeliveryStatsRollup
+from message_template import NAME_PHONE_FIELDS, compile_template
 
 # Load environment variables
 load_dotenv()
@@ -41,32 +42,85 @@ ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'svg', 'ico'}
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize Multi-Provider SMS Manager
-sms_manager = MultiProviderSMSManager()
+# API_STARTUP_MODE=production runs without the debugger/reloader (which starts the
+# app twice) and skips startup provider checks; STARTUP_BUDGET_MS is the cold-start
+# time the server warns above
+PRODUCTION_STARTUP = os.getenv('API_STARTUP_MODE', 'development').lower() == 'production'
+STARTUP_BUDGET_MS = int(os.getenv('API_STARTUP_BUDGET_MS', 1000))
+
+twilio_phone = os.getenv('TWILIO_PHONE_NUMBER')
+
+# Provider clients are created (and their modules imported) on first use rather
+# than at import, so the server can bind its port before any of them is needed
+_providers = {}
+_providers_lock = threading.Lock()
+
+def _get_provider(name, create):
+    if name not in _providers:
+        with _providers_lock:
+            if name not in _providers:
+                _providers[name] = create()
+    return _providers[name]
+
+def _create_twilio_client():
+    """Twilio client (backup), or None when it can't be configured"""
+    try:
+        from twilio.rest import Client
+        client = Client(
+            os.getenv('TWILIO_ACCOUNT_SID'),
+            os.getenv('TWILIO_AUTH_TOKEN')
+        )
+        logger.info("Twilio client initialized successfully")
+        return client
+    except Exception as e:
+        logger.error(f"Failed to initialize Twilio client: {e}")
+        return None
+
+def _create_sms_manager():
+    from multi_provider_sms import MultiProviderSMSManager
+    return MultiProviderSMSManager()
+
+def _create_rvm_manager():
+    from slybroadcast_rvm import SlybroadcastRVM
+    return SlybroadcastRVM()
+
+def _create_ai_manager():
+    from simpletalk_ai import SimpleTalkAI
+    return SimpleTalkAI()
+
+def _create_email_manager():
+    from multi_provider_email import MultiProviderEmailManager
+    return MultiProviderEmailManager()
+
+def get_twilio_client():
+    return _get_provider('twilio', _create_twilio_client)
+
+def get_sms_manager():
+    """Multi-Provider SMS Manager"""
+    return _get_provider('sms', _create_sms_manager)
 
-# Initialize RVM Manager
-rvm_manager = SlybroadcastRVM()
+def get_rvm_manager():
+    """Slybroadcast RVM Manager"""
+    return _get_provider('rvm', _create_rvm_manager)
 
-# Initialize Twilio client (backup)
-try:
-    twilio_client = Client(
-        os.getenv('TWILIO_ACCOUNT_SID'),
-        os.getenv('TWILIO_AUTH_TOKEN')
-    )
-    twilio_phone = os.getenv('TWILIO_PHONE_NUMBER')
-    logger.info("Twilio client initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize Twilio client: {e}")
-    twilio_client = None
+def get_ai_manager():
+    """SimpleTalk.ai"""
+    return _get_provider('ai', _create_ai_manager)
 
-# Initialize SimpleTalk.ai
-ai_manager = SimpleTalkAI()
+def get_email_manager():
+    """Multi-Provider Email Manager"""
+    return _get_provider('email', _create_email_manager)
 
-# Initialize Multi-Provider Email Manager
-email_manager = MultiProviderEmailManager()
+def twilio_configured():
+    """Whether Twilio is usable, without creating the client just to find out"""
+    if 'twilio' in _providers:
+        return _providers['twilio'] is not None
+    return bool(os.getenv('TWILIO_ACCOUNT_SID') and os.getenv('TWILIO_AUTH_TOKEN'))
 
 # Store for SMS delivery reports (in production, use a database)
 delivery_reports = {}
+# Hourly counts behind /api/delivery-stats, kept in step with delivery_reports
+delivery_stats = DeliveryStatsRollup()
 
 class SMSHandler:
     @staticmethod
@@ -84,7 +138,7 @@ class SMSHandler:
         
         try:
             # Use multi-provider system
-            success, result = sms_manager.send_sms(phone, message)
+            success, result = get_sms_manager().send_sms(phone, message)
             return success, result
         except Exception as e:
             logger.error(f"Failed to send SMS to {phone}: {e}")
@@ -94,18 +148,18 @@ class SMSHandler:
     def send_bulk_sms(contacts, default_message, delay=2):
         """Send bulk SMS messages"""
         results = []
+        default_template = compile_template(default_message, NAME_PHONE_FIELDS)
         
         for contact in contacts:
             phone = contact.get('phone_number') or contact.get('phone')
             name = contact.get('name', 'Friend')
             custom_message = contact.get('message', '')
             
-            # Use custom message if provided, otherwise use default
-            message = custom_message if custom_message else default_message
+            # Use custom message if provided, otherwise use default (each compiled once)
+            template = compile_template(custom_message, NAME_PHONE_FIELDS) if custom_message else default_template
             
             # Replace placeholders
-            message = message.replace('{name}', name)
-            message = message.replace('{phone}', phone)
+            message = template.render({'name': name, 'phone': phone})
             
             # Send SMS
             success, result = SMSHandler.send_single_sms(phone, message)
@@ -215,8 +269,8 @@ def home():
             'GET /api/admin': 'Admin dashboard (protected)'
         },
         'status': 'active',
-        'providers_configured': len([p for p in sms_manager.providers if p.enabled]),
-        'rvm_configured': rvm_manager.is_configured()
+        'providers_configured': len([p for p in get_sms_manager().providers if p.enabled]),
+        'rvm_configured': get_rvm_manager().is_configured()
     })
 
 # Routes for serving editor pages
@@ -310,7 +364,7 @@ def serve_assets():
 def get_usage_stats():
     """Get SMS usage statistics"""
     try:
-        report = sms_manager.get_usage_report()
+        report = get_sms_manager().get_usage_report()
         return jsonify(report), 200
     except Exception as e:
         logger.error(f"Error getting usage stats: {e}")
@@ -320,7 +374,7 @@ def get_usage_stats():
 def get_capacity():
     """Get remaining daily capacity"""
     try:
-        total_capacity, available_providers = sms_manager.get_available_capacity()
+        total_capacity, available_providers = get_sms_manager().get_available_capacity()
         
         response = {
             'total_remaining_capacity': total_capacity,
@@ -336,10 +390,15 @@ def get_capacity():
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
+    # Imported here so startup does not load requests before a provider needs it
+    from http_pool import pool_stats
+    from rate_limit import limiter_stats
     return jsonify({
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
-        'twilio_configured': twilio_client is not None
+        'twilio_configured': twilio_configured(),
+        'http_pool': pool_stats(),
+        'rate_limits': limiter_stats()
     })
 
 @app.route('/static/<path:filename>')
@@ -424,7 +483,7 @@ def clicksend_webhook():
         
         # Store the delivery report
         if message_id:
-            delivery_reports[message_id] = {
+            report = {
                 'message_id': message_id,
                 'status': status,
                 'timestamp': timestamp,
@@ -433,6 +492,9 @@ def clicksend_webhook():
                 'error_text': error_text,
                 'received_at': datetime.now().isoformat()
             }
+            delivery_stats.record(dict(report, provider='ClickSend'),
+                                  previous=_stats_view(delivery_reports.get(message_id)))
+            delivery_reports[message_id] = report
             
             logger.info(f"Delivery report stored for message {message_id}: {status}")
         
@@ -447,6 +509,49 @@ def clicksend_webhook():
         logger.error(f"Error processing ClickSend webhook: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
+def _stats_view(report):
+    """Report as counted by delivery_stats (stored reports default to ClickSend)"""
+    if report is None:
+        return None
+    return dict(report, provider=report.get('provider', 'ClickSend'))
+
+@app.route('/api/delivery-stats', methods=['GET'])
+def get_delivery_stats():
+    """
+    Time-bucketed delivery counts
+    bucket=hour|day|month, since/until (until exclusive), group_by=provider,status,error_code
+    and comma-separated provider/status/error_code filters
+    """
+    try:
+        bucket = request.args.get('bucket', 'day')
+        group_by = [name.strip() for name in request.args.get('group_by', 'provider,status').split(',') if name.strip()]
+        filters = {
+            name: [value.strip() for value in request.args[name].split(',') if value.strip()]
+            for name in ('provider', 'status', 'error_code') if request.args.get(name)
+        }
+        stats = delivery_stats.query(request.args.get('since'), request.args.get('until'), bucket, group_by, filters)
+        
+        totals = {}
+        for row in stats:
+            status = row.get('status', 'all')
+            totals[status] = totals.get(status, 0) + row['count']
+        
+        return jsonify({
+            "success": True,
+            "bucket": bucket,
+            "group_by": group_by,
+            "since": request.args.get('since'),
+            "until": request.args.get('until'),
+            "stats": stats,
+            "totals": totals,
+            "total": sum(totals.values())
+        })
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error retrieving delivery stats: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
 @app.route('/api/delivery-reports', methods=['GET'])
 def get_delivery_reports():
     """
@@ -751,11 +856,23 @@ def get_delivery_reports():
 def clear_delivery_reports():
     """
     Clear all delivery reports (for testing/maintenance)
+    ?before=YYYY-MM-DD only drops reports received before that date; the
+    /api/delivery-stats counts are kept for those
     """
     try:
         global delivery_reports
+        before = request.args.get('before')
+        if before:
+            before = datetime.fromisoformat(before).isoformat()
+            expired = [msg_id for msg_id, report in delivery_reports.items() if (report.get('received_at') or '') < before]
+            for msg_id in expired:
+                del delivery_reports[msg_id]
+            return jsonify({"success": True, "message": f"Cleared {len(expired)} delivery reports received before {before}"})
         delivery_reports.clear()
+        delivery_stats.clear()
         return jsonify({"success": True, "message": "All delivery reports cleared"})
+    except ValueError as e:
+        return jsonify({"success": False, "error": f"Invalid before date: {e}"}), 400
     except Exception as e:
         logger.error(f"Error clearing delivery reports: {e}")
         return jsonify({"error": "Internal server error"}), 500
@@ -763,8 +880,9 @@ def clear_delivery_reports():
 if __name__ == '__main__':
     print("Starting Sparky Messaging API Server")
     print("=" * 60)
-    print(f"📱 Twilio configured: {twilio_client is not None}")
-    print(f"🤖 SimpleTalk.ai configured: {ai_manager.is_configured()}")
+    print(f"📱 Twilio configured: {twilio_configured()}")
+    if not PRODUCTION_STARTUP:
+        print(f"🤖 SimpleTalk.ai configured: {get_ai_manager().is_configured()}")
     print("🌐 Main Pages:")
     print("   GET  / - Sparky Messaging Home Page")
     print("   GET  /login.html - Login Page") 
@@ -787,6 +905,7 @@ if __name__ == '__main__':
     print("   POST /api/webhook/ghl - GHL webhook")
     print("   POST /api/webhook/clicksend - ClickSend delivery reports webhook")
     print("   GET  /api/delivery-reports - Get SMS delivery reports")
+    print("   GET  /api/delivery-stats - Delivery counts by hour/day/month")
     print("   DELETE /api/delivery-reports - Clear delivery reports")
     print("📧 Email Endpoints:")
     print("   POST /api/email/send - Send single email")
@@ -810,9 +929,14 @@ if __name__ == '__main__':
     print("📋 Flow: Login → Home Page → Features")
     print()
     
+    startup_ms = (time.perf_counter() - _import_started) * 1000
+    print(f"⏱️ Ready to serve in {startup_ms:.0f} ms")
+    if startup_ms > STARTUP_BUDGET_MS:
+        print(f"⚠️ Startup took {startup_ms:.0f} ms, over the {STARTUP_BUDGET_MS} ms budget")
+    
     # Run the Flask app
     app.run(
         host='0.0.0.0',
         port=3000,
-        debug=True
+        debug=not PRODUCTION_STARTUP
     )
\ No newline at end of file
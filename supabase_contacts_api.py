@@ -9,10 +9,12 @@ import json
 import uuid
 from datetime import datetime
 from pathlib import Path
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
 from urllib.parse import urlparse, parse_qs
 import traceback
 from supabase import create_client, Client
+from json_stream import encode_json, wants_pretty
+from http_keepalive import KeepAliveRequestHandler
 
 # Configuration
 PORT = 3000
@@ -22,7 +24,7 @@ SUPABASE_KEY = 'eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.eyJpc3MiOiJzdXBhYmFzZSIsInJ
 # Initialize Supabase client
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
-class SupabaseContactsAPI(BaseHTTPRequestHandler):
+class SupabaseContactsAPI(KeepAliveRequestHandler):
     
     def _send_cors_headers(self):
         """Add CORS headers for local development"""
@@ -31,14 +33,9 @@ class SupabaseContactsAPI(BaseHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
     
     def _send_json_response(self, data, status_code=200):
-        """Send JSON response with proper headers"""
-        self.send_response(status_code)
-        self.send_header('Content-Type', 'application/json')
-        self._send_cors_headers()
-        self.end_headers()
-        
-        response_json = json.dumps(data, indent=2, default=str)
-        self.wfile.write(response_json.encode('utf-8'))
+        """Send JSON response with proper headers (compact unless ?pretty=1)"""
+        body = encode_json(data, wants_pretty(parse_qs(urlparse(self.path).query)))
+        self._send_body_stream([body], 'application/json', status_code)
     
     def _send_error(self, message, status_code=400):
         """Send error response"""
@@ -50,9 +47,7 @@ class SupabaseContactsAPI(BaseHTTPRequestHandler):
     
     def do_OPTIONS(self):
         """Handle preflight requests"""
-        self.send_response(200)
-        self._send_cors_headers()
-        self.end_headers()
+        self._send_empty_response(200)
     
     def do_GET(self):
         """Handle GET requests"""
@@ -144,8 +139,7 @@ class SupabaseContactsAPI(BaseHTTPRequestHandler):
         """Handle CSV import of contacts to Supabase"""
         try:
             # Get request body
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
+            post_data = self._read_request_body()
             
             # Parse JSON data
             import_data = json.loads(post_data.decode('utf-8'))
@@ -251,8 +245,7 @@ class SupabaseContactsAPI(BaseHTTPRequestHandler):
     def _handle_create_contact(self):
         """Handle creating a single contact"""
         try:
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
+            post_data = self._read_request_body()
             contact_data = json.loads(post_data.decode('utf-8'))
             
             # Insert single contact into Supabase
@@ -286,7 +279,8 @@ def main():
         return
     
     # Start server
-    server = HTTPServer(('localhost', PORT), SupabaseContactsAPI)
+    # Threaded so an idle keep-alive connection doesn't block other clients
+    server = ThreadingHTTPServer(('localhost', PORT), SupabaseContactsAPI)
     print(f"🚀 Supabase Contacts API server running at http://localhost:{PORT}")
     print(f"📊 Health check: http://localhost:{PORT}/api/health")
     print(f"📋 Contacts endpoint: http://localhost:{PORT}/api/contacts")